@@ -0,0 +1,108 @@
+from django.core.files.storage import default_storage
+
+
+def _date(value):
+    return value.isoformat() if value else None
+
+
+def _image(name):
+    return default_storage.url(name) if name else None
+
+
+def _full_name(first_name, last_name):
+    return f'{first_name} {last_name}'.strip()
+
+
+class Field:
+    """Поле ответа: колонки values() и функция, собирающая из них значение."""
+
+    def __init__(self, *columns, convert=None):
+        self.columns = columns
+        self.convert = convert
+
+    def render(self, row):
+        values = [row[column] for column in self.columns]
+        if self.convert is None:
+            return values[0]
+        return self.convert(*values)
+
+
+class Serializer:
+    """Строит ответ из словарей values(), не создавая объектов моделей.
+
+    fields — разреженный набор полей из ?fields=a,b; колонки для
+    курсора (required) выбираются всегда, но в ответ не попадают.
+    """
+    fields = {}
+    required = ('id',)
+
+    def __init__(self, fields=None):
+        names = [name for name in (fields or '').split(',') if name]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(
+                'Неизвестные поля: {}'.format(', '.join(unknown))
+            )
+        self.names = names or list(self.fields)
+
+    @property
+    def columns(self):
+        columns = list(self.required)
+        for name in self.names:
+            columns += self.fields[name].columns
+        return list(dict.fromkeys(columns))
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def to_dict(self, row):
+        return {name: self.fields[name].render(row) for name in self.names}
+
+    def many(self, rows):
+        return [self.to_dict(row) for row in rows]
+
+
+class PostSerializer(Serializer):
+    fields = {
+        'id': Field('id'),
+        'text': Field('text'),
+        'pub_date': Field('pub_date', convert=_date),
+        'author': Field('author__username'),
+        'author_name': Field(
+            'author__first_name', 'author__last_name', convert=_full_name
+        ),
+        'group': Field('group__slug'),
+        'image': Field('image', convert=_image),
+        'comments_count': Field('comments_count'),
+    }
+    required = ('id', 'pub_date')
+
+
+class CommentSerializer(Serializer):
+    fields = {
+        'id': Field('id'),
+        'post': Field('post_id'),
+        'author': Field('author__username'),
+        'text': Field('text'),
+        'created': Field('created', convert=_date),
+    }
+    required = ('id', 'created')
+
+
+class GroupSerializer(Serializer):
+    fields = {
+        'id': Field('id'),
+        'title': Field('title'),
+        'slug': Field('slug'),
+        'description': Field('description'),
+    }
+
+
+class ProfileSerializer(Serializer):
+    fields = {
+        'username': Field('username'),
+        'full_name': Field('first_name', 'last_name', convert=_full_name),
+        'posts_count': Field('stats__posts_count'),
+        'followers_count': Field('stats__followers_count'),
+        'following_count': Field('stats__following_count'),
+    }
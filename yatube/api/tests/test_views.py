@@ -0,0 +1,235 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for i in range(15):
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group if i % 2 else None,
+                text=f'Пост {i}',
+            )
+        cls.post = Post.objects.latest('pk')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get(self, url, client=None, **params):
+        response = (client or self.guest_client).get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def send(self, client, method, url, data):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type='application/json'
+        )
+
+    def test_feed_pages_by_cursor(self):
+        """Лента отдается курсорными страницами без повторов"""
+        data = self.get(reverse('api:posts'), limit=10)
+        self.assertEqual(len(data['results']), 10)
+        self.assertIsNone(data['previous'])
+        first = data['results'][0]
+        self.assertEqual(first['author'], 'author')
+        self.assertEqual(first['author_name'], 'Лев Толстой')
+        seen = [row['id'] for row in data['results']]
+        data = self.guest_client.get(data['next']).json()
+        seen += [row['id'] for row in data['results']]
+        self.assertIsNone(data['next'])
+        self.assertEqual(
+            seen,
+            list(Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )),
+        )
+
+    def test_sparse_fields(self):
+        """?fields= оставляет в ответе только запрошенные поля"""
+        data = self.get(reverse('api:posts'), fields='id,author')
+        self.assertEqual(set(data['results'][0]), {'id', 'author'})
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_feed_uses_single_query(self):
+        """Страница ленты — один запрос без объектов моделей"""
+        with self.assertNumQueries(1):
+            self.guest_client.get(reverse('api:posts'))
+
+    def test_group_profile_and_detail(self):
+        """Группа, профиль и пост отдаются JSON"""
+        data = self.get(
+            reverse('api:group_posts', kwargs={'slug': 'group'}), limit=100
+        )
+        self.assertEqual(len(data['results']), 7)
+        self.assertTrue(all(row['group'] == 'group'
+                            for row in data['results']))
+        data = self.get(reverse('api:profile', kwargs={'username': 'author'}))
+        self.assertEqual(data['posts_count'], 15)
+        self.assertEqual(data['full_name'], 'Лев Толстой')
+        data = self.get(
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(data['text'], self.post.text)
+        self.assertEqual(
+            self.get(reverse('api:groups'))['results'][0]['slug'], 'group'
+        )
+        response = self.guest_client.get(
+            reverse('api:post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_create_and_edit_post(self):
+        """Создать пост может только вошедший, править — только автор"""
+        url = reverse('api:posts')
+        response = self.send(self.guest_client, 'post', url, {'text': 'Нет'})
+        self.assertEqual(response.status_code, 401)
+        response = self.send(
+            self.reader_client, 'post', url,
+            {'text': 'Новый пост', 'group': 'group'},
+        )
+        self.assertEqual(response.status_code, 201)
+        created = response.json()
+        self.assertEqual(created['group'], 'group')
+        self.assertEqual(created['author'], 'reader')
+        detail = reverse('api:post_detail', kwargs={'post_id': created['id']})
+        response = self.send(
+            self.author_client, 'patch', detail, {'text': 'Чужой'}
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.send(
+            self.reader_client, 'patch', detail, {'text': 'Исправлено'}
+        )
+        self.assertEqual(response.json()['text'], 'Исправлено')
+        self.assertEqual(response.json()['group'], 'group')
+        response = self.send(self.reader_client, 'post', url, {'text': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def test_form_encoded_patch(self):
+        """PATCH формой меняет пост, чужой тип тела отклоняется"""
+        post = Post.objects.create(author=self.reader, text='Черновик')
+        detail = reverse('api:post_detail', kwargs={'post_id': post.pk})
+        response = self.reader_client.patch(
+            detail, urlencode({'text': 'Из формы'}),
+            content_type='application/x-www-form-urlencoded',
+        )
+        self.assertEqual(response.json()['text'], 'Из формы')
+        response = self.reader_client.patch(
+            detail, encode_multipart(BOUNDARY, {'text': 'Из multipart'}),
+            content_type=MULTIPART_CONTENT,
+        )
+        self.assertEqual(response.json()['text'], 'Из multipart')
+        response = self.reader_client.patch(
+            detail, 'text', content_type='text/plain'
+        )
+        self.assertEqual(response.status_code, 415)
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Из multipart')
+
+    def test_comments(self):
+        """Комментарии добавляются и листаются курсором"""
+        url = reverse('api:comments', kwargs={'post_id': self.post.pk})
+        for i in range(3):
+            response = self.send(
+                self.reader_client, 'post', url, {'text': f'Ответ {i}'}
+            )
+            self.assertEqual(response.status_code, 201)
+        data = self.get(url, limit=2)
+        self.assertEqual(
+            [row['text'] for row in data['results']], ['Ответ 2', 'Ответ 1']
+        )
+        data = self.guest_client.get(data['next']).json()
+        self.assertEqual([row['text'] for row in data['results']],
+                         ['Ответ 0'])
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 3)
+
+    def test_follow_and_unfollow(self):
+        """Подписка, лента подписок и отписка"""
+        url = reverse('api:follow', kwargs={'username': 'author'})
+        self.assertEqual(self.guest_client.post(url).status_code, 401)
+        response = self.reader_client.post(url)
+        self.assertEqual(response.json(), {'following': True})
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author
+        ).exists())
+        data = self.get(reverse('api:follow_index'), self.reader_client)
+        self.assertEqual(len(data['results']), 10)
+        profile = self.get(
+            reverse('api:profile', kwargs={'username': 'author'}),
+            self.reader_client,
+        )
+        self.assertTrue(profile['following'])
+        self.assertEqual(profile['followers_count'], 1)
+        response = self.reader_client.delete(url)
+        self.assertEqual(response.json(), {'following': False})
+        self.assertFalse(Follow.objects.exists())
+        response = self.author_client.post(url)
+        self.assertEqual(response.status_code, 400)
+
+    def test_token_auth(self):
+        """Токен заменяет сессию и отзывается сменой пароля"""
+        reader = User.objects.get(pk=self.reader.pk)
+        reader.set_password('secret')
+        reader.save()
+        url = reverse('api:token')
+        response = self.guest_client.post(
+            url, {'username': 'reader', 'password': 'wrong'}
+        )
+        self.assertEqual(response.status_code, 400)
+        token = self.guest_client.post(
+            url, {'username': 'reader', 'password': 'secret'}
+        ).json()['token']
+        client = Client(
+            enforce_csrf_checks=True, HTTP_AUTHORIZATION=f'Token {token}'
+        )
+        response = self.send(
+            client, 'post', reverse('api:posts'), {'text': 'По токену'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['author'], 'reader')
+        bad = Client(HTTP_AUTHORIZATION=f'Token {token}x')
+        self.assertEqual(
+            bad.get(reverse('api:follow_index')).status_code, 401
+        )
+        reader.set_password('changed')
+        reader.save()
+        self.assertEqual(
+            client.get(reverse('api:follow_index')).status_code, 401
+        )
+
+    def test_session_writes_need_csrf(self):
+        """Запись по cookie сессии без CSRF-токена отклоняется"""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.reader)
+        response = self.send(
+            client, 'post', reverse('api:posts'), {'text': 'Без CSRF'}
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Post.objects.filter(text='Без CSRF').exists())
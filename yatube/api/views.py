@@ -0,0 +1,343 @@
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import transaction
+from django.http import Http404, JsonResponse, QueryDict
+from django.http.multipartparser import MultiPartParserError
+from django.middleware.csrf import CsrfViewMiddleware
+from django.shortcuts import get_object_or_404
+from django.utils.datastructures import MultiValueDict
+from django.utils.http import urlencode
+from django.views.decorators.csrf import csrf_exempt
+
+from core.auth import make_token, token_user
+from posts.counters import get_stats
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import search
+from posts.thumbnails import schedule_thumbnails
+from posts.timeline import TimelinePaginator
+from posts.utils import CURSOR_PARAM, CursorPaginator
+from yatube.settings import POSTS_COUNT
+
+from .serializers import (CommentSerializer, GroupSerializer,
+                          PostSerializer, ProfileSerializer)
+
+
+TOKEN_PREFIX = 'Token '
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def respond(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def authenticate_request(request):
+    """Пользователь из заголовка Authorization: Token <токен> или сессии.
+
+    Токен браузер сам не подставит, поэтому CSRF проверяется только
+    у запросов, вошедших по cookie сессии.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith(TOKEN_PREFIX):
+        user = token_user(header[len(TOKEN_PREFIX):].strip())
+        if user is None:
+            raise ApiError(401, 'Недействительный токен')
+        request.user = user
+    elif request.user.is_authenticated and CsrfViewMiddleware().process_view(
+        request, None, (), {}
+    ) is not None:
+        raise ApiError(403, 'Не пройдена проверка CSRF')
+
+
+def api_view(*methods, login=False):
+    """Проверяет метод и вход, ошибки отдает JSON вида {"detail": ...}."""
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise ApiError(405, 'Метод не поддерживается')
+                authenticate_request(request)
+                if login and not request.user.is_authenticated:
+                    raise ApiError(401, 'Нужно войти')
+                return view(request, *args, **kwargs)
+            except Http404:
+                return respond({'detail': 'Не найдено'}, 404)
+            except ApiError as error:
+                return respond({'detail': error.detail}, error.status)
+        return wrapper
+    return decorator
+
+
+def json_data(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, 'Некорректный JSON')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Ожидается JSON-объект')
+    query = QueryDict(mutable=True)
+    for key, value in data.items():
+        query[key] = '' if value is None else value
+    return query
+
+
+def request_data(request):
+    """Данные и файлы формы или JSON-тела запроса.
+
+    Django разбирает формы только у POST, поэтому тело PATCH
+    разбирается здесь; другие типы тела отклоняются с 415.
+    """
+    if request.content_type == 'application/json':
+        return json_data(request), MultiValueDict()
+    if request.method == 'POST':
+        return request.POST.copy(), request.FILES
+    if request.content_type == 'multipart/form-data':
+        try:
+            data, files = request.parse_file_upload(request.META, request)
+        except MultiPartParserError:
+            raise ApiError(400, 'Некорректное multipart-тело')
+        return data.copy(), files
+    if request.content_type == 'application/x-www-form-urlencoded':
+        return QueryDict(
+            request.body, mutable=True, encoding=request.encoding
+        ), MultiValueDict()
+    raise ApiError(415, f'Тело {request.content_type} не поддерживается')
+
+
+def serializer_for(serializer_class, request):
+    try:
+        return serializer_class(request.GET.get('fields'))
+    except ValueError as error:
+        raise ApiError(400, str(error))
+
+
+def page_size(request):
+    limit = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+    try:
+        size = int(request.GET.get('limit', POSTS_COUNT))
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом')
+    return min(max(size, 1), limit)
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query[CURSOR_PARAM] = cursor
+    return request.build_absolute_uri(
+        f'{request.path}?{urlencode(query, doseq=True)}'
+    )
+
+
+def cursor_page(request, queryset, serializer_class,
+                paginator_class=CursorPaginator, **options):
+    """Курсорная страница строк values() со ссылками на соседние."""
+    serializer = serializer_for(serializer_class, request)
+    paginator = paginator_class(
+        serializer.values(queryset),
+        page_size(request),
+        cursor=request.GET.get(CURSOR_PARAM),
+        **options
+    )
+    page = paginator.get_page()
+    return respond({
+        'results': serializer.many(page.object_list),
+        'next': page_link(request, paginator.next_cursor),
+        'previous': page_link(request, paginator.previous_cursor),
+    })
+
+
+def post_response(request, post_id, status=200):
+    serializer = serializer_for(PostSerializer, request)
+    row = serializer.values(Post.objects.filter(pk=post_id)).first()
+    if row is None:
+        raise Http404
+    return respond(serializer.to_dict(row), status)
+
+
+def save_post(request, instance=None):
+    data, files = request_data(request)
+    slug = data.get('group')
+    if slug:
+        group_id = Group.objects.filter(slug=slug).values_list(
+            'pk', flat=True
+        ).first()
+        if group_id is None:
+            raise ApiError(400, f'Нет группы {slug}')
+        data['group'] = group_id
+    if instance is not None:
+        # Частичное изменение: незаданные поля остаются прежними.
+        data.setdefault('text', instance.text)
+        if 'group' not in data:
+            data['group'] = instance.group_id or ''
+    form = PostForm(data, files=files or None, instance=instance)
+    if not form.is_valid():
+        return None, respond({'errors': form.errors}, 400)
+    post = form.save(commit=False)
+    if instance is None:
+        post.author = request.user
+    post.save()
+    schedule_thumbnails(post)
+    return post, None
+
+
+@api_view('GET', 'POST')
+def posts(request):
+    if request.method == 'GET':
+        return cursor_page(request, Post.objects.all(), PostSerializer)
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужно войти')
+    with transaction.atomic():
+        post, errors = save_post(request)
+    if errors:
+        return errors
+    return post_response(request, post.pk, 201)
+
+
+@api_view('GET', 'PATCH', 'POST')
+def post_detail(request, post_id):
+    if request.method == 'GET':
+        return post_response(request, post_id)
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужно войти')
+    post = get_object_or_404(Post, pk=post_id)
+    if post.author_id != request.user.pk:
+        raise ApiError(403, 'Изменять пост может только автор')
+    with transaction.atomic():
+        post, errors = save_post(request, post)
+    if errors:
+        return errors
+    return post_response(request, post.pk)
+
+
+@api_view('GET', 'POST')
+def comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    if request.method == 'GET':
+        return cursor_page(
+            request,
+            Comment.objects.filter(post=post).order_by('-created', '-pk'),
+            CommentSerializer,
+            date_field='created',
+        )
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужно войти')
+    data, _ = request_data(request)
+    form = CommentForm(data)
+    if not form.is_valid():
+        return respond({'errors': form.errors}, 400)
+    with transaction.atomic():
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post = post
+        comment.save()
+    serializer = serializer_for(CommentSerializer, request)
+    row = serializer.values(Comment.objects.filter(pk=comment.pk)).get()
+    return respond(serializer.to_dict(row), 201)
+
+
+@api_view('GET')
+def groups(request):
+    serializer = serializer_for(GroupSerializer, request)
+    rows = serializer.values(Group.objects.order_by('title'))
+    return respond({'results': serializer.many(rows)})
+
+
+@api_view('GET')
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return cursor_page(
+        request, Post.objects.filter(group=group), PostSerializer
+    )
+
+
+@api_view('GET')
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    get_stats(author)
+    serializer = serializer_for(ProfileSerializer, request)
+    data = serializer.to_dict(
+        serializer.values(User.objects.filter(pk=author.pk)).get()
+    )
+    if request.user.is_authenticated:
+        data['following'] = Follow.objects.filter(
+            user=request.user, author=author
+        ).exists()
+    return respond(data)
+
+
+@api_view('GET')
+def profile_posts(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return cursor_page(
+        request, Post.objects.filter(author=author), PostSerializer
+    )
+
+
+@api_view('POST', 'DELETE', login=True)
+def follow(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    if author == request.user:
+        raise ApiError(400, 'Нельзя подписаться на себя')
+    with transaction.atomic():
+        if request.method == 'POST':
+            Follow.objects.get_or_create(user=request.user, author=author)
+        else:
+            Follow.objects.filter(user=request.user, author=author).delete()
+    return respond({'following': request.method == 'POST'})
+
+
+@api_view('POST')
+def token(request):
+    """Токен для заголовка Authorization по имени и паролю."""
+    data, _ = request_data(request)
+    user = authenticate(
+        request,
+        username=data.get('username'),
+        password=data.get('password'),
+    )
+    if user is None:
+        raise ApiError(400, 'Неверное имя пользователя или пароль')
+    return respond({'token': make_token(user)})
+
+
+@api_view('GET', login=True)
+def follow_index(request):
+    return cursor_page(
+        request, Post.objects.all(), PostSerializer,
+        paginator_class=TimelinePaginator, user=request.user,
+    )
+
+
+@api_view('GET')
+def post_search(request):
+    serializer = serializer_for(PostSerializer, request)
+    limit = page_size(request)
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError:
+        raise ApiError(400, 'offset должен быть числом')
+    ranked = search(request.GET.get('q', ''))
+    ids = ranked[offset:offset + limit]
+    rows = {
+        row['id']: row
+        for row in serializer.values(Post.objects.filter(pk__in=ids))
+    }
+    return respond({
+        'count': len(ranked),
+        'results': [serializer.to_dict(rows[pk]) for pk in ids if pk in rows],
+    })
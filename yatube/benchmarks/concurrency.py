@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from core.db import apply_pragmas
+
+# Настройки SQLite по умолчанию: журнал отката и fsync на каждый коммит.
+BASELINE_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+def prepare(path, rows):
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        'CREATE TABLE post (id INTEGER PRIMARY KEY, author INTEGER, '
+        'text TEXT, pub_date REAL);'
+        'CREATE INDEX post_date ON post (pub_date DESC, id DESC);'
+        'CREATE TABLE comment (id INTEGER PRIMARY KEY, post INTEGER, '
+        'text TEXT, created REAL);'
+    )
+    connection.executemany(
+        'INSERT INTO post (author, text, pub_date) VALUES (?, ?, ?)',
+        ((i % 100, f'Пост {i} ' * 10, time.time() - i) for i in range(rows)),
+    )
+    connection.commit()
+    connection.close()
+
+
+def work(path, pragmas, role, seconds, results):
+    # Таймаут как у Django по умолчанию, если PRAGMA его не задает.
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    apply_pragmas(connection.cursor(), pragmas)
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if role == 'read':
+                connection.execute(
+                    'SELECT id, author, text FROM post '
+                    'ORDER BY pub_date DESC, id DESC LIMIT 10 OFFSET ?',
+                    [len(latencies) % 500],
+                ).fetchall()
+            else:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute(
+                    'INSERT INTO comment (post, text, created) '
+                    'VALUES (?, ?, ?)',
+                    [len(latencies) % 1000, 'Комментарий', time.time()],
+                )
+                connection.execute('COMMIT')
+        except sqlite3.OperationalError:
+            errors += 1
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+    results.put((role, latencies, errors))
+
+
+def run_profile(pragmas, readers=4, writers=2, seconds=5, rows=10000):
+    """Пропускная способность чтения и записи параллельными процессами."""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.sqlite3')
+    try:
+        prepare(path, rows)
+        connection = sqlite3.connect(path)
+        apply_pragmas(connection.cursor(), pragmas)
+        connection.close()
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=work, args=(path, pragmas, role, seconds, results)
+            )
+            for role in ['read'] * readers + ['write'] * writers
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    report = {}
+    for role in ('read', 'write'):
+        latencies = sorted(
+            value for kind, values, _ in collected if kind == role
+            for value in values
+        )
+        report[role] = {
+            'ops_per_second': round(len(latencies) / seconds, 1),
+            'p99_ms': round(
+                latencies[int(len(latencies) * 0.99) - 1] * 1000, 2
+            ) if latencies else None,
+            'errors': sum(
+                errors for kind, _, errors in collected if kind == role
+            ),
+        }
+    return report
@@ -0,0 +1,175 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from posts import search, timeline
+from posts.counters import repair_counters
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import bulk_batch_size
+
+TEXT_POOL_SIZE = 1000
+
+
+def power_law(count, exponent=1.1):
+    """Накопленные веса Ципфа: i-й элемент в 1/i**exponent раз популярнее."""
+    return list(accumulate(1 / (rank ** exponent)
+                           for rank in range(1, count + 1)))
+
+
+class Generator:
+    """Быстро наполняет базу пользователями, постами и подписками.
+
+    Авторы, подписки и комментарии распределены по степенному закону:
+    немногие авторы пишут и читаются много, большинство — мало.
+    """
+
+    def __init__(self, seed=0, batch_size=5000, days=365, stdout=None):
+        self.random = random.Random(seed)
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(seed)
+        self.batch_size = batch_size
+        self.days = days
+        self.stdout = stdout
+        self.prefix = f'bench{seed}x{self.random.randrange(10 ** 6)}'
+        self.texts = [
+            self.faker.text(max_nb_chars=self.random.choice((80, 200, 600)))
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def bulk(self, model, objects):
+        model.objects.bulk_create(
+            objects,
+            batch_size=bulk_batch_size(model, self.batch_size),
+            ignore_conflicts=True,
+        )
+
+    def bulk_dated(self, model, field, objects):
+        # auto_now_add при вставке ставит текущее время, поэтому даты
+        # новых строк пишутся следом отдельным UPDATE по id.
+        start = model.objects.aggregate(top=Max('pk'))['top'] or 0
+        self.bulk(model, objects)
+        model.objects.bulk_update(
+            (
+                model(pk=pk, **{field: self.date()})
+                for pk in model.objects.filter(pk__gt=start).order_by(
+                    'pk'
+                ).values_list('pk', flat=True)
+            ),
+            [field],
+            batch_size=bulk_batch_size(model, self.batch_size),
+        )
+
+    def date(self):
+        return timezone.now() - timedelta(
+            seconds=self.random.randrange(self.days * 86400)
+        )
+
+    def users(self, count):
+        self.bulk(User, (
+            User(username=f'{self.prefix}_{i}',
+                 first_name=self.faker.first_name(),
+                 last_name=self.faker.last_name())
+            for i in range(count)
+        ))
+        return list(User.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def groups(self, count):
+        self.bulk(Group, (
+            Group(title=f'{self.faker.word()} {i}',
+                  slug=f'{self.prefix}-{i}',
+                  description=self.faker.sentence())
+            for i in range(count)
+        ))
+        return list(Group.objects.filter(
+            slug__startswith=f'{self.prefix}-'
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def posts(self, count, users, groups):
+        weights = power_law(len(users))
+        groups = groups + [None] * max(len(groups) // 2, 1)
+        self.bulk_dated(Post, 'pub_date', (
+            Post(
+                author_id=self.random.choices(
+                    users, cum_weights=weights
+                )[0],
+                group_id=self.random.choice(groups),
+                text=self.random.choice(self.texts),
+            )
+            for _ in range(count)
+        ))
+        return list(Post.objects.filter(
+            author_id__in=users
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def follows(self, users, average):
+        weights = power_law(len(users))
+        pairs = set()
+        for user in users:
+            wanted = min(
+                int(self.random.paretovariate(1.5) * average / 3) + 1,
+                len(users) - 1,
+            )
+            authors = set(self.random.choices(
+                users, cum_weights=weights, k=wanted
+            ))
+            authors.discard(user)
+            pairs.update((user, author) for author in authors)
+        self.bulk(Follow, (
+            Follow(user_id=user, author_id=author) for user, author in pairs
+        ))
+        return pairs
+
+    def comments(self, count, posts, users):
+        weights = power_law(len(posts), exponent=0.9)
+        ordered = posts[::-1]
+        self.bulk_dated(Comment, 'created', (
+            Comment(
+                post_id=self.random.choices(
+                    ordered, cum_weights=weights
+                )[0],
+                author_id=self.random.choice(users),
+                text=self.random.choice(self.texts),
+            )
+            for _ in range(count)
+        ))
+
+    def generate(self, users=1000, groups=20, posts=100000, comments=None,
+                 follows=20, timelines=True, search_index=False):
+        """Создает набор данных и возвращает число созданных объектов."""
+        if comments is None:
+            comments = posts // 2
+        user_ids = self.users(users)
+        group_ids = self.groups(groups)
+        self.log(f'Пользователей: {len(user_ids)}, групп: {len(group_ids)}')
+        post_ids = self.posts(posts, user_ids, group_ids)
+        self.log(f'Постов: {len(post_ids)}')
+        pairs = self.follows(user_ids, follows)
+        self.log(f'Подписок: {len(pairs)}')
+        if post_ids:
+            self.comments(comments, post_ids, user_ids)
+        self.log(f'Комментариев: {comments if post_ids else 0}')
+        repair_counters()
+        if timelines:
+            for user in user_ids:
+                timeline.rebuild(user)
+            self.log('Ленты подписок заполнены')
+        if search_index:
+            search.rebuild()
+            self.log('Поисковый индекс перестроен')
+        return {
+            'users': len(user_ids),
+            'groups': len(group_ids),
+            'posts': len(post_ids),
+            'comments': comments if post_ids else 0,
+            'follows': len(pairs),
+        }
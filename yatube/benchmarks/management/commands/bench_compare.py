@@ -0,0 +1,22 @@
+from benchmarks import runner
+
+from .bench_run import Command as RunCommand
+
+
+class Command(RunCommand):
+    help = 'Сравнивает два сохраненных прогона bench_run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline')
+        parser.add_argument('current')
+        parser.add_argument('--threshold', type=float, default=0.1)
+
+    def handle(self, *args, **options):
+        rows = runner.compare(
+            runner.load(options['baseline']),
+            runner.load(options['current']),
+            options['threshold'],
+        )
+        self.print_comparison(rows)
+        if any(row['regression'] for row in rows):
+            self.stderr.write('Есть регрессии')
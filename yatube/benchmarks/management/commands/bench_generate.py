@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from benchmarks.generator import Generator
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для нагрузочных замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=None,
+                            help='По умолчанию половина от числа постов')
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--no-timelines', action='store_true',
+                            help='Не раскладывать посты по лентам подписок')
+        parser.add_argument('--search', action='store_true',
+                            help='Перестроить поисковый индекс')
+
+    def handle(self, *args, **options):
+        generator = Generator(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        created = generator.generate(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            timelines=not options['no_timelines'],
+            search_index=options['search'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Готово: ' + ', '.join(f'{k} {v}' for k, v in created.items())
+        ))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from benchmarks import runner
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет перцентили времени ответа, число запросов и пик памяти '
+        'основных страниц и сохраняет результат для сравнения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом')
+        parser.add_argument('--only', nargs='*',
+                            help='Только перечисленные сценарии')
+        parser.add_argument('--output', help='Файл для результата')
+        parser.add_argument('--compare', metavar='BASELINE',
+                            help='Сравнить с сохраненным прогоном')
+        parser.add_argument('--threshold', type=float, default=0.1)
+
+    def handle(self, *args, **options):
+        result = runner.run(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            cold=options['cold'],
+            only=options['only'],
+        )
+        for name, row in result['scenarios'].items():
+            self.stdout.write(
+                f'{name:<14} {row["status"]} '
+                f'p50 {row["p50_ms"]:.1f} мс, p90 {row["p90_ms"]:.1f} мс, '
+                f'p99 {row["p99_ms"]:.1f} мс, запросов {row["queries"]}, '
+                f'пик памяти {row["peak_kb"]:.0f} КБ'
+            )
+        path = runner.save(result, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'Результат записан в {path}'))
+        if options['compare']:
+            self.print_comparison(
+                runner.compare(
+                    runner.load(options['compare']),
+                    result,
+                    options['threshold'],
+                )
+            )
+
+    def print_comparison(self, rows):
+        for row in rows:
+            line = (
+                f'{row["scenario"]:<14} p90 {row["old_p90_ms"]:.1f} -> '
+                f'{row["new_p90_ms"]:.1f} мс ({row["change"]:+.0%}), '
+                f'запросов {row["old_queries"]} -> {row["new_queries"]}'
+            )
+            style = (
+                self.style.ERROR if row['regression'] else self.style.SUCCESS
+            )
+            self.stdout.write(style(line))
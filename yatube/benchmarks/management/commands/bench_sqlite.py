@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from benchmarks.concurrency import BASELINE_PRAGMAS, run_profile
+from core.db import sqlite_pragmas
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite с настройками по '
+        'умолчанию и с SQLITE_PRAGMAS при параллельных чтении и записи'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--rows', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        profiles = (
+            ('По умолчанию', BASELINE_PRAGMAS),
+            ('SQLITE_PRAGMAS', sqlite_pragmas()),
+        )
+        for title, pragmas in profiles:
+            report = run_profile(
+                pragmas,
+                readers=options['readers'],
+                writers=options['writers'],
+                seconds=options['seconds'],
+                rows=options['rows'],
+            )
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            for role, row in report.items():
+                self.stdout.write(
+                    f'  {role}: {row["ops_per_second"]} оп/с, '
+                    f'p99 {row["p99_ms"]} мс, ошибок {row["errors"]}'
+                )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время рендера страницы профиля с обычными '
+        'загрузчиками, cached.Loader и встроенными include'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--profile', action='store_true',
+                            help='Показать время по шаблонам')
+
+    def handle(self, *args, **options):
+        result = templates.run(options['iterations'], options['warmup'])
+        if not result:
+            raise CommandError(
+                'Нет данных: сначала выполните bench_generate'
+            )
+        baseline = result['default']['mean_ms']
+        for mode, row in result.items():
+            self.stdout.write(
+                f'{mode:<8} p50 {row["p50_ms"]:.2f} мс, '
+                f'p90 {row["p90_ms"]:.2f} мс, '
+                f'в среднем {row["mean_ms"]:.2f} мс '
+                f'(x{baseline / row["mean_ms"]:.1f})'
+            )
+            if options['profile']:
+                for name, item in sorted(
+                    row['templates'].items(),
+                    key=lambda pair: pair[1]['ms'],
+                    reverse=True,
+                ):
+                    self.stdout.write(
+                        f'    {name:<40} x{item["renders"]:<3} '
+                        f'{item["ms"]:.2f} мс'
+                    )
@@ -0,0 +1,182 @@
+import json
+import math
+import os
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, User
+
+# Адрес вне INTERNAL_IPS, чтобы debug_toolbar не встраивался в ответы.
+CLIENT_DEFAULTS = {'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '10.0.0.1'}
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(math.ceil(share * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def results_dir():
+    return getattr(settings, 'BENCHMARK_RESULTS_DIR', os.path.join(
+        settings.BASE_DIR, 'benchmarks', 'results'
+    ))
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def scenarios():
+    """Пары (название, url, пользователь) для самых тяжелых страниц."""
+    author = User.objects.order_by('-stats__posts_count').first()
+    reader = User.objects.annotate(
+        following_total=Count('follower')
+    ).order_by('-following_total').first()
+    group = Group.objects.annotate(
+        posts_total=Count('posts')
+    ).order_by('-posts_total').first()
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    word = Post.objects.values_list('text', flat=True).first()
+    result = [
+        ('index', reverse('posts:index'), None),
+        ('index page 5', reverse('posts:index') + '?page=5', None),
+    ]
+    if group is not None:
+        result.append(('group_posts', reverse(
+            'posts:group_posts', kwargs={'slug': group.slug}
+        ), None))
+    if author is not None:
+        result.append(('profile', reverse(
+            'posts:profile', kwargs={'username': author.username}
+        ), None))
+    if post is not None:
+        result.append(('post_detail', reverse(
+            'posts:post_detail', kwargs={'post_id': post.pk}
+        ), None))
+    if reader is not None:
+        result.append(('follow_index', reverse('posts:follow_index'), reader))
+    if word:
+        result.append((
+            'search',
+            reverse('posts:post_search') + '?q=' + word.split()[0],
+            None,
+        ))
+    return result
+
+
+def measure(url, user=None, iterations=20, warmup=2, cold=False):
+    client = Client(**CLIENT_DEFAULTS)
+    if user is not None:
+        client.force_login(user)
+    for _ in range(warmup):
+        client.get(url)
+    latencies = []
+    queries = []
+    status = None
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        status = response.status_code
+    # Отдельный проход: tracemalloc сильно искажает время.
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'status': status,
+        'p50_ms': round(percentile(latencies, 0.5), 3),
+        'p90_ms': round(percentile(latencies, 0.9), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run(iterations=20, warmup=2, cold=False, only=None):
+    """Прогоняет все сценарии и возвращает результат для сохранения."""
+    results = {}
+    for name, url, user in scenarios():
+        if only and name not in only:
+            continue
+        results[name] = dict(
+            url=url, **measure(url, user, iterations, warmup, cold)
+        )
+    return {
+        'commit': current_commit(),
+        'created': timezone.now().isoformat(),
+        'options': {'iterations': iterations, 'warmup': warmup,
+                    'cold': cold},
+        'dataset': {
+            'users': User.objects.count(),
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+        },
+        'scenarios': results,
+    }
+
+
+def save(result, path=None):
+    if path is None:
+        directory = results_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{result["commit"]}.json')
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(result, file, ensure_ascii=False, indent=2)
+    return path
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def compare(baseline, current, threshold=0.1):
+    """Строки сравнения двух прогонов; регрессия — рост p90 или запросов."""
+    rows = []
+    for name, new in current['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old is None:
+            continue
+        change = (new['p90_ms'] - old['p90_ms']) / (old['p90_ms'] or 1)
+        rows.append({
+            'scenario': name,
+            'old_p90_ms': old['p90_ms'],
+            'new_p90_ms': new['p90_ms'],
+            'change': round(change, 3),
+            'old_queries': old['queries'],
+            'new_queries': new['queries'],
+            'regression': (
+                change > threshold or new['queries'] > old['queries']
+            ),
+        })
+    return rows
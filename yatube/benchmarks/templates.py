@@ -0,0 +1,108 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Engine, RequestContext, engines
+from django.test import RequestFactory
+
+from core import metrics
+from posts.counters import get_stats
+from posts.feed_cache import annotate_card_versions
+from posts.models import User
+from posts.utils import CursorPaginator
+from yatube.settings import POSTS_COUNT
+
+from .runner import CLIENT_DEFAULTS, percentile
+
+SOURCE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+# Загрузчики по режимам: как при DEBUG, cached.Loader и cached.Loader
+# со встроенными include карточки поста.
+MODES = {
+    'default': SOURCE_LOADERS,
+    'cached': [('django.template.loaders.cached.Loader', SOURCE_LOADERS)],
+    'inlined': [(
+        'core.template_loaders.Loader',
+        SOURCE_LOADERS,
+        getattr(settings, 'TEMPLATE_INLINE_INCLUDES', ()),
+    )],
+}
+
+TEMPLATE = 'posts/profile.html'
+
+
+def engine_for(mode):
+    base = engines['django'].engine
+    return Engine(
+        dirs=base.dirs,
+        context_processors=base.context_processors,
+        debug=base.debug,
+        loaders=MODES[mode],
+        libraries=base.libraries,
+    )
+
+
+def profile_context():
+    """Контекст профиля самого плодовитого автора, уже из базы."""
+    author = User.objects.order_by('-stats__posts_count').first()
+    if author is None:
+        return None
+    page_obj = CursorPaginator(author.posts.feed(), POSTS_COUNT).get_page()
+    annotate_card_versions(page_obj)
+    stats = get_stats(author)
+    return {
+        'author': author,
+        'stats': stats,
+        'posts_count': stats.posts_count,
+        'following': False,
+        'page_obj': page_obj,
+    }
+
+
+def render_page(engine, request, context):
+    # Кэш фрагментов сброшен: меряем рендер карточек, а не чтение кэша.
+    cache.clear()
+    started = time.perf_counter()
+    engine.get_template(TEMPLATE).render(RequestContext(request, context))
+    return (time.perf_counter() - started) * 1000
+
+
+def render_cost(mode, context, iterations=50, warmup=3):
+    engine = engine_for(mode)
+    request = RequestFactory(**CLIENT_DEFAULTS).get('/')
+    request.user = context['author']
+    for _ in range(warmup):
+        render_page(engine, request, context)
+    timings = [
+        render_page(engine, request, context) for _ in range(iterations)
+    ]
+    metrics.start()
+    try:
+        render_page(engine, request, context)
+        templates = {
+            name: {'renders': count, 'ms': round(seconds * 1000, 3)}
+            for name, (count, seconds) in metrics.current().templates.items()
+        }
+    finally:
+        metrics.stop()
+    return {
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p90_ms': round(percentile(timings, 0.9), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'templates': templates,
+    }
+
+
+def run(iterations=50, warmup=3, modes=None):
+    """Стоимость рендера страницы профиля во всех режимах загрузки."""
+    context = profile_context()
+    if context is None:
+        return {}
+    return {
+        mode: render_cost(mode, context, iterations, warmup)
+        for mode in (modes or MODES)
+    }
@@ -0,0 +1,106 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from benchmarks import runner, templates
+from benchmarks.concurrency import BASELINE_PRAGMAS, run_profile
+from benchmarks.generator import Generator, power_law
+from core.db import sqlite_pragmas
+from posts.models import Comment, Follow, Post, TimelineEntry, UserStats
+
+
+class GeneratorTests(TestCase):
+    def test_generate_small_dataset(self):
+        """Генератор создает связанные данные и честные счетчики"""
+        created = Generator(seed=1, batch_size=50).generate(
+            users=20, groups=3, posts=200, comments=100, follows=5
+        )
+        self.assertEqual(created['posts'], 200)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertEqual(Follow.objects.count(), created['follows'])
+        self.assertEqual(UserStats.objects.count(), 20)
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertGreater(
+            Post.objects.dates('pub_date', 'day').count(), 1
+        )
+        top = UserStats.objects.order_by('-posts_count').first()
+        self.assertEqual(top.posts_count, top.user.posts.count())
+
+    def test_power_law_is_skewed(self):
+        """Первый элемент степенного распределения самый тяжелый"""
+        weights = power_law(100)
+        self.assertEqual(len(weights), 100)
+        self.assertGreater(weights[0], weights[-1] - weights[-2])
+
+
+class RunnerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Generator(seed=2, batch_size=50).generate(
+            users=10, groups=2, posts=60, comments=30, follows=3,
+            search_index=True,
+        )
+
+    def test_run_and_compare(self):
+        """Прогон сохраняет перцентили и запросы, сравнение ищет регрессии"""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(BENCHMARK_RESULTS_DIR=directory):
+                call_command(
+                    'bench_run', iterations=2, warmup=0, stdout=StringIO()
+                )
+            files = os.listdir(directory)
+            self.assertEqual(len(files), 1)
+            result = runner.load(os.path.join(directory, files[0]))
+        self.assertIn('index', result['scenarios'])
+        self.assertIn('follow_index', result['scenarios'])
+        for row in result['scenarios'].values():
+            self.assertEqual(row['status'], 200)
+            self.assertGreater(row['queries'], 0)
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+        slower = {'scenarios': {
+            name: dict(row, p90_ms=row['p90_ms'] * 2)
+            for name, row in result['scenarios'].items()
+        }}
+        rows = runner.compare(result, slower)
+        self.assertTrue(all(row['regression'] for row in rows))
+        self.assertFalse(any(
+            row['regression'] for row in runner.compare(result, result)
+        ))
+
+    def test_percentile(self):
+        """Перцентиль по ближайшему рангу"""
+        values = list(range(1, 101))
+        self.assertEqual(runner.percentile(values, 0.5), 50)
+        self.assertEqual(runner.percentile(values, 0.99), 99)
+
+
+class ConcurrencyTests(SimpleTestCase):
+    def test_profiles_report_throughput(self):
+        """Оба профиля SQLite выдают пропускную способность и ошибки"""
+        for pragmas in (BASELINE_PRAGMAS, sqlite_pragmas()):
+            report = run_profile(
+                pragmas, readers=1, writers=1, seconds=0.2, rows=100
+            )
+            for role in ('read', 'write'):
+                with self.subTest(pragmas=pragmas, role=role):
+                    self.assertGreater(report[role]['ops_per_second'], 0)
+                    self.assertIn('errors', report[role])
+
+
+class TemplateBenchmarkTests(TestCase):
+    def test_render_cost_by_mode(self):
+        """Замер рендера профиля во всех режимах загрузки шаблонов"""
+        Generator(seed=3, batch_size=50).generate(
+            users=5, groups=1, posts=30, comments=0, follows=1
+        )
+        result = templates.run(iterations=2, warmup=1)
+        self.assertEqual(set(result), set(templates.MODES))
+        for row in result.values():
+            self.assertGreater(row['mean_ms'], 0)
+            self.assertEqual(
+                row['templates']['posts/includes/post.html']['renders'], 10
+            )
@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'name', 'status', 'attempts', 'run_at', 'locked_by', 'key',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = ('created', 'finished', 'locked_at', 'last_error')
+
+
+admin.site.register(Task, TaskAdmin)
@@ -3,3 +3,18 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+
+        from .auth import forget_saved_user
+        from .db import configure_connection
+        from .metrics import instrument_templates
+        instrument_templates()
+        connection_created.connect(configure_connection)
+        for signal in (post_save, post_delete):
+            signal.connect(
+                forget_saved_user, sender=settings.AUTH_USER_MODEL
+            )
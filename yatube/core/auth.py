@@ -0,0 +1,179 @@
+import threading
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from django.core.cache import cache
+from django.db import router
+from django.utils.crypto import constant_time_compare
+
+_local = threading.local()
+
+USER_KEY = 'auth:user-fields:{}'
+TOKEN_SALT = 'core.auth.token'
+
+
+def user_timeout():
+    return getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+
+def token_max_age():
+    return getattr(settings, 'API_TOKEN_MAX_AGE', 30 * 24 * 60 * 60)
+
+
+def reset():
+    """Новый кэш пользователей запроса."""
+    _local.users = {}
+
+
+def clear():
+    _local.users = None
+
+
+def shared(user):
+    """Один объект на пользователя в пределах запроса.
+
+    Полностью загруженный пользователь запоминается, и request.user
+    берет его без кэша и базы. Если этот пользователь уже известен
+    запросу, возвращается известный объект.
+    """
+    users = getattr(_local, 'users', None)
+    if users is None or user is None:
+        return user
+    if user.get_deferred_fields() - {'password'}:
+        return user
+    return users.setdefault(user.pk, user)
+
+
+def forget(user_id):
+    cache.delete(USER_KEY.format(user_id))
+    users = getattr(_local, 'users', None)
+    if users:
+        users.pop(user_id, None)
+
+
+def to_cache(user):
+    """Поля пользователя для общего кэша — все, кроме хэша пароля.
+
+    Вместо пароля хранится хэш сессии: по нему проверяется, что пароль
+    после входа не менялся.
+    """
+    fields = {
+        field.attname: getattr(user, field.attname)
+        for field in user._meta.concrete_fields
+        if field.attname != 'password'
+    }
+    return {'fields': fields, 'session_hash': user.get_session_auth_hash()}
+
+
+def from_cache(data):
+    """Пользователь из to_cache(); пароль — отложенное поле."""
+    model = auth.get_user_model()
+    fields = data['fields']
+    user = model.from_db(
+        router.db_for_read(model), list(fields), list(fields.values())
+    )
+    user._session_hash = data['session_hash']
+    return user
+
+
+def session_hash(user):
+    # Пароль загружен — например, его только что сменили, — считаем заново.
+    if 'password' in user.get_deferred_fields():
+        return user._session_hash
+    return user.get_session_auth_hash()
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который не ходит в базу за пользователем сессии.
+
+    Пользователь ищется в кэше запроса, потом в общем кэше на
+    USER_CACHE_TIMEOUT секунд; хэш пароля в общий кэш не попадает.
+    Сохранение пользователя сбрасывает его кэш, поэтому смена пароля
+    по-прежнему завершает сессии.
+    """
+
+    def get_user(self, user_id):
+        user_id = auth.get_user_model()._meta.pk.to_python(user_id)
+        users = getattr(_local, 'users', None) or {}
+        user = users.get(user_id)
+        if user is None:
+            key = USER_KEY.format(user_id)
+            data = cache.get(key)
+            if data is None:
+                user = super().get_user(user_id)
+                if user is None:
+                    return None
+                cache.set(key, to_cache(user), user_timeout())
+            else:
+                user = from_cache(data)
+            user = shared(user)
+        return user if self.user_can_authenticate(user) else None
+
+
+def session_user(request):
+    """auth.get_user, который сверяет хэш сессии без хэша пароля."""
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    backend = auth.load_backend(backend_path)
+    if not isinstance(backend, CachedModelBackend):
+        return auth.get_user(request)
+    user = backend.get_user(user_id)
+    if user is None:
+        return AnonymousUser()
+    expected = request.session.get(auth.HASH_SESSION_KEY)
+    if not expected or not constant_time_compare(
+        expected, session_hash(user)
+    ):
+        request.session.flush()
+        return AnonymousUser()
+    return user
+
+
+def make_token(user):
+    """Подписанный токен API: id пользователя и хэш его сессии.
+
+    Строк в базе нет; смена пароля меняет хэш и отзывает все токены.
+    """
+    return signing.dumps(
+        {'id': user.pk, 'hash': session_hash(user)}, salt=TOKEN_SALT
+    )
+
+
+def token_user(token):
+    """Пользователь по токену make_token() или None.
+
+    Пользователь берется тем же кэшем, что и для сессий, поэтому
+    запрос с токеном не ходит в базу за пользователем.
+    """
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=token_max_age())
+    except signing.BadSignature:
+        return None
+    user = CachedModelBackend().get_user(data['id'])
+    if user is None or not constant_time_compare(
+        data['hash'], session_hash(user)
+    ):
+        return None
+    return user
+
+
+def get_user(request):
+    """request.user без обращения к сессии у посетителей без cookie."""
+    if not hasattr(request, '_cached_user'):
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            request._cached_user = session_user(request)
+        else:
+            request._cached_user = AnonymousUser()
+    return request._cached_user
+
+
+def forget_saved_user(sender, instance, **kwargs):
+    forget(instance.pk)
@@ -0,0 +1,381 @@
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+_MISSING = object()
+_stale = threading.local()
+
+
+class InstrumentedLocMemCache(LocMemCache):
+    """LocMemCache, который считает попадания и промахи для метрик."""
+
+    def get(self, key, default=None, version=None):
+        # get_many у LocMemCache тоже идет через get.
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            metrics.record_cache(0, 1)
+            return default
+        metrics.record_cache(1, 0)
+        return value
+
+
+class SQLiteCache(BaseCache):
+    """Общий для всех процессов кэш в отдельном файле SQLite (режим WAL).
+
+    LOCATION — путь к файлу. Просроченные записи чтение пропускает,
+    а удаляются они изредка при записи (OPTIONS['CULL_PROBABILITY'])
+    и в add() по своему ключу.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        self.cull_probability = options.get('CULL_PROBABILITY', 0.01)
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение SQLite нельзя делить между потоками и процессами.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL'
+                ') WITHOUT ROWID'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self, statements):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _alive(expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self._connection().execute(
+            'SELECT key, value, expires FROM cache WHERE key IN ({})'.format(
+                ', '.join('?' * len(keys))
+            ),
+            list(keys),
+        ).fetchall()
+        return {
+            keys[key]: pickle.loads(value)
+            for key, value, expires in rows if self._alive(expires)
+        }
+
+    def _cull(self, connection):
+        if random.random() < self.cull_probability:
+            connection.execute(
+                'DELETE FROM cache WHERE expires < ?', [time.time()]
+            )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self._key(key, version),
+             pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             expires)
+            for key, value in data.items()
+        ]
+
+        def statements(connection):
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                rows,
+            )
+            self._cull(connection)
+
+        self._write(statements)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+        def statements(connection):
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires < ?',
+                [key, time.time()],
+            )
+            return connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                [key, value, expires],
+            ).rowcount == 1
+
+        return self._write(statements)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+
+        def statements(connection):
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', [key]
+            ).fetchone()
+            if row is None or not self._alive(row[1]):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                [pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key],
+            )
+            return value
+
+        return self._write(statements)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        return self._write(lambda connection: connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ?', [expires, key]
+        ).rowcount == 1)
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [(self._key(key, version),) for key in keys]
+        self._write(lambda connection: connection.executemany(
+            'DELETE FROM cache WHERE key = ?', keys
+        ))
+
+    def clear(self):
+        self._write(lambda connection: connection.execute(
+            'DELETE FROM cache'
+        ))
+
+    def close(self, **kwargs):
+        # Соединение живет весь поток: открывать SQLite на каждый
+        # запрос дороже, чем держать.
+        pass
+
+
+class LocalLRU:
+    """Маленький LRU в памяти процесса с коротким временем жизни записей."""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.data[key]
+                return _MISSING
+            self.data.move_to_end(key)
+        return pickle.loads(value)
+
+    def set(self, key, value):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.timeout, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: LRU процесса перед общим хранилищем.
+
+    Запись идет в оба уровня, чтение — сначала из LRU. Другие процессы
+    узнают об изменении, когда истечет LOCAL_TIMEOUT секунд, поэтому он
+    должен быть коротким. add и incr всегда выполняются в общем
+    хранилище: на них держатся блокировки и версии.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = dict(params.get('OPTIONS', {}))
+        backend = import_string(
+            options.pop('SHARED_BACKEND', 'core.cache.SQLiteCache')
+        )
+        self.local = LocalLRU(
+            options.pop('LOCAL_MAX_ENTRIES', 1000),
+            options.pop('LOCAL_TIMEOUT', 2),
+        )
+        self.shared = backend(location, dict(params, OPTIONS=options))
+
+    def _local_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(self._local_key(key, version))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            shared = self.shared.get_many(missing, version)
+            for key, value in shared.items():
+                self.local.set(self._local_key(key, version), value)
+            found.update(shared)
+        metrics.record_cache(len(found), len(keys) - len(found))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        for key, value in data.items():
+            self.local.set(self._local_key(key, version), value)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(self._local_key(key, version))
+        return self.shared.add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(self._local_key(key, version))
+        return self.shared.incr(key, delta, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self.local.delete(self._local_key(key, version))
+        self.shared.delete_many(keys, version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+def track_stale():
+    """Начинает учет прежних версий, отданных get_or_compute."""
+    _stale.served = False
+
+
+def served_stale():
+    """Отдавал ли get_or_compute после track_stale() прежнюю версию."""
+    return getattr(_stale, 'served', False)
+
+
+def get_or_compute(key, compute, timeout, version=None, beta=1.0,
+                   lock_timeout=10, wait=0.5, cache=None):
+    """Значение горячего ключа с защитой от «давки» при пересчете.
+
+    В кэше лежит (version, value, expires, delta), где delta — сколько
+    занял прошлый пересчет. Значение другой версии или близкое к
+    истечению (вероятностный ранний пересчет, XFetch) пересчитывает
+    только получивший блокировку процесс; остальные отдают прежнее
+    значение, а если его нет — недолго ждут результата. Отданную
+    прежнюю версию отмечает served_stale().
+    """
+    cache = cache or default_cache
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None:
+        cached_version, value, expires, delta = entry
+        early = delta * beta * -math.log(1 - random.random())
+        if cached_version == version and now + early < expires:
+            return value
+    lock = f'{key}:lock'
+    locked = cache.add(lock, 1, lock_timeout)
+    if not locked:
+        if entry is not None:
+            if entry[0] != version:
+                _stale.served = True
+            return entry[1]
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(0.025)
+            fresh = cache.get(key)
+            if fresh is not None and fresh[0] == version:
+                return fresh[1]
+    try:
+        started = time.time()
+        value = compute()
+        delta = time.time() - started
+        # Запись живет дольше своего срока, чтобы во время следующего
+        # пересчета было что отдать вместо ожидания.
+        cache.set(
+            key, (version, value, started + timeout, delta), timeout * 2
+        )
+        return value
+    finally:
+        if locked:
+            cache.delete(lock)
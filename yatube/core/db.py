@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.conf import settings
+
+
+def sqlite_pragmas():
+    """PRAGMA соединений SQLite; единственный источник — SQLITE_PRAGMAS."""
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Приемник connection_created: настройки SQLite на новое соединение."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, sqlite_pragmas())
+
+
+def copy_sqlite(source, target):
+    """Снимок файла SQLite через backup API: так локально живут реплики."""
+    with sqlite3.connect(source) as origin, sqlite3.connect(target) as copy:
+        origin.backup(copy)
+    origin.close()
+    copy.close()
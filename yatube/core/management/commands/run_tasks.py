@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.tasks import run_pool
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет отложенные задачи из очереди в нескольких процессах; '
+        'с --once выходит, когда готовых задач не осталось'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--sleep', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true')
+
+    def handle(self, *args, **options):
+        processed = run_pool(
+            options['processes'], once=options['once'],
+            sleep=options['sleep'],
+        )
+        if processed is not None:
+            self.stdout.write(f'Выполнено задач: {processed}')
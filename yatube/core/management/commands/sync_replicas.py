@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from core import routers
+from core.db import copy_sqlite
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик DATABASE_REPLICAS; '
+        'с --every повторяет копирование, изображая отставание реплик'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=0)
+
+    def handle(self, *args, **options):
+        databases = settings.DATABASES
+        aliases = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not aliases:
+            raise CommandError('Реплики не настроены: задайте DB_REPLICAS')
+        for alias in (DEFAULT_DB_ALIAS, *aliases):
+            if databases[alias]['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f'{alias}: поддерживается только SQLite')
+        source = databases[DEFAULT_DB_ALIAS]['NAME']
+        while True:
+            # Снимок содержит все, что закоммичено до начала копирования.
+            started = time.time()
+            for alias in aliases:
+                copy_sqlite(source, databases[alias]['NAME'])
+                self.stdout.write(f'{alias}: {databases[alias]["NAME"]}')
+            routers.mark_synced(started)
+            if options['every'] <= 0:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,248 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.base import Template
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_local = threading.local()
+
+
+class RequestStats:
+    """Счетчики одного запроса; живут в thread-local, пока идет запрос."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Имя шаблона -> [число рендеров, секунды с учетом вложенных].
+        self.templates = defaultdict(lambda: [0, 0.0])
+
+
+class Registry:
+    """Метрики запросов, общие для всех процессов.
+
+    Наблюдения копятся в памяти процесса и раз в METRICS_FLUSH_INTERVAL
+    секунд прибавляются к строкам файла SQLite METRICS_PATH; render()
+    отдает сумму по всем воркерам, и она переживает перезапуск. Без
+    METRICS_PATH каждый процесс отдает только свои метрики — тогда
+    опрашивать нужно каждый воркер.
+    """
+
+    def __init__(self, path=None):
+        self.lock = threading.Lock()
+        self._path = path
+        self._local = threading.local()
+        self.pending = defaultdict(float)
+        self.flushed = time.monotonic()
+
+    @property
+    def path(self):
+        return self._path or getattr(settings, 'METRICS_PATH', None)
+
+    def _connection(self):
+        # Соединение SQLite нельзя делить между потоками и процессами.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.key != (os.getpid(), self.path):
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS metrics ('
+                'metric TEXT, view TEXT, le TEXT, value REAL NOT NULL, '
+                'PRIMARY KEY (metric, view, le)) WITHOUT ROWID'
+            )
+            self._local.connection = connection
+            self._local.key = (os.getpid(), self.path)
+        return connection
+
+    def observe(self, view, duration, stats):
+        with self.lock:
+            self.pending['requests', view, ''] += 1
+            self.pending['seconds', view, ''] += duration
+            for bound in BUCKETS:
+                if duration <= bound:
+                    self.pending['bucket', view, str(bound)] += 1
+            for name, value in (
+                ('db_queries_total', stats.queries),
+                ('db_query_seconds_total', stats.query_seconds),
+                ('template_render_seconds_total', stats.template_seconds),
+                ('cache_hits_total', stats.cache_hits),
+                ('cache_misses_total', stats.cache_misses),
+            ):
+                self.pending[name, view, ''] += value
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        if time.monotonic() - self.flushed >= interval:
+            self.flush()
+
+    def flush(self):
+        """Прибавляет накопленное процессом к общим строкам."""
+        if not self.path:
+            return
+        with self.lock:
+            rows, self.pending = self.pending, defaultdict(float)
+            self.flushed = time.monotonic()
+        if not rows:
+            return
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO metrics (metric, view, le, value) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT (metric, view, le) '
+                'DO UPDATE SET value = value + excluded.value',
+                [(*key, value) for key, value in rows.items()],
+            )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def values(self):
+        if not self.path:
+            with self.lock:
+                return dict(self.pending)
+        self.flush()
+        rows = self._connection().execute(
+            'SELECT metric, view, le, value FROM metrics'
+        ).fetchall()
+        return {(metric, view, le): value for metric, view, le, value in rows}
+
+    def render(self, sample_rate):
+        """Текстовый формат экспозиции Prometheus."""
+        values = self.values()
+        lines = [
+            '# TYPE yatube_metrics_sample_rate gauge',
+            f'yatube_metrics_sample_rate {sample_rate}',
+            '# TYPE yatube_request_duration_seconds histogram',
+        ]
+        views = sorted(
+            view for metric, view, _ in values if metric == 'requests'
+        )
+        for view in views:
+            label = f'view="{view}"'
+            requests = values['requests', view, '']
+            for bound in BUCKETS:
+                count = values.get(('bucket', view, str(bound)), 0)
+                lines.append(
+                    'yatube_request_duration_seconds_bucket'
+                    f'{{{label},le="{bound}"}} {count:g}'
+                )
+            lines.append(
+                'yatube_request_duration_seconds_bucket'
+                f'{{{label},le="+Inf"}} {requests:g}'
+            )
+            lines.append(
+                'yatube_request_duration_seconds_sum'
+                f'{{{label}}} {values["seconds", view, ""]:.6f}'
+            )
+            lines.append(
+                'yatube_request_duration_seconds_count'
+                f'{{{label}}} {requests:g}'
+            )
+        names = sorted({
+            metric for metric, _, _ in values
+            if metric not in ('requests', 'seconds', 'bucket')
+        })
+        for name in names:
+            lines.append(f'# TYPE yatube_{name} counter')
+            for (metric, view, _), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'yatube_{name}{{view="{view}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def current():
+    return getattr(_local, 'stats', None)
+
+
+def start():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def stop():
+    _local.stats = None
+
+
+def count_queries(execute, sql, params, many, context):
+    """Обертка connection.execute_wrapper: число и время SQL-запросов."""
+    stats = current()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += time.perf_counter() - started
+
+
+def record_cache(hits, misses):
+    stats = current()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+@contextmanager
+def track_template(name):
+    """Время рендера шаблона или include; верхний уровень — отдельно."""
+    stats = current()
+    if stats is None:
+        yield
+        return
+    stats.template_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.template_depth -= 1
+        if not stats.template_depth:
+            stats.template_seconds += elapsed
+        row = stats.templates[name or '<string>']
+        row[0] += 1
+        row[1] += elapsed
+
+
+def server_timing(stats, limit=10):
+    """Заголовок Server-Timing: самые долгие шаблоны запроса."""
+    rows = sorted(
+        stats.templates.items(), key=lambda item: item[1][1], reverse=True
+    )[:limit]
+    return ', '.join(
+        f'tpl{index};desc="{name} x{count}";dur={seconds * 1000:.2f}'
+        for index, (name, (count, seconds)) in enumerate(rows)
+    )
+
+
+def instrument_templates():
+    """Считает время рендера шаблонов в запросе.
+
+    Вложенные include тоже проходят через Template.render: каждый
+    попадает в разбивку по шаблонам, а в общее время — только внешний.
+    """
+    if getattr(Template.render, 'instrumented', False):
+        return
+    original = Template.render
+
+    def render(self, context):
+        if current() is None:
+            return original(self, context)
+        with track_template(self.origin.template_name or self.name):
+            return original(self, context)
+
+    render.instrumented = True
+    Template.render = render
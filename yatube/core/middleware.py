@@ -0,0 +1,106 @@
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from . import auth, metrics, routers
+
+
+class MetricsMiddleware:
+    """Латентность, SQL, рендер шаблонов и кэш по имени URL.
+
+    Замеряется только доля запросов METRICS_SAMPLE_RATE. С
+    TEMPLATE_PROFILING ответ получает заголовок Server-Timing с
+    временем рендера по шаблонам и include.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+        stats = metrics.start()
+        started = time.perf_counter()
+        wrappers = [
+            connection.execute_wrapper(metrics.count_queries)
+            for connection in connections.all()
+        ]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+            metrics.stop()
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        metrics.registry.observe(view, time.perf_counter() - started, stats)
+        if getattr(settings, 'TEMPLATE_PROFILING', False) and stats.templates:
+            response['Server-Timing'] = metrics.server_timing(stats)
+        return response
+
+
+class ReplicaPinMiddleware:
+    """Чтение своих записей при работе с репликами.
+
+    Небезопасные методы целиком идут в основную базу. Если запрос
+    что-то записал, браузер получает cookie, и его запросы читают из
+    основной базы еще REPLICA_PIN_SECONDS секунд — пока реплики
+    догоняют. Остальные читают из реплик, только пока те не отстают
+    (core.routers.replicas_current).
+    """
+
+    cookie_name = 'primary_until'
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reset()
+        if not routers.replicas():
+            return self.get_response(request)
+        try:
+            until = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            until = 0
+        if request.method not in self.safe_methods or until > time.time():
+            routers.pin()
+        routers.start()
+        try:
+            response = self.get_response(request)
+            wrote = routers.wrote()
+        finally:
+            routers.finish()
+            routers.reset()
+        if wrote:
+            seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+            response.set_cookie(
+                self.cookie_name, f'{time.time() + seconds:.3f}',
+                max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware без лишних запросов к базе.
+
+    Без cookie сессии пользователь анонимный сразу, и сессия не
+    читается вовсе. Остальным пользователя отдает
+    core.auth.CachedModelBackend; загруженные за запрос пользователи
+    общие для request.user и представлений (core.auth.shared).
+    """
+
+    def process_request(self, request):
+        auth.reset()
+        request.user = SimpleLazyObject(lambda: auth.get_user(request))
+
+    def process_response(self, request, response):
+        auth.clear()
+        return response
@@ -0,0 +1,137 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+_local = threading.local()
+
+WRITTEN_KEY = 'replicas:written'
+SYNCED_KEY = 'replicas:synced'
+
+# Записи, которых страницы не показывают: очередь задач читают только
+# воркеры, и всегда из основной базы.
+UNTRACKED_WRITES = {'core.Task'}
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin():
+    """Оставшиеся чтения запроса идут в основную базу."""
+    _local.pinned = True
+
+
+def pinned():
+    return getattr(_local, 'pinned', False)
+
+
+def wrote():
+    return getattr(_local, 'wrote', False)
+
+
+def _stamps():
+    # Мимо LRU процесса: отметка оттуда может отстать на LOCAL_TIMEOUT.
+    return getattr(cache, 'shared', cache)
+
+
+def mark_written():
+    """Отмечает время записи в основную базу."""
+    _stamps().set(WRITTEN_KEY, time.time(), None)
+
+
+def mark_synced(started):
+    """Реплики получили все, что было закоммичено до started."""
+    _stamps().set(SYNCED_KEY, started, None)
+
+
+def replicas_current():
+    """Реплики не отстают от последней записи в основную базу.
+
+    Версии фрагментов, счетчики и отметки для ETag меняются сразу после
+    коммита. Страница, собранная с отставшей реплики, легла бы в общий
+    кэш под новой версией, поэтому до следующей синхронизации все
+    читают из основной базы.
+    """
+    stamps = _stamps().get_many([WRITTEN_KEY, SYNCED_KEY])
+    synced = stamps.get(SYNCED_KEY)
+    written = stamps.get(WRITTEN_KEY)
+    return synced is not None and (written is None or synced > written)
+
+
+def start():
+    """Начало запроса: можно ли читать из реплик."""
+    _local.current = bool(replicas()) and not pinned() and (
+        replicas_current()
+    )
+
+
+def finish():
+    """Конец запроса или задачи: все записи уже закоммичены."""
+    if wrote() and replicas():
+        mark_written()
+
+
+def _committed():
+    _local.marking = False
+    mark_written()
+
+
+def reset():
+    _local.pinned = False
+    _local.wrote = False
+    _local.current = False
+    _local.marking = False
+
+
+class PrimaryReplicaRouter:
+    """Запись — в основную базу, чтение — в случайную реплику.
+
+    Реплики читаются только в запросах (см. start()) и только пока они
+    не отстают от основной базы. Чтение остается в основной базе и
+    тогда, когда запрос закреплен за ней
+    (см. core.middleware.ReplicaPinMiddleware), уже что-то записал или
+    идет внутри транзакции: иначе можно не увидеть свою же запись,
+    пока она не дошла до реплики.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        pool = replicas()
+        if (
+            not pool or not getattr(_local, 'current', False)
+            or pinned() or wrote()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(pool)
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        if (
+            replicas() and model._meta.label not in UNTRACKED_WRITES
+            and not getattr(_local, 'marking', False)
+        ):
+            # Отметка сразу уводит чужие чтения с реплик, а повтор после
+            # коммита не дает синхронизации посреди транзакции сойти за
+            # полную. Без транзакции повтор делает finish().
+            mark_written()
+            if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+                _local.marking = True
+                transaction.on_commit(_committed)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема приходит на реплики вместе с данными.
+        return db not in replicas()
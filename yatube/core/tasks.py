@@ -0,0 +1,244 @@
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+from functools import update_wrapper
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import routers
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+
+def eager():
+    return getattr(settings, 'TASKS_EAGER', False)
+
+
+def lock_timeout():
+    return getattr(settings, 'TASKS_LOCK_TIMEOUT', 600)
+
+
+class TaskFunction:
+    """Функция, которую можно вызвать сразу или отложить через delay()."""
+
+    def __init__(self, function, max_attempts, backoff):
+        update_wrapper(self, function)
+        self.function = function
+        self.name = f'{function.__module__}.{function.__qualname__}'
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+    def delay(self, *args, key=None, countdown=0, **kwargs):
+        """Ставит вызов в очередь; задача с тем же key ставится однажды.
+
+        Строка задачи пишется в текущей транзакции, поэтому откат
+        отменяет и ее. При TASKS_EAGER вызов выполняется в этом же
+        процессе после коммита — так удобно без запущенного воркера.
+        """
+        if eager():
+            transaction.on_commit(lambda: self(*args, **kwargs))
+            return None
+        return enqueue(self, args, kwargs, key, countdown)
+
+    def debounce(self, *args, key, window):
+        """delay() не чаще раза в window секунд на key.
+
+        Все вызовы за окно дают одну задачу, которая выполнится после
+        конца окна. При window <= 0 это обычный delay() без ключа.
+        """
+        if window <= 0:
+            return self.delay(*args)
+        now = time.time()
+        current = int(now // window)
+        return self.delay(
+            *args,
+            key=f'{key}:{current}',
+            countdown=(current + 1) * window - now,
+        )
+
+    def delay_many(self, calls):
+        """delay() для пачки вызовов [(args, key), ...] одним INSERT.
+
+        Вызовы с ключом уже поставленной задачи пропускаются; упавшую
+        задачу с тем же ключом, в отличие от delay(), это не повторит.
+        """
+        if eager():
+            for args, key in calls:
+                self.delay(*args, key=key)
+            return
+        now = timezone.now()
+        Task.objects.bulk_create(
+            (
+                Task(
+                    name=self.name,
+                    arguments=json.dumps({'args': list(args), 'kwargs': {}}),
+                    key=key,
+                    max_attempts=self.max_attempts,
+                    run_at=now,
+                )
+                for args, key in calls
+            ),
+            ignore_conflicts=True,
+        )
+
+    def retry_delay(self, attempt):
+        # Экспоненциальная задержка с разбросом, чтобы упавшие разом
+        # задачи не возвращались тоже разом.
+        return self.backoff * 2 ** (attempt - 1) * random.uniform(1, 1.5)
+
+
+def task(function=None, *, max_attempts=5, backoff=10):
+    """Декоратор: f(...) работает как раньше, f.delay(...) — в фоне."""
+    def decorator(function):
+        return TaskFunction(function, max_attempts, backoff)
+    if function is not None:
+        return decorator(function)
+    return decorator
+
+
+def enqueue(function, args, kwargs, key=None, countdown=0):
+    fields = {
+        'name': function.name,
+        'arguments': json.dumps({'args': list(args), 'kwargs': kwargs}),
+        'max_attempts': function.max_attempts,
+        'run_at': timezone.now() + timedelta(seconds=countdown),
+    }
+    if key is None:
+        return Task.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Task.objects.create(key=key, **fields)
+    except IntegrityError:
+        existing = Task.objects.get(key=key)
+    if existing.status == Task.FAILED:
+        # Окончательно упавшую задачу с тем же ключом можно повторить.
+        Task.objects.filter(pk=existing.pk, status=Task.FAILED).update(
+            status=Task.QUEUED, attempts=0, last_error='', finished=None,
+            **fields
+        )
+    return existing
+
+
+def due():
+    now = timezone.now()
+    stale = now - timedelta(seconds=lock_timeout())
+    return Task.objects.filter(
+        Q(status=Task.QUEUED, run_at__lte=now)
+        | Q(status=Task.RUNNING, locked_at__lt=stale)
+    )
+
+
+def claim(worker, candidates=10):
+    """Забирает одну готовую задачу или возвращает None.
+
+    Условный UPDATE проходит только у одного воркера, поэтому
+    блокировки строк (которых нет в SQLite) не нужны. Задачи
+    зависшего воркера снова берутся через TASKS_LOCK_TIMEOUT секунд.
+    """
+    rows = due().values_list('pk', 'status', 'locked_at')[:candidates]
+    for task_id, status, locked_at in rows:
+        claimed = Task.objects.filter(
+            pk=task_id, status=status, locked_at=locked_at
+        ).update(
+            status=Task.RUNNING,
+            locked_at=timezone.now(),
+            locked_by=worker,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=task_id)
+    return None
+
+
+def execute(row):
+    """Выполняет задачу; при ошибке ставит повтор или отмечает провал."""
+    function = None
+    try:
+        function = import_string(row.name)
+        if not isinstance(function, TaskFunction):
+            raise ImportError(f'{row.name} не помечена как задача')
+        arguments = json.loads(row.arguments)
+        function(*arguments['args'], **arguments['kwargs'])
+    except Exception:
+        logger.exception('Задача %s (%s) упала', row.pk, row.name)
+        error = traceback.format_exc()
+        retry = (
+            isinstance(function, TaskFunction)
+            and row.attempts < row.max_attempts
+        )
+        if retry:
+            Task.objects.filter(pk=row.pk).update(
+                status=Task.QUEUED, last_error=error, locked_at=None,
+                locked_by='',
+                run_at=timezone.now() + timedelta(
+                    seconds=function.retry_delay(row.attempts)
+                ),
+            )
+        else:
+            Task.objects.filter(pk=row.pk).update(
+                status=Task.FAILED, last_error=error,
+                finished=timezone.now(),
+            )
+        return False
+    Task.objects.filter(pk=row.pk).update(
+        status=Task.DONE, last_error='', finished=timezone.now()
+    )
+    return True
+
+
+def work(worker=None, once=False, sleep=1.0):
+    """Цикл воркера; с once=True выходит, когда готовых задач не осталось."""
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    processed = 0
+    while True:
+        row = claim(worker)
+        if row is None:
+            if once:
+                return processed
+            time.sleep(sleep)
+            continue
+        try:
+            execute(row)
+        finally:
+            routers.finish()
+            routers.reset()
+        processed += 1
+
+
+def run_pool(processes, once=False, sleep=1.0):
+    """Запускает воркеры в отдельных процессах и ждет их завершения."""
+    if processes <= 1:
+        return work(once=once, sleep=sleep)
+    # Открытые соединения нельзя наследовать через fork.
+    connections.close_all()
+    pool = [
+        multiprocessing.Process(target=work, kwargs={
+            'once': once, 'sleep': sleep,
+        })
+        for _ in range(processes)
+    ]
+    for process in pool:
+        process.start()
+    try:
+        for process in pool:
+            process.join()
+    except KeyboardInterrupt:
+        for process in pool:
+            process.terminate()
+        for process in pool:
+            process.join()
+    return None
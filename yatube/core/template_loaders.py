@@ -0,0 +1,87 @@
+import threading
+
+from django.template import Node, NodeList
+from django.template.defaulttags import IfNode
+from django.template.loader_tags import IncludeNode
+from django.template.loaders import cached
+
+from . import metrics
+
+
+class InlinedIncludeNode(Node):
+    """Скомпилированное тело шаблона на месте {% include %}.
+
+    Рендерит то же, что IncludeNode, но без поиска шаблона по имени и
+    без Template.render на каждой итерации цикла.
+    """
+
+    child_nodelists = ('nodelist',)
+
+    def __init__(self, template):
+        self.template = template
+        self.nodelist = template.nodelist
+
+    def render(self, context):
+        with metrics.track_template(self.template.origin.template_name):
+            with context.render_context.push_state(self.template):
+                with context.push():
+                    return self.nodelist.render(context)
+
+
+def constant_name(node):
+    expression = node.template
+    if expression.filters or not isinstance(expression.var, str):
+        return None
+    return str(expression.var)
+
+
+def child_nodelists(node):
+    if isinstance(node, IfNode):
+        # IfNode.nodelist собирается заново при каждом обращении.
+        return [nodelist for _, nodelist in node.conditions_nodelists]
+    return [
+        getattr(node, name) for name in node.child_nodelists
+        if isinstance(getattr(node, name, None), NodeList)
+    ]
+
+
+def inline_includes(nodelist, engine, names):
+    """Заменяет {% include 'имя' %} из names на тело шаблона."""
+    for index, node in enumerate(nodelist):
+        if (
+            isinstance(node, IncludeNode)
+            and not node.extra_context
+            and not node.isolated_context
+            and constant_name(node) in names
+        ):
+            nodelist[index] = InlinedIncludeNode(
+                engine.get_template(constant_name(node))
+            )
+            continue
+        for child in child_nodelists(node):
+            inline_includes(child, engine, names)
+
+
+class Loader(cached.Loader):
+    """cached.Loader, который встраивает перечисленные include.
+
+    Шаблон компилируется и обрабатывается один раз на процесс:
+    ('core.template_loaders.Loader', [загрузчики], ['posts/...html']).
+    """
+
+    def __init__(self, engine, loaders, inline=()):
+        super().__init__(engine, loaders)
+        self.inline = frozenset(inline)
+        self.lock = threading.RLock()
+
+    def get_template(self, template_name, skip=None):
+        template = super().get_template(template_name, skip)
+        if self.inline and not getattr(template, 'inlined', False):
+            with self.lock:
+                if not getattr(template, 'inlined', False):
+                    # Флаг раньше обхода: include самого себя не зациклит.
+                    template.inlined = True
+                    inline_includes(
+                        template.nodelist, self.engine, self.inline
+                    )
+        return template
@@ -0,0 +1,50 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+
+from core.cache import get_or_compute
+
+register = template.Library()
+
+
+class HotCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, version, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.version = version
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = make_template_fragment_key(
+            self.name, [var.resolve(context) for var in self.vary_on]
+        )
+        return mark_safe(get_or_compute(
+            key,
+            lambda: self.nodelist.render(context),
+            int(self.timeout.resolve(context)),
+            version=self.version.resolve(context),
+        ))
+
+
+@register.tag
+def hotcache(parser, token):
+    """{% hotcache время имя версия [переменные...] %}
+
+    Как {% cache %}, но версия не входит в ключ: при ее смене фрагмент
+    пересчитывает один запрос, а остальные пока отдают прежний.
+    """
+    bits = token.split_contents()
+    if len(bits) < 4:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' принимает время, имя фрагмента и версию"
+        )
+    nodelist = parser.parse(('endhotcache',))
+    parser.delete_first_token()
+    return HotCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        parser.compile_filter(bits[3]),
+        [parser.compile_filter(bit) for bit in bits[4:]],
+    )
@@ -0,0 +1,47 @@
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class IsolatedFiles:
+    """Общие файлы кэша и метрик на время тестов — во временном каталоге.
+
+    Иначе cache.clear() в тестах стер бы кэш процессов, работающих
+    из той же папки, тесты дописывали бы свои запросы в их метрики,
+    а параллельные прогоны мешали бы друг другу.
+    """
+
+    def enable(self):
+        self.directory = tempfile.mkdtemp(prefix='yatube-tests-')
+        caches = copy.deepcopy(settings.CACHES)
+        for config in caches.values():
+            if config['BACKEND'] in ('core.cache.TieredCache',
+                                     'core.cache.SQLiteCache'):
+                config['LOCATION'] = os.path.join(
+                    self.directory, 'cache.sqlite3'
+                )
+        self.override = override_settings(
+            CACHES=caches,
+            METRICS_PATH=os.path.join(self.directory, 'metrics.sqlite3'),
+        )
+        self.override.enable()
+
+    def disable(self):
+        self.override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class IsolatedTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.isolated = IsolatedFiles()
+        self.isolated.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.isolated.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import auth
+from posts.models import Post
+
+User = get_user_model()
+
+
+def auth_queries(queries):
+    return [
+        query['sql'] for query in queries
+        if 'django_session' in query['sql']
+        or query['sql'].startswith('SELECT "auth_user"')
+    ]
+
+
+class CachedAuthTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, auth_queries(queries)
+
+    def test_anonymous_reads_skip_session_and_user(self):
+        """Анонимная лента не читает ни сессию, ни пользователя"""
+        response, queries = self.get(reverse('posts:index'))
+        self.assertEqual(queries, [])
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_session_and_user_come_from_cache(self):
+        """Повторный запрос берет сессию и пользователя из кэша"""
+        self.client.force_login(self.user)
+        self.get(reverse('posts:index'))
+        response, queries = self.get(reverse('posts:index'))
+        self.assertEqual(queries, [])
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_saved_user_is_reloaded(self):
+        """Сохранение пользователя сбрасывает его кэш"""
+        self.client.force_login(self.user)
+        self.get(reverse('posts:index'))
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Лев'
+        user.save()
+        response, _ = self.get(reverse('posts:index'))
+        self.assertEqual(response.context['user'].first_name, 'Лев')
+
+    def test_password_change_ends_sessions(self):
+        self.client.force_login(self.user)
+        self.get(reverse('posts:index'))
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        user.save()
+        response, _ = self.get(reverse('posts:index'))
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_password_hash_stays_out_of_cache(self):
+        """В общий кэш не попадает хэш пароля"""
+        user = User.objects.create_user(username='secret', password='pass')
+        self.client.force_login(user)
+        response, _ = self.get(reverse('posts:index'))
+        self.assertEqual(response.context['user'], user)
+        data = cache.get(auth.USER_KEY.format(user.pk))
+        self.assertNotIn('password', data['fields'])
+        self.assertNotIn(user.password, str(data))
+        cached = auth.from_cache(data)
+        self.assertEqual(
+            auth.session_hash(cached), user.get_session_auth_hash()
+        )
+        with self.assertNumQueries(1):
+            self.assertTrue(cached.check_password('pass'))
+        cached.set_password('other')
+        self.assertNotEqual(
+            auth.session_hash(cached), user.get_session_auth_hash()
+        )
+
+    def test_author_shares_object_with_request_user(self):
+        """На странице своего поста автор и request.user — один объект"""
+        self.client.force_login(self.user)
+        response, _ = self.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertIs(
+            response.context['post'].author,
+            response.context['request'].user._wrapped,
+        )
+        self.assertContains(response, 'редактировать запись')
+
+    def test_shared_outside_request(self):
+        self.assertIs(auth.shared(self.user), self.user)
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache as default_cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from django.utils import timezone
+
+from core.cache import (SQLiteCache, TieredCache, get_or_compute,
+                        served_stale, track_stale)
+from posts.freshness import conditional
+
+
+class SharedCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def sqlite(self):
+        return SQLiteCache(self.path, {})
+
+    def tiered(self, local_timeout=60):
+        return TieredCache(
+            self.path, {'OPTIONS': {'LOCAL_TIMEOUT': local_timeout}}
+        )
+
+    def test_sqlite_cache_is_shared(self):
+        """Два экземпляра на одном файле видят записи друг друга"""
+        first, second = self.sqlite(), self.sqlite()
+        first.set('key', {'value': 1})
+        self.assertEqual(second.get('key'), {'value': 1})
+        self.assertTrue(first.add('lock', 1))
+        self.assertFalse(second.add('lock', 1))
+        first.set('counter', 1)
+        self.assertEqual(second.incr('counter', 2), 3)
+        self.assertEqual(first.get('counter'), 3)
+        with self.assertRaises(ValueError):
+            first.incr('missing')
+        second.delete('key')
+        self.assertIsNone(first.get('key'))
+        first.set_many({'a': 1, 'b': 2})
+        self.assertEqual(second.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        second.clear()
+        self.assertEqual(first.get_many(['a', 'b']), {})
+
+    def test_sqlite_cache_expiry(self):
+        """Просроченные записи не отдаются и не мешают add"""
+        cache = self.sqlite()
+        cache.set('key', 'value', 0.05)
+        self.assertEqual(cache.get('key'), 'value')
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'new'))
+        cache.set('forever', 'value', None)
+        self.assertTrue(cache.has_key('forever'))
+
+    def test_tiered_cache_local_tier(self):
+        """Процесс читает свою запись из LRU, чужую — после LOCAL_TIMEOUT"""
+        worker, other = self.tiered(), self.tiered()
+        worker.set('key', 'old')
+        other.set('key', 'new')
+        self.assertEqual(worker.get('key'), 'old')
+        self.assertEqual(other.get('key'), 'new')
+        worker.delete('key')
+        self.assertIsNone(worker.get('key'))
+        fresh = self.tiered(local_timeout=0)
+        other.set('key', 'newest')
+        self.assertEqual(fresh.get('key'), 'newest')
+
+    def test_tiered_cache_incr_goes_to_shared_store(self):
+        """incr и add работают с общим хранилищем, а не с LRU"""
+        worker, other = self.tiered(), self.tiered()
+        worker.set('version', 1)
+        self.assertEqual(worker.get('version'), 1)
+        other.incr('version')
+        self.assertEqual(worker.incr('version'), 3)
+        self.assertEqual(worker.get('version'), 3)
+        self.assertTrue(worker.add('lock', 1))
+        self.assertFalse(other.add('lock', 1))
+
+    def test_get_or_compute_recomputes_once(self):
+        """Горячий ключ пересчитывается одним процессом"""
+        cache = self.tiered()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(get_or_compute('hot', compute, 60, 1, cache=cache), 1)
+        self.assertEqual(get_or_compute('hot', compute, 60, 1, cache=cache), 1)
+        self.assertEqual(len(calls), 1)
+        track_stale()
+        cache.add('hot:lock', 1)
+        self.assertEqual(
+            get_or_compute('hot', compute, 60, 2, cache=cache), 1,
+            'Пока пересчет занят, отдается прежняя версия',
+        )
+        self.assertTrue(served_stale())
+        cache.delete('hot:lock')
+        track_stale()
+        self.assertEqual(get_or_compute('hot', compute, 60, 2, cache=cache), 2)
+        self.assertFalse(served_stale())
+
+    def test_get_or_compute_refreshes_early(self):
+        """Дорогой пересчет запускается до истечения срока"""
+        cache = self.tiered()
+        now = time.time()
+        cache.set('hot', (1, 'old', now + 1, 3600), 60)
+        value = get_or_compute('hot', lambda: 'new', 60, 1, cache=cache)
+        self.assertEqual(value, 'new')
+
+
+class StaleFragmentTests(SimpleTestCase):
+    def setUp(self):
+        default_cache.clear()
+        self.addCleanup(default_cache.clear)
+
+    def get(self, version):
+        @conditional(lambda request: timezone.now())
+        def view(request):
+            return HttpResponse(
+                get_or_compute('page', lambda: f'v{version}', 60, version)
+            )
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        return view(request)
+
+    def test_stale_fragment_gets_no_etag(self):
+        """Страница с фрагментом прежней версии уходит без ETag"""
+        response = self.get(1)
+        self.assertIn('ETag', response)
+        default_cache.add('page:lock', 1)
+        response = self.get(2)
+        self.assertEqual(response.content, b'v1')
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        default_cache.delete('page:lock')
+        response = self.get(2)
+        self.assertEqual(response.content, b'v2')
+        self.assertIn('ETag', response)
@@ -0,0 +1,27 @@
+from django.db import connection
+from django.test import TestCase
+
+from core.db import sqlite_pragmas
+
+
+class SqlitePragmaTests(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        """Новое соединение SQLite получает PRAGMA из настроек"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Только для SQLite')
+        pragmas = sqlite_pragmas()
+        with connection.cursor() as cursor:
+            for name in ('busy_timeout', 'cache_size', 'synchronous'):
+                cursor.execute(f'PRAGMA {name}')
+                value = cursor.fetchone()[0]
+                with self.subTest(pragma=name):
+                    if name == 'synchronous':
+                        # NORMAL хранится числом 1.
+                        self.assertEqual(value, 1)
+                    else:
+                        self.assertEqual(value, pragmas[name])
+
+    def test_connect_timeout_matches_busy_timeout(self):
+        """Таймаут при открытии соединения берется из SQLITE_PRAGMAS"""
+        timeout = connection.settings_dict['OPTIONS']['timeout']
+        self.assertEqual(timeout * 1000, sqlite_pragmas()['busy_timeout'])
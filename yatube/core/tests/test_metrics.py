@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import Registry, RequestStats, registry
+from posts.models import Post
+
+User = get_user_model()
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        # Накопленное прошлыми тестами уходит в старый файл, а этот
+        # тест считает в своем.
+        registry.flush()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        metrics_path = override_settings(
+            METRICS_PATH=os.path.join(directory, 'metrics.sqlite3')
+        )
+        metrics_path.enable()
+        self.addCleanup(metrics_path.disable)
+        self.guest_client = Client()
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def scrape(self):
+        response = self.admin_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def metric(self, text, name, view):
+        prefix = f'{name}{{view="{view}"}} '
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return None
+
+    def test_metrics_by_url_name(self):
+        """Латентность, SQL, шаблоны и кэш собираются по имени URL"""
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.get(reverse('posts:index'))
+        text = self.scrape()
+        view = 'posts:index'
+        self.assertEqual(
+            self.metric(text, 'yatube_request_duration_seconds_count', view),
+            2,
+        )
+        self.assertIn(
+            f'yatube_request_duration_seconds_bucket{{view="{view}",'
+            'le="+Inf"} 2',
+            text,
+        )
+        self.assertGreater(
+            self.metric(text, 'yatube_db_queries_total', view), 0
+        )
+        self.assertGreater(
+            self.metric(text, 'yatube_template_render_seconds_total', view), 0
+        )
+        self.assertGreater(
+            self.metric(text, 'yatube_cache_hits_total', view), 0
+        )
+        self.assertGreater(
+            self.metric(text, 'yatube_cache_misses_total', view), 0
+        )
+
+    def test_metrics_endpoint_staff_only(self):
+        """Метрики доступны только персоналу"""
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+        user_client = Client()
+        user_client.force_login(self.user)
+        response = user_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_disabled(self):
+        """При нулевой доле выборки запросы не замеряются"""
+        self.guest_client.get(reverse('posts:index'))
+        text = self.admin_client.get(reverse('metrics')).content.decode()
+        self.assertNotIn('posts:index', text)
+
+    @override_settings(TEMPLATE_PROFILING=True)
+    def test_server_timing_by_template(self):
+        """Время рендера по шаблонам уходит в заголовок Server-Timing"""
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': 'auth'})
+        )
+        timing = response['Server-Timing']
+        self.assertIn('desc="posts/profile.html x1"', timing)
+        self.assertIn('desc="posts/includes/post.html x1"', timing)
+
+    @override_settings(TEMPLATE_PROFILING=False)
+    def test_no_server_timing_by_default(self):
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class SharedRegistryTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'metrics.sqlite3')
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0)
+    def test_workers_share_metrics(self):
+        """Метрики воркеров складываются и переживают перезапуск"""
+        first, second = Registry(self.path), Registry(self.path)
+        stats = RequestStats()
+        stats.queries = 3
+        first.observe('posts:index', 0.02, stats)
+        second.observe('posts:index', 0.2, stats)
+        text = Registry(self.path).render(1.0)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="0.05"} 1',
+            text,
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"} 6', text)
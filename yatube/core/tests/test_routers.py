@@ -0,0 +1,247 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from benchmarks.runner import CLIENT_DEFAULTS
+from core import routers
+from core.db import copy_sqlite
+from core.middleware import ReplicaPinMiddleware
+from core.models import Task
+from posts.models import Post, User
+
+REPLICAS = ['replica1', 'replica2']
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class RouterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        routers.reset()
+        routers.mark_synced(time.time())
+        routers.start()
+        self.router = routers.PrimaryReplicaRouter()
+        self.addCleanup(routers.reset)
+
+    def test_reads_go_to_replicas(self):
+        """Чтение без записи уходит в реплику"""
+        self.assertIn(self.router.db_for_read(Post), REPLICAS)
+
+    def test_writes_go_to_primary_and_pin_reads(self):
+        """Запись идет в основную базу, после нее читаем оттуда же"""
+        self.assertEqual(self.router.db_for_write(Post), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_write_makes_replicas_stale(self):
+        """После записи реплики отстают до следующей синхронизации"""
+        self.router.db_for_write(Post)
+        self.assertFalse(routers.replicas_current())
+        routers.mark_synced(time.time())
+        self.assertTrue(routers.replicas_current())
+
+    def test_task_queue_writes_keep_replicas_current(self):
+        self.router.db_for_write(Task)
+        self.assertTrue(routers.replicas_current())
+
+    def test_reads_outside_requests_use_primary(self):
+        routers.reset()
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_unsynced_replicas_are_not_read(self):
+        cache.clear()
+        routers.start()
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_pinned_request_reads_primary(self):
+        routers.pin()
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_no_migrations_on_replicas(self):
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class RouterTransactionTests(TestCase):
+    def test_transaction_reads_primary(self):
+        """Внутри транзакции чтение остается в основной базе"""
+        routers.reset()
+        with transaction.atomic():
+            self.assertEqual(
+                routers.PrimaryReplicaRouter().db_for_read(Post),
+                DEFAULT_DB_ALIAS,
+            )
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, REPLICA_PIN_SECONDS=5)
+class ReplicaPinMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        routers.mark_synced(time.time())
+        self.factory = RequestFactory()
+        self.router = routers.PrimaryReplicaRouter()
+        self.seen = []
+        self.addCleanup(routers.reset)
+
+    def view(self, write=False):
+        def get_response(request):
+            if write:
+                self.router.db_for_write(Post)
+            self.seen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+        return ReplicaPinMiddleware(get_response)
+
+    def test_write_sets_pin_cookie(self):
+        """После записи браузер закрепляется за основной базой"""
+        response = self.view(write=True)(self.factory.get('/'))
+        self.assertEqual(self.seen, [DEFAULT_DB_ALIAS])
+        cookie = response.cookies[ReplicaPinMiddleware.cookie_name]
+        self.assertGreater(float(cookie.value), time.time())
+        self.assertEqual(cookie['max-age'], 5)
+
+    def test_read_only_request_uses_replica(self):
+        response = self.view()(self.factory.get('/'))
+        self.assertIn(self.seen[0], REPLICAS)
+        self.assertNotIn(ReplicaPinMiddleware.cookie_name, response.cookies)
+
+    def test_fresh_cookie_reads_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[ReplicaPinMiddleware.cookie_name] = str(
+            time.time() + 5
+        )
+        self.view()(request)
+        self.assertEqual(self.seen, [DEFAULT_DB_ALIAS])
+
+    def test_expired_cookie_reads_replica(self):
+        request = self.factory.get('/')
+        request.COOKIES[ReplicaPinMiddleware.cookie_name] = str(
+            time.time() - 1
+        )
+        self.view()(request)
+        self.assertIn(self.seen[0], REPLICAS)
+
+    def test_lagging_replicas_read_primary(self):
+        """Запись из другого процесса уводит чтения с реплик"""
+        routers.mark_written()
+        self.view()(self.factory.get('/'))
+        self.assertEqual(self.seen, [DEFAULT_DB_ALIAS])
+
+    def test_write_marks_replicas_stale(self):
+        self.view(write=True)(self.factory.get('/'))
+        self.view()(self.factory.get('/'))
+        self.assertEqual(self.seen, [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS])
+
+    def test_post_reads_primary(self):
+        self.view()(self.factory.post('/'))
+        self.assertEqual(self.seen, [DEFAULT_DB_ALIAS])
+
+    def test_state_reset_after_request(self):
+        self.view(write=True)(self.factory.get('/'))
+        self.assertFalse(routers.wrote())
+        self.assertFalse(routers.pinned())
+
+
+class CopySqliteTests(SimpleTestCase):
+    def test_replica_file_gets_snapshot(self):
+        """Файл реплики получает данные основной базы"""
+        with tempfile.TemporaryDirectory() as directory:
+            primary = os.path.join(directory, 'primary.sqlite3')
+            replica = os.path.join(directory, 'replica.sqlite3')
+            connection = sqlite3.connect(primary)
+            with connection:
+                connection.execute('CREATE TABLE item (name TEXT)')
+                connection.execute("INSERT INTO item VALUES ('пост')")
+            connection.close()
+            copy_sqlite(primary, replica)
+            connection = sqlite3.connect(replica)
+            rows = connection.execute('SELECT name FROM item').fetchall()
+            connection.close()
+        self.assertEqual(rows, [('пост',)])
+
+
+def replica_scenario():
+    """Сценарий ReplicaEndToEndTests; идет в отдельном процессе."""
+    client = Client(**CLIENT_DEFAULTS)
+
+    def page(url):
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            content = client.get(url).content.decode()
+        return {
+            'old': 'Старый текст' in content,
+            'new': 'Новый текст' in content,
+            'replica': len(replica) > 0,
+        }
+
+    author = User.objects.create_user(username='leo')
+    post = Post.objects.create(author=author, text='Старый текст')
+    routers.finish()
+    routers.reset()
+    call_command('sync_replicas', stdout=StringIO())
+    results = {'synced': page('/')}
+    post.text = 'Новый текст'
+    post.save()
+    routers.finish()
+    routers.reset()
+    results['lagging'] = page('/')
+    results['lagging_post'] = page(f'/posts/{post.pk}/')
+    call_command('sync_replicas', stdout=StringIO())
+    results['caught_up'] = page('/')
+    print(json.dumps(results))
+
+
+class ReplicaEndToEndTests(SimpleTestCase):
+    """Основная база и реплика — настоящие файлы SQLite в другом процессе.
+
+    Реплика отстает, пока ее не обновит sync_replicas: пока она не
+    догнала основную базу, страницы (и кэши, которые они наполняют)
+    собираются из основной.
+    """
+
+    def run_scenario(self, directory):
+        env = dict(
+            os.environ,
+            DB_PATH=os.path.join(directory, 'primary.sqlite3'),
+            DB_REPLICAS=os.path.join(directory, 'replica.sqlite3'),
+            YATUBE_CACHE='tiered',
+            YATUBE_CACHE_PATH=os.path.join(directory, 'cache.sqlite3'),
+            TASKS_EAGER='0',
+        )
+
+        def run(*args):
+            return subprocess.run(
+                [sys.executable, *args], cwd=settings.BASE_DIR, env=env,
+                capture_output=True, text=True, check=True,
+            ).stdout
+
+        run('manage.py', 'migrate', '-v', '0')
+        output = run('-c', (
+            'import django; django.setup(); '
+            'from core.tests.test_routers import replica_scenario; '
+            'replica_scenario()'
+        ))
+        return json.loads(output.splitlines()[-1])
+
+    def test_pages_never_come_from_lagging_replica(self):
+        with tempfile.TemporaryDirectory() as directory:
+            results = self.run_scenario(directory)
+        fresh_from_primary = {'old': False, 'new': True, 'replica': False}
+        self.assertEqual(
+            results['synced'], {'old': True, 'new': False, 'replica': True}
+        )
+        self.assertEqual(results['lagging'], fresh_from_primary)
+        self.assertEqual(results['lagging_post'], fresh_from_primary)
+        self.assertEqual(
+            results['caught_up'], {'old': False, 'new': True, 'replica': True}
+        )
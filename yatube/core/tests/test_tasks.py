@@ -0,0 +1,89 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.models import Task
+from core.tasks import claim, execute, task, work
+
+CALLS = []
+
+
+@task
+def remember(value):
+    CALLS.append(value)
+
+
+@task(max_attempts=2, backoff=60)
+def broken():
+    raise RuntimeError('сломано')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_direct_call_runs_immediately(self):
+        remember('сразу')
+        self.assertEqual(CALLS, ['сразу'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_delay_queues_and_worker_runs(self):
+        """Отложенный вызов выполняет воркер"""
+        remember.delay('потом')
+        self.assertEqual(CALLS, [])
+        call_command(
+            'run_tasks', processes=1, once=True, stdout=StringIO()
+        )
+        self.assertEqual(CALLS, ['потом'])
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_idempotency_key(self):
+        """Задача с тем же ключом ставится один раз"""
+        remember.delay(1, key='один')
+        remember.delay(1, key='один')
+        self.assertEqual(Task.objects.count(), 1)
+        work(once=True)
+        remember.delay(1, key='один')
+        work(once=True)
+        self.assertEqual(CALLS, [1])
+
+    def test_retry_with_backoff_then_fail(self):
+        """Упавшая задача повторяется позже, после max_attempts — провал"""
+        row = broken.delay()
+        self.assertFalse(execute(claim('test')))
+        row.refresh_from_db()
+        self.assertEqual(row.status, Task.QUEUED)
+        self.assertEqual(row.attempts, 1)
+        self.assertIn('сломано', row.last_error)
+        self.assertGreater(
+            row.run_at, timezone.now() + timedelta(seconds=59)
+        )
+        self.assertIsNone(claim('test'))
+        Task.objects.filter(pk=row.pk).update(run_at=timezone.now())
+        execute(claim('test'))
+        row.refresh_from_db()
+        self.assertEqual(row.status, Task.FAILED)
+        self.assertEqual(row.attempts, 2)
+
+    def test_task_claimed_once(self):
+        remember.delay('одна')
+        self.assertIsNotNone(claim('первый'))
+        self.assertIsNone(claim('второй'))
+
+    @override_settings(TASKS_LOCK_TIMEOUT=0)
+    def test_stale_task_reclaimed(self):
+        """Задачу зависшего воркера забирает другой"""
+        remember.delay('зависла')
+        claim('упавший')
+        row = claim('живой')
+        self.assertEqual(row.locked_by, 'живой')
+        self.assertEqual(row.attempts, 2)
+
+    def test_unknown_task_fails(self):
+        Task.objects.create(name='core.tasks.enqueue', run_at=timezone.now())
+        work(once=True)
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
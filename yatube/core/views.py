@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from .metrics import registry
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +20,11 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+@staff_member_required
+def metrics(request):
+    return HttpResponse(
+        registry.render(getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
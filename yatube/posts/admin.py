@@ -1,16 +1,52 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+
+from .export import lines
 from .models import Follow, Post, Group, Comment
+from .search import search
+
+EXPORT_NAMES = {
+    Group: 'groups',
+    Post: 'posts',
+    Comment: 'comments',
+    Follow: 'follows',
+}
+
+
+def export_ndjson(modeladmin, request, queryset):
+    name = EXPORT_NAMES[modeladmin.model]
+    response = StreamingHttpResponse(
+        lines(name, queryset.order_by('pk')),
+        content_type='application/x-ndjson; charset=utf-8',
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.ndjson"'
+    )
+    return response
+
+
+export_ndjson.short_description = 'Выгрузить выбранное в NDJSON'
 
 
 class PostAdmin(admin.ModelAdmin):
+    actions = (export_ndjson,)
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search(search_term)), False
+
+
+class ExportAdmin(admin.ModelAdmin):
+    actions = (export_ndjson,)
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Follow)
-admin.site.register(Comment)
+admin.site.register(Group, ExportAdmin)
+admin.site.register(Follow, ExportAdmin)
+admin.site.register(Comment, ExportAdmin)
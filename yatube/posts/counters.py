@@ -0,0 +1,109 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+REPAIR_BATCH_SIZE = 500
+
+
+def _change(queryset, delta, *fields):
+    if delta < 0:
+        # Разошедшийся счетчик не уводим ниже нуля, его починит пересчет.
+        queryset = queryset.filter(
+            **{f'{name}__gte': -delta for name in fields}
+        )
+    with transaction.atomic():
+        return queryset.update(**{name: F(name) + delta for name in fields})
+
+
+def change_user_stats(user_id, delta, *fields):
+    # Нет строки — ее создаст get_stats честным пересчетом.
+    return _change(UserStats.objects.filter(pk=user_id), delta, *fields)
+
+
+def change_comments_count(post_id, delta):
+    return _change(Post.objects.filter(pk=post_id), delta, 'comments_count')
+
+
+def _count(model, field):
+    """Подзапрос COUNT(*) связанных строк для внешней строки по pk."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')[:1]
+    ), 0)
+
+
+def _user_counts():
+    return {
+        'posts_count': _count(Post, 'author'),
+        'followers_count': _count(Follow, 'author'),
+        'following_count': _count(Follow, 'user'),
+    }
+
+
+def _post_counts():
+    return {'comments_count': _count(Comment, 'post')}
+
+
+def get_stats(user):
+    """Счетчики пользователя; недостающая строка пересчитывается."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        counts = User.objects.filter(pk=user.pk).values(
+            **_user_counts()
+        ).get()
+        stats, _ = UserStats.objects.get_or_create(user=user, defaults=counts)
+        return stats
+
+
+def _drifted(queryset, counts):
+    real = {f'real_{name}': expression for name, expression in counts.items()}
+    return queryset.annotate(**real).exclude(
+        **{name: F(f'real_{name}') for name in counts}
+    ).values_list('pk', flat=True)
+
+
+def _repair(queryset, counts):
+    drifted = list(_drifted(queryset, counts))
+    for start in range(0, len(drifted), REPAIR_BATCH_SIZE):
+        batch = drifted[start:start + REPAIR_BATCH_SIZE]
+        with transaction.atomic():
+            queryset.filter(pk__in=batch).update(**counts)
+    return len(drifted)
+
+
+def _scoped(queryset, ids):
+    """queryset, суженный до ids пачками; без ids — целиком."""
+    if ids is None:
+        yield queryset
+    elif isinstance(ids, QuerySet):
+        yield queryset.filter(pk__in=ids)
+    else:
+        ids = list(ids)
+        for start in range(0, len(ids), REPAIR_BATCH_SIZE):
+            yield queryset.filter(
+                pk__in=ids[start:start + REPAIR_BATCH_SIZE]
+            )
+
+
+def repair_counters(user_ids=None, post_ids=None):
+    """Пересчитывает разошедшиеся счетчики, возвращает число исправлений.
+
+    user_ids и post_ids (список или подзапрос id) сужают пересчет до
+    этих пользователей и постов; по умолчанию проверяется вся база.
+    """
+    repaired = {'users': 0, 'posts': 0}
+    for users in _scoped(User.objects.all(), user_ids):
+        UserStats.objects.bulk_create(
+            UserStats(user_id=pk) for pk in users.filter(
+                stats__isnull=True
+            ).values_list('pk', flat=True).iterator()
+        )
+    for stats in _scoped(UserStats.objects.all(), user_ids):
+        repaired['users'] += _repair(stats, _user_counts())
+    for posts in _scoped(Post.objects.all(), post_ids):
+        repaired['posts'] += _repair(posts, _post_counts())
+    return repaired
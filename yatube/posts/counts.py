@@ -0,0 +1,148 @@
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Max
+
+Count = namedtuple('Count', 'value approximate')
+
+EXACT = 'exact'
+APPROXIMATE = 'approximate'
+
+KEY = 'count:{}'
+ESTIMATE_KEY = 'count:{}:estimate:{}'
+ALL_POSTS = 'posts'
+
+
+def group_posts(group_id):
+    return f'posts:group:{group_id}'
+
+
+def cache_timeout():
+    return getattr(settings, 'COUNT_CACHE_TIMEOUT', 300)
+
+
+def exact_limit():
+    return getattr(settings, 'COUNT_EXACT_LIMIT', 10000)
+
+
+def mode_for(request):
+    """Режим счета для представления: COUNT_MODES по имени URL."""
+    match = getattr(request, 'resolver_match', None)
+    modes = getattr(settings, 'COUNT_MODES', {})
+    default = getattr(settings, 'COUNT_MODE', APPROXIMATE)
+    return modes.get(match.view_name if match else None, default)
+
+
+def key_for(queryset):
+    """Ключ кэша по SQL запроса, когда смыслового ключа нет."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+    return f'sql:{digest}'
+
+
+def table_estimate(model):
+    """Число строк таблицы по статистике планировщика.
+
+    PostgreSQL хранит его в pg_class, SQLite — в sqlite_stat1 после
+    ANALYZE. Без статистики берем наибольший id: id почти сплошные.
+    """
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    row = None
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [table],
+            )
+            row = cursor.fetchone()
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone():
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                    [table],
+                )
+                row = cursor.fetchone()
+    if row and row[0] and int(str(row[0]).split()[0]) > 0:
+        return int(str(row[0]).split()[0])
+    return model._default_manager.aggregate(top=Max('pk'))['top'] or 0
+
+
+def sampled_estimate(queryset, sample=None):
+    """Оценка числа строк запроса по выборке последних строк таблицы.
+
+    Доля подходящих строк среди sample последних id умножается на
+    оценку размера таблицы.
+    """
+    sample = sample or getattr(settings, 'COUNT_SAMPLE_SIZE', 1000)
+    model = queryset.model
+    total = table_estimate(model)
+    if not queryset.query.where:
+        return total
+    boundary = model._default_manager.order_by('-pk').values_list(
+        'pk', flat=True
+    )[sample - 1:sample].first()
+    if boundary is None:
+        return queryset.count()
+    matched = queryset.order_by().filter(pk__gte=boundary).count()
+    return round(total * matched / sample)
+
+
+def count(queryset, key=None, mode=APPROXIMATE, limit=None):
+    """Число строк запроса из кэша; при промахе — считаем и кладем.
+
+    В режиме exact это всегда точный COUNT(*), в режиме approximate
+    выше limit (по умолчанию COUNT_EXACT_LIMIT) строк вместо COUNT(*)
+    берется оценка. Точные значения по смысловым ключам поддерживает
+    increment() из сигналов, оценки просто живут COUNT_CACHE_TIMEOUT.
+    """
+    key = key or key_for(queryset)
+    cached = cache.get(KEY.format(key))
+    if cached is not None:
+        return Count(cached, False)
+    if mode == EXACT:
+        value = queryset.count()
+    else:
+        limit = limit or exact_limit()
+        estimate_key = ESTIMATE_KEY.format(key, limit)
+        estimate = cache.get(estimate_key)
+        if estimate is not None:
+            return Count(estimate, True)
+        value = queryset.order_by()[:limit + 1].count()
+        if value > limit:
+            estimate = max(sampled_estimate(queryset), value)
+            cache.set(estimate_key, estimate, cache_timeout())
+            return Count(estimate, True)
+    cache.set(KEY.format(key), value, cache_timeout())
+    return Count(value, False)
+
+
+def increment(delta, *keys):
+    """Сдвигает закэшированные точные счетчики после коммита."""
+    def apply():
+        for key in keys:
+            try:
+                cache.incr(KEY.format(key), delta)
+            except ValueError:
+                # Счетчика нет в кэше: его посчитают при чтении.
+                pass
+
+    transaction.on_commit(apply)
+
+
+def forget(*keys):
+    """Сбрасывает точные счетчики, которые сигналы не сдвигали."""
+    cache.delete_many([KEY.format(key) for key in keys])
+
+
+def post_keys(group_id):
+    keys = [ALL_POSTS]
+    if group_id is not None:
+        keys.append(group_posts(group_id))
+    return keys
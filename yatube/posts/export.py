@@ -0,0 +1,130 @@
+import csv
+import gzip
+import io
+import json
+import os
+
+from .models import Comment, Follow, Group, Post
+
+CHUNK_SIZE = 2000
+
+# Пользователи и группы выгружаются именами и слагами: по ним импорт
+# находит их в другой базе.
+EXPORTS = {
+    'groups': (Group, {
+        'id': 'id',
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+    }),
+    'posts': (Post, {
+        'id': 'id',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'image': 'image',
+    }),
+    'comments': (Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follows': (Follow, {
+        'id': 'id',
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+FILTERS = {
+    'groups': {'group': 'slug'},
+    'posts': {
+        'date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+    },
+    'comments': {
+        'date': 'created',
+        'author': 'author__username',
+        'group': 'post__group__slug',
+    },
+    'follows': {'author': 'author__username'},
+}
+
+FORMATS = ('ndjson', 'csv')
+
+
+def filtered(name, queryset=None, since=None, until=None, author=None,
+             group=None):
+    """Выборка для выгрузки; неприменимые к модели фильтры пропускаются."""
+    model, _ = EXPORTS[name]
+    if queryset is None:
+        queryset = model.objects.all()
+    lookups = FILTERS[name]
+    conditions = {}
+    if 'date' in lookups:
+        if since is not None:
+            conditions[f'{lookups["date"]}__gte'] = since
+        if until is not None:
+            conditions[f'{lookups["date"]}__lt'] = until
+    if author is not None and 'author' in lookups:
+        conditions[lookups['author']] = author
+    if group is not None and 'group' in lookups:
+        conditions[lookups['group']] = group
+    return queryset.filter(**conditions).order_by('pk')
+
+
+def rows(name, queryset, chunk_size=CHUNK_SIZE):
+    """Кортежи значений по одному чанку курсора за раз."""
+    _, columns = EXPORTS[name]
+    return queryset.values_list(*columns.values()).iterator(
+        chunk_size=chunk_size
+    )
+
+
+def _plain(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def lines(name, queryset, export_format='ndjson', chunk_size=CHUNK_SIZE):
+    """Строки выгрузки; у csv первой идет шапка."""
+    columns = list(EXPORTS[name][1])
+    if export_format == 'csv':
+        yield _csv_line(columns)
+        for row in rows(name, queryset, chunk_size):
+            yield _csv_line(['' if v is None else _plain(v) for v in row])
+        return
+    for row in rows(name, queryset, chunk_size):
+        yield json.dumps(
+            dict(zip(columns, map(_plain, row))), ensure_ascii=False
+        ) + '\n'
+
+
+def export_file(name, queryset, directory, export_format='ndjson',
+                compress=False, chunk_size=CHUNK_SIZE):
+    """Пишет выгрузку модели в файл, возвращает путь и число строк."""
+    path = os.path.join(directory, f'{name}.{export_format}')
+    if compress:
+        path += '.gz'
+        stream = gzip.open(path, 'wt', encoding='utf-8', newline='')
+    else:
+        stream = open(path, 'w', encoding='utf-8', newline='')
+    count = 0
+    with stream:
+        for line in lines(name, queryset, export_format, chunk_size):
+            stream.write(line)
+            count += 1
+    if export_format == 'csv':
+        count -= 1
+    return path, count
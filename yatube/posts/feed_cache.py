@@ -0,0 +1,73 @@
+import time
+
+from django.core.cache import cache
+
+FEED_VERSION_KEY = 'feed:version'
+GROUPS_VERSION_KEY = 'feed:groups:version'
+CARD_VERSION_KEY = 'feed:card:{}:version'
+AUTHOR_VERSION_KEY = 'feed:author:{}:version'
+
+
+def _fresh_version():
+    # Версия с отметкой времени не совпадет с версией, вытесненной из кэша,
+    # поэтому старые фрагменты не оживут после потери счетчика.
+    return int(time.time() * 1000)
+
+
+def _bump(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _fresh_version()
+        cache.set(key, version, None)
+        return version
+
+
+def _versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _fresh_version(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def bump_feed_version():
+    return _bump(FEED_VERSION_KEY)
+
+
+def bump_groups_version():
+    return _bump(GROUPS_VERSION_KEY)
+
+
+def bump_card_version(post_id):
+    return _bump(CARD_VERSION_KEY.format(post_id))
+
+
+def bump_author_version(author_id):
+    return _bump(AUTHOR_VERSION_KEY.format(author_id))
+
+
+def get_feed_version():
+    return _versions([FEED_VERSION_KEY])[FEED_VERSION_KEY]
+
+
+def annotate_card_versions(posts):
+    """Проставляет постам card_version для ключа кэша карточки.
+
+    В версию входят сам пост, его автор (имя в карточке) и группы.
+    """
+    posts = list(posts)
+    keys = [CARD_VERSION_KEY.format(post.id) for post in posts]
+    author_keys = [
+        AUTHOR_VERSION_KEY.format(post.author_id) for post in posts
+    ]
+    versions = _versions(
+        keys + list(set(author_keys)) + [GROUPS_VERSION_KEY]
+    )
+    groups_version = versions[GROUPS_VERSION_KEY]
+    for post, key, author_key in zip(posts, keys, author_keys):
+        post.card_version = (
+            f'{versions[key]}.{versions[author_key]}.{groups_version}'
+        )
+    return posts
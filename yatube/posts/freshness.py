@@ -0,0 +1,159 @@
+from calendar import timegm
+from functools import wraps
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from core.cache import served_stale, track_stale
+
+from .models import Group, Post, User
+
+FEED_KEY = 'modified:feed'
+GROUP_KEY = 'modified:group:{}'
+AUTHOR_KEY = 'modified:author:{}'
+POST_KEY = 'modified:post:{}'
+
+
+def _key(template, name):
+    # Слаги и имена бывают не ASCII, а ключи memcached — только ASCII.
+    return template.format(quote(name))
+
+
+def _set(keys):
+    cache.set_many(dict.fromkeys(keys, timezone.now()), None)
+
+
+def touch(*keys):
+    # Повтор после коммита: запрос, успевший прочитать старые данные
+    # с новой отметкой, не закрепит устаревшую страницу у клиента.
+    _set(keys)
+    transaction.on_commit(lambda: _set(keys))
+
+
+def touch_post(post_id, author_id, *group_ids):
+    """Пост изменился: общая лента, его группы, автор и сама страница."""
+    keys = [FEED_KEY, POST_KEY.format(post_id)]
+    keys += [
+        _key(AUTHOR_KEY, username) for username in User.objects.filter(
+            pk=author_id
+        ).values_list('username', flat=True)
+    ]
+    group_ids = [pk for pk in group_ids if pk is not None]
+    if group_ids:
+        keys += [
+            _key(GROUP_KEY, slug) for slug in Group.objects.filter(
+                pk__in=group_ids
+            ).values_list('slug', flat=True)
+        ]
+    touch(*keys)
+
+
+def touch_group(slug):
+    touch(FEED_KEY, _key(GROUP_KEY, slug))
+
+
+def touch_authors(*author_ids):
+    touch(*(
+        _key(AUTHOR_KEY, username) for username in User.objects.filter(
+            pk__in=author_ids
+        ).values_list('username', flat=True)
+    ))
+
+
+def touch_author(author_id):
+    """Сменилось имя автора: оно видно в ленте, профиле, постах и группах."""
+    keys = [FEED_KEY]
+    keys += [
+        _key(AUTHOR_KEY, username) for username in User.objects.filter(
+            pk=author_id
+        ).values_list('username', flat=True)
+    ]
+    keys += [
+        _key(GROUP_KEY, slug) for slug in Group.objects.filter(
+            posts__author_id=author_id
+        ).values_list('slug', flat=True).distinct()
+    ]
+    touch(*keys)
+
+
+def last_modified(*keys):
+    """Самая поздняя отметка среди ключей.
+
+    Потерянная отметка заменяется текущим временем: лишний полный ответ
+    лучше, чем 304 на изменившуюся страницу.
+    """
+    stamps = cache.get_many(keys)
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        now = timezone.now()
+        for key in missing:
+            cache.add(key, now, None)
+        stamps.update(cache.get_many(missing))
+    return max(stamps.values())
+
+
+def feed_modified(request, *args, **kwargs):
+    return last_modified(FEED_KEY)
+
+
+def group_modified(request, slug):
+    return last_modified(_key(GROUP_KEY, slug))
+
+
+def author_modified(request, username):
+    return last_modified(_key(AUTHOR_KEY, username))
+
+
+def post_modified(request, post_id):
+    keys = [POST_KEY.format(post_id)]
+    # На странице поста выводятся число постов автора и название группы.
+    for username, slug in Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug'
+    ):
+        keys.append(_key(AUTHOR_KEY, username))
+        if slug is not None:
+            keys.append(_key(GROUP_KEY, slug))
+    return last_modified(*keys)
+
+
+def conditional(modified):
+    """Условный GET по отметке modified(request, *args, **kwargs).
+
+    В ETag входит пользователь: шапка и кнопки у всех свои, а Vary: Cookie
+    не дает общим кэшам отдать чужую страницу. Страница, собранная из
+    фрагмента прежней версии, уходит без ETag и Last-Modified: иначе
+    клиент закрепил бы ее устаревшую копию ответами 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            stamp = modified(request, *args, **kwargs)
+            etag = quote_etag(
+                f'{request.user.pk or 0}-{stamp.timestamp():.6f}'
+            )
+            seconds = timegm(stamp.utctimetuple())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=seconds
+            )
+            if response is None:
+                track_stale()
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not served_stale():
+                    response.setdefault('ETag', etag)
+                    response.setdefault('Last-Modified', http_date(seconds))
+            patch_cache_control(
+                response,
+                no_cache=True,
+                private=request.user.is_authenticated,
+            )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,360 @@
+import csv
+import gzip
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from . import counts, feed_cache, freshness, search, timeline
+from .counters import repair_counters
+from .export import EXPORTS, FORMATS
+from .models import Comment, Follow, Group, Post, User
+from .thumbnails import schedule_many
+from .utils import bulk_batch_size, bulk_create_dated
+
+BATCH_SIZE = 1000
+
+
+def find_input(directory, name):
+    for export_format in FORMATS:
+        for suffix in ('', '.gz'):
+            path = os.path.join(directory, f'{name}.{export_format}{suffix}')
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def read_rows(path):
+    """Словари строк NDJSON или CSV, в том числе сжатых gzip."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as file:
+        if '.csv' in os.path.basename(path):
+            for row in csv.DictReader(file):
+                yield {key: value or None for key, value in row.items()}
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Checkpoint:
+    """Сколько строк каждого файла уже загружено, сдвиги и диапазоны id.
+
+    Новые id — это исходные id плюс сдвиг, выбранный при первом запуске,
+    поэтому после перезапуска ссылки комментариев на посты совпадают.
+    По диапазонам загруженных id finish() находит все, что задели и
+    прерванные запуски.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {'done': {}, 'offsets': {}, 'ranges': {}}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                self.state.update(json.load(file))
+
+    def done(self, name):
+        return self.state['done'].get(name, 0)
+
+    def offset(self, name, default):
+        return self.state['offsets'].setdefault(name, default)
+
+    def extend(self, name, ids):
+        """Расширяет диапазон загруженных id; сохраняет его advance()."""
+        ids = list(ids)
+        if not ids:
+            return
+        low, high = self.state['ranges'].get(name, (min(ids), max(ids)))
+        self.state['ranges'][name] = [min(low, *ids), max(high, *ids)]
+
+    def range(self, name):
+        return self.state['ranges'].get(name)
+
+    def advance(self, name, count):
+        self.state['done'][name] = self.done(name) + count
+        if self.path:
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as file:
+                json.dump(self.state, file)
+            os.replace(temporary, self.path)
+
+
+class Importer:
+    """Пакетная загрузка выгрузки export_content через bulk_create.
+
+    Авторы и группы ищутся по заранее собранным словарям имя → id,
+    картинки копируются в MEDIA_ROOT/posts/ пулом потоков. Сигналы при
+    bulk_create не срабатывают, поэтому счетчики, ленты, поиск и версии
+    кэша приводятся в порядок в finish() — по контрольной точке, а не
+    по памяти процесса, так что и после перезапуска.
+    """
+
+    def __init__(self, directory, checkpoint=None, batch_size=BATCH_SIZE,
+                 media_dir=None, workers=4, keep_ids=False,
+                 create_users=True, stdout=None):
+        self.directory = directory
+        self.checkpoint = Checkpoint(checkpoint)
+        self.batch_size = batch_size
+        self.media_dir = media_dir or directory
+        self.workers = workers
+        self.keep_ids = keep_ids
+        self.create_users = create_users
+        self.stdout = stdout
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.stats = {}
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def offset(self, model):
+        name = model._meta.model_name
+        if name not in self.checkpoint.state['offsets']:
+            current = 0
+            if not self.keep_ids:
+                current = model.objects.aggregate(top=Max('pk'))['top'] or 0
+            self.checkpoint.offset(name, current)
+        return self.checkpoint.offset(name, 0)
+
+    def user_ids(self, usernames):
+        """id пользователей по именам, недостающих создает пачкой."""
+        missing = {name for name in usernames
+                   if name and name not in self.users}
+        if missing and self.create_users:
+            password = make_password(None)
+            User.objects.bulk_create(
+                (User(username=name, password=password) for name in missing),
+                batch_size=bulk_batch_size(User, self.batch_size),
+                ignore_conflicts=True,
+            )
+            self.users.update(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk'))
+        return self.users
+
+    def copy_image(self, name):
+        if not name:
+            return ''
+        source = os.path.join(self.media_dir, name)
+        if not os.path.isfile(source):
+            return ''
+        with open(source, 'rb') as file:
+            return default_storage.save(
+                f'posts/{os.path.basename(name)}', file
+            )
+
+    def load_groups(self, batch):
+        Group.objects.bulk_create(
+            (
+                Group(title=row['title'], slug=row['slug'],
+                      description=row.get('description') or '')
+                for row in batch if row['slug'] not in self.groups
+            ),
+            batch_size=bulk_batch_size(Group, self.batch_size),
+            ignore_conflicts=True,
+        )
+        self.groups.update(Group.objects.filter(
+            slug__in=[row['slug'] for row in batch]
+        ).values_list('slug', 'pk'))
+        return len(batch)
+
+    def load_posts(self, batch, pool):
+        offset = self.offset(Post)
+        users = self.user_ids(row['author'] for row in batch)
+        batch = [row for row in batch if row['author'] in users]
+        images = pool.map(self.copy_image,
+                          [row.get('image') for row in batch])
+        posts = [
+            Post(
+                id=int(row['id']) + offset,
+                author_id=users[row['author']],
+                group_id=self.groups.get(row.get('group')),
+                text=row['text'],
+                pub_date=parse_datetime(row['pub_date']),
+                image=image,
+            )
+            for row, image in zip(batch, images)
+        ]
+        bulk_create_dated(
+            Post, posts, 'pub_date',
+            batch_size=bulk_batch_size(Post, self.batch_size),
+            ignore_conflicts=True,
+        )
+        self.checkpoint.extend('post', (post.pk for post in posts))
+        schedule_many(posts)
+        return len(posts)
+
+    def load_comments(self, batch):
+        offset = self.offset(Comment)
+        post_offset = self.checkpoint.offset('post', 0)
+        users = self.user_ids(row['author'] for row in batch)
+        existing = set(Post.objects.filter(
+            pk__in=[int(row['post']) + post_offset for row in batch]
+        ).values_list('pk', flat=True))
+        comments = [
+            Comment(
+                id=int(row['id']) + offset,
+                post_id=int(row['post']) + post_offset,
+                author_id=users[row['author']],
+                text=row['text'],
+                created=parse_datetime(row['created']),
+            )
+            for row in batch
+            if row['author'] in users
+            and int(row['post']) + post_offset in existing
+        ]
+        bulk_create_dated(
+            Comment, comments, 'created',
+            batch_size=bulk_batch_size(Comment, self.batch_size),
+            ignore_conflicts=True,
+        )
+        self.checkpoint.extend(
+            'comment', (comment.pk for comment in comments)
+        )
+        return len(comments)
+
+    def load_follows(self, batch):
+        users = self.user_ids(
+            name for row in batch for name in (row['user'], row['author'])
+        )
+        follows = [
+            Follow(user_id=users[row['user']], author_id=users[row['author']])
+            for row in batch
+            if row['user'] in users and row['author'] in users
+            and row['user'] != row['author']
+        ]
+        Follow.objects.bulk_create(
+            follows,
+            batch_size=bulk_batch_size(Follow, self.batch_size),
+            ignore_conflicts=True,
+        )
+        return len(follows)
+
+    def load(self, name, pool):
+        path = find_input(self.directory, name)
+        if path is None:
+            return
+        loader = {
+            'groups': self.load_groups,
+            'posts': lambda batch: self.load_posts(batch, pool),
+            'comments': self.load_comments,
+            'follows': self.load_follows,
+        }[name]
+        rows = islice(read_rows(path), self.checkpoint.done(name), None)
+        started = time.perf_counter()
+        read = loaded = 0
+        for batch in batches(rows, self.batch_size):
+            with transaction.atomic():
+                loaded += loader(batch)
+            read += len(batch)
+            self.checkpoint.advance(name, len(batch))
+        seconds = time.perf_counter() - started
+        self.stats[name] = {
+            'rows': loaded,
+            'skipped': read - loaded,
+            'seconds': round(seconds, 2),
+            'rows_per_second': round(read / seconds) if seconds else read,
+        }
+        self.log(
+            f'{name}: загружено {loaded}, пропущено {read - loaded}, '
+            f'{self.stats[name]["rows_per_second"]} строк/с'
+        )
+
+    def reset_sequences(self):
+        # Явные id не двигают последовательности PostgreSQL.
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Group, Post, Comment, Follow, User]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def imported(self, model, name):
+        """Строки model из диапазона id, загруженного всеми запусками."""
+        bounds = self.checkpoint.range(name)
+        if bounds is None:
+            return model.objects.none()
+        return model.objects.filter(pk__range=bounds)
+
+    def imported_follows(self):
+        """Пары (читатель, автор) из уже загруженной части подписок.
+
+        У подписок нет сдвига id, поэтому пары берутся из входного файла.
+        """
+        path = find_input(self.directory, 'follows')
+        done = self.checkpoint.done('follows')
+        if path is None or not done:
+            return
+        for row in islice(read_rows(path), done):
+            user = self.users.get(row['user'])
+            author = self.users.get(row['author'])
+            if user and author and user != author:
+                yield user, author
+
+    def finish(self, index_search=True):
+        self.reset_sequences()
+        posts = self.imported(Post, 'post')
+        comments = self.imported(Comment, 'comment')
+        authors = set(posts.values_list('author_id', flat=True).distinct())
+        readers = set()
+        for user_id, author_id in self.imported_follows():
+            readers.add(user_id)
+            authors.add(author_id)
+        # Счетчики задеты только у загруженных авторов, подписчиков и
+        # постов с новыми комментариями.
+        repair_counters(
+            user_ids=authors | readers,
+            post_ids=(posts | Post.objects.filter(
+                pk__in=comments.values('post_id')
+            )).values('pk'),
+        )
+        readers.update(Follow.objects.filter(
+            author_id__in=authors
+        ).values_list('user_id', flat=True))
+        for user_id in readers:
+            timeline.rebuild(user_id)
+        if index_search:
+            post_ids = posts.order_by().values_list('pk', flat=True).union(
+                comments.order_by().values_list('post_id', flat=True)
+            )
+            for post_id in post_ids.iterator():
+                search.index_post(post_id)
+        feed_cache.bump_feed_version()
+        feed_cache.bump_groups_version()
+        freshness.touch(freshness.FEED_KEY)
+        if authors:
+            freshness.touch_authors(*authors)
+        groups = Group.objects.filter(pk__in=posts.values('group_id'))
+        counts.forget(counts.ALL_POSTS, *(
+            counts.group_posts(group_id)
+            for group_id in groups.values_list('pk', flat=True)
+        ))
+        for slug in groups.values_list('slug', flat=True):
+            freshness.touch_group(slug)
+
+    def run(self, names=None, index_search=True):
+        names = names or list(EXPORTS)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for name in EXPORTS:
+                if name in names:
+                    self.load(name, pool)
+        self.finish(index_search)
+        return self.stats
@@ -0,0 +1,122 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from benchmarks.generator import Generator
+from posts.models import Comment, Group, Post, User
+from posts.timeline import pulled_posts
+from yatube.settings import POSTS_COUNT
+
+FEED_INDEXES = (
+    'post_date_idx',
+    'post_author_date_idx',
+    'post_group_date_idx',
+    'comment_post_created_idx',
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает планы запросов лент с индексами и без них; '
+        'с --seed замеряет на синтетических данных, которые затем '
+        'откатываются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Сколько постов сгенерировать')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Сколько раз выполнить запрос для замера')
+
+    def seed(self, posts_count):
+        Generator(stdout=self.stdout).generate(
+            users=max(posts_count // 100, 2),
+            groups=10,
+            posts=posts_count,
+        )
+
+    def feeds(self):
+        post = Post.objects.order_by('-comments_count').first()
+        author = post.author if post else User.objects.first()
+        group = Group.objects.first()
+        page = POSTS_COUNT + 1
+        newest = ('-pub_date', '-pk')
+        feeds = {
+            'index': Post.objects.feed().order_by(*newest)[:page],
+            'profile': author.posts.feed().order_by(*newest)[:page],
+            'follow_index inbox': author.timeline.order_by(
+                '-pub_date', '-post_id'
+            ).values_list('pub_date', 'post_id')[:page],
+            'follow_index pulled': pulled_posts(author).order_by(
+                *newest
+            ).values_list('pub_date', 'pk')[:page],
+        }
+        if group is not None:
+            feeds['group_posts'] = group.posts.feed().order_by(
+                *newest
+            )[:page]
+        if post is not None:
+            feeds['post_detail comments'] = Comment.objects.filter(
+                post=post
+            ).order_by('created', 'pk')[:page]
+        return feeds
+
+    def explain(self, queryset, title):
+        # Комментарий с заголовком не дает драйверу взять план из кэша
+        # подготовленных запросов, собранного до DROP INDEX.
+        sql, params = queryset.query.sql_with_params()
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql} /* {title} */', params)
+            return '\n'.join(
+                ' '.join(str(column) for column in row)
+                for row in cursor.fetchall()
+            )
+
+    def measure(self, queryset, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.all())
+        return (time.perf_counter() - started) / repeat * 1000
+
+    def report(self, title, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in self.feeds().items():
+            self.stdout.write(self.style.SQL_TABLE(name))
+            self.stdout.write(self.explain(queryset, title))
+            self.stdout.write(
+                f'  {self.measure(queryset, repeat):.2f} мс на запрос'
+            )
+
+    def explain_all(self, repeat):
+        if not Post.objects.exists():
+            self.stderr.write('В базе нет постов, запустите с --seed')
+            return
+        self.report('С индексами', repeat)
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for index in FEED_INDEXES:
+                        cursor.execute(f'DROP INDEX {index}')
+                self.report('Без индексов', repeat)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def handle(self, *args, **options):
+        # Синтетические данные живут только в транзакции замера и
+        # откатываются вместе с ней.
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['seed'])
+                self.explain_all(options['repeat'])
+                if options['seed']:
+                    raise Rollback
+        except Rollback:
+            pass
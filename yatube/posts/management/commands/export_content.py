@@ -0,0 +1,72 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from posts.export import CHUNK_SIZE, EXPORTS, FORMATS, export_file, filtered
+
+
+def moment(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Не разобрать дату {value}')
+        parsed = parse_datetime(f'{day.isoformat()}T00:00:00')
+    return make_aware(parsed) if is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает группы, посты, комментарии и подписки '
+        'в NDJSON или CSV с постоянным расходом памяти'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*',
+                            help='{} (по умолчанию все)'.format(
+                                ', '.join(EXPORTS)
+                            ))
+        parser.add_argument('--output-dir', default='.')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--since', help='Дата или момент, включительно')
+        parser.add_argument('--until',
+                            help='Дата или момент, не включительно')
+        parser.add_argument('--author', help='Имя пользователя автора')
+        parser.add_argument('--group', help='Слаг группы')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        names = options['models'] or list(EXPORTS)
+        unknown = [name for name in names if name not in EXPORTS]
+        if unknown:
+            raise CommandError('Неизвестные модели: ' + ', '.join(unknown))
+        since, until = (
+            moment(options[name]) if options[name] else None
+            for name in ('since', 'until')
+        )
+        os.makedirs(options['output_dir'], exist_ok=True)
+        for name in names:
+            started = time.perf_counter()
+            queryset = filtered(
+                name,
+                since=since,
+                until=until,
+                author=options['author'],
+                group=options['group'],
+            )
+            path, count = export_file(
+                name,
+                queryset,
+                options['output_dir'],
+                options['format'],
+                options['gzip'],
+                options['chunk_size'],
+            )
+            self.stdout.write(
+                f'{path}: строк {count} '
+                f'за {time.perf_counter() - started:.1f} с'
+            )
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORTS
+from posts.importer import BATCH_SIZE, Importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Пакетно загружает выгрузку export_content (NDJSON или CSV, '
+        'можно gzip) с продолжением с контрольной точки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory',
+                            help='Каталог с groups, posts, comments, follows')
+        parser.add_argument('models', nargs='*',
+                            help='{} (по умолчанию все)'.format(
+                                ', '.join(EXPORTS)
+                            ))
+        parser.add_argument('--checkpoint',
+                            help='Файл контрольной точки для продолжения')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--media-dir',
+                            help='Откуда брать картинки постов')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Потоков для копирования картинок')
+        parser.add_argument('--keep-ids', action='store_true',
+                            help='Сохранить исходные id (пустая база)')
+        parser.add_argument('--no-create-users', action='store_true',
+                            help='Пропускать строки неизвестных авторов')
+        parser.add_argument('--skip-search', action='store_true',
+                            help='Не индексировать, rebuild_search_index')
+
+    def handle(self, *args, **options):
+        unknown = [name for name in options['models'] if name not in EXPORTS]
+        if unknown:
+            raise CommandError('Неизвестные модели: ' + ', '.join(unknown))
+        importer = Importer(
+            options['directory'],
+            checkpoint=options['checkpoint'],
+            batch_size=options['batch_size'],
+            media_dir=options['media_dir'],
+            workers=options['workers'],
+            keep_ids=options['keep_ids'],
+            create_users=not options['no_create_users'],
+            stdout=self.stdout,
+        )
+        stats = importer.run(
+            options['models'], index_search=not options['skip_search']
+        )
+        total = sum(row['rows'] for row in stats.values())
+        self.stdout.write(self.style.SUCCESS(f'Загружено строк: {total}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import get_index, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс постов и комментариев'
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'{type(get_index()).__name__}: проиндексировано постов {count}'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import repair_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов, комментариев и подписок'
+
+    def handle(self, *args, **options):
+        repaired = repair_counters()
+        self.stdout.write(self.style.SUCCESS(
+            'Исправлено пользователей: {users}, постов: {posts}'.format(
+                **repaired
+            )
+        ))
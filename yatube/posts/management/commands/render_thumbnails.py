@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, Thumbnail
+from posts.thumbnails import render_thumbnails, variants
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь превью для постов, у которых их еще нет'
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').values_list('pk', 'image')
+        queued = 0
+        for post_id, source in posts.iterator():
+            ready = set(Thumbnail.objects.filter(
+                post_id=post_id, source=source, ready=True
+            ).values_list('geometry', 'format'))
+            missing = [
+                variant for variant in variants() if variant not in ready
+            ]
+            if not missing:
+                continue
+            # Картинку могли сменить в обход post_edit (например, в
+            # админке): строки вариантов переходят на новый источник.
+            for geometry, name in missing:
+                Thumbnail.objects.update_or_create(
+                    post_id=post_id,
+                    geometry=geometry,
+                    format=name,
+                    defaults={'source': source, 'ready': False, 'url': ''},
+                )
+            # Без ключа: прошлая задача с тем же ключом могла не
+            # нарисовать варианты, например, без файла картинки.
+            render_thumbnails.delay(post_id, source)
+            queued += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Поставлено в очередь постов: {queued}'
+        ))
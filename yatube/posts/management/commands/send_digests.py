@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.notifications import build_digests, deliver
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает уведомления о новых постах в сводки и отправляет их; '
+        'с --every повторяет это каждые N секунд'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--every', type=float, default=0)
+
+    def handle(self, *args, **options):
+        while True:
+            created = build_digests()
+            sent = deliver(options['batch_size'])
+            self.stdout.write(f'Новых сводок: {created}, отправлено: {sent}')
+            if options['every'] <= 0:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    length = getattr(settings, 'TIMELINE_LENGTH', 800)
+    limit = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+    # Посты популярных авторов читаются на лету, в ленты их не кладем.
+    popular = Follow.objects.order_by().values('author_id').annotate(
+        followers=models.Count('id')
+    ).filter(followers__gt=limit).values('author_id')
+    readers = Follow.objects.order_by().values_list(
+        'user_id', flat=True
+    ).distinct()
+    for user_id in readers.iterator():
+        authors = Follow.objects.filter(user_id=user_id).exclude(
+            author_id__in=popular
+        ).values('author_id')
+        posts = Post.objects.filter(author_id__in=authors).order_by(
+            '-pub_date'
+        ).values_list('id', 'pub_date')[:length]
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0006_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
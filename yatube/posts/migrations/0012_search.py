@@ -0,0 +1,59 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:49
+
+from django.db import migrations, models
+from django.db.utils import OperationalError
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE posts_search "
+                "USING fts5(text, comments, tokenize='unicode61')"
+            )
+        except OperationalError:
+            # SQLite собран без FTS5, поиск возьмет таблицу SearchTerm.
+            return
+        for post_id, text in Post.objects.values_list('pk', 'text').iterator():
+            comments = Comment.objects.filter(post_id=post_id).values_list(
+                'text', flat=True
+            )
+            cursor.execute(
+                'INSERT INTO posts_search (rowid, text, comments) '
+                'VALUES (%s, %s, %s)',
+                [post_id, text, '\n'.join(comments)],
+            )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_thumbnail_format'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_term_post'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -14,6 +14,20 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    CARD_FIELDS = (
+        'id', 'text', 'pub_date', 'image', 'author', 'group',
+        'author__username', 'author__first_name', 'author__last_name',
+        'group__slug',
+    )
+
+    def feed(self):
+        """Посты для карточек ленты: автор и группа одним запросом."""
+        return self.select_related('author', 'group').only(
+            *self.CARD_FIELDS
+        ).prefetch_related('thumbnails')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -39,12 +53,41 @@ class Post(models.Model):
         blank=True,
         verbose_name='Картинка'
     )
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    # Счетчики меняются только атомарными UPDATE из posts.counters.
+    COUNTER_FIELDS = ('comments_count',)
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Правка поста (форма, админка, API) не пишет счетчики:
+        # иначе значение, прочитанное до правки, затрет комментарии,
+        # добавленные за это время.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -64,6 +107,14 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -78,4 +129,155 @@ class Follow(models.Model):
     )
 
     class Meta:
-        UniqueConstraint(fields=['user', 'author'], name='unique_follow')
+        constraints = [
+            UniqueConstraint(fields=['user', 'author'], name='unique_follow'),
+        ]
+
+
+class Thumbnail(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnails'
+    )
+    geometry = models.CharField(max_length=32)
+    format = models.CharField(max_length=8, default='JPEG')
+    source = models.CharField(max_length=100)
+    url = models.CharField(max_length=255, blank=True)
+    width = models.PositiveIntegerField(null=True)
+    height = models.PositiveIntegerField(null=True)
+    ready = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['post', 'geometry', 'format'],
+                name='unique_post_thumbnail_variant'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.source} {self.geometry} {self.format}'
+
+
+class SearchTerm(models.Model):
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['term', 'post'], name='unique_term_post'),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'], name='timeline_user_date_idx'
+            ),
+        ]
+
+
+class Digest(models.Model):
+    """Письмо-сводка одному читателю о новых постах его авторов."""
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ждет отправки'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Не отправлено'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='digests'
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='digest_status_idx'),
+            models.Index(
+                fields=['user', '-created'], name='digest_user_created_idx'
+            ),
+        ]
+
+
+class Notification(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    digest = models.ForeignKey(
+        Digest,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='notifications'
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'], name='unique_notification'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['digest', 'user'], name='notification_digest_idx'
+            ),
+        ]
@@ -0,0 +1,178 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+
+from core.tasks import task
+
+from .models import Digest, Follow, Notification, Post
+from .utils import bulk_batch_size
+
+
+def digest_interval():
+    return timedelta(seconds=getattr(
+        settings, 'NOTIFICATION_DIGEST_INTERVAL', 24 * 60 * 60
+    ))
+
+
+def digest_max_posts():
+    return getattr(settings, 'NOTIFICATION_DIGEST_MAX_POSTS', 20)
+
+
+@task
+def collect(post_id):
+    """Отмечает новый пост для всех подписчиков автора с адресом почты.
+
+    Одна строка на читателя, а не письмо: письма собираются в сводки
+    позже, в build_digests().
+    """
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return
+    followers = Follow.objects.filter(author_id=author_id).exclude(
+        user__email=''
+    ).values_list('user_id', flat=True)
+    Notification.objects.bulk_create(
+        (
+            Notification(user_id=user_id, post_id=post_id)
+            for user_id in followers.iterator()
+        ),
+        batch_size=bulk_batch_size(Notification, 1000),
+        ignore_conflicts=True,
+    )
+
+
+def build_digests(now=None):
+    """Собирает ожидающие уведомления в сводки.
+
+    Читатель получает не больше одной сводки за
+    NOTIFICATION_DIGEST_INTERVAL; его уведомления копятся до следующей.
+    """
+    now = now or timezone.now()
+    recent = Digest.objects.filter(
+        created__gt=now - digest_interval()
+    ).values('user_id')
+    user_ids = list(Notification.objects.filter(
+        digest__isnull=True
+    ).exclude(user_id__in=recent).values_list(
+        'user_id', flat=True
+    ).order_by('user_id').distinct())
+    created = 0
+    for user_id in user_ids:
+        with transaction.atomic():
+            digest = Digest.objects.create(user_id=user_id)
+            attached = Notification.objects.filter(
+                user_id=user_id, digest__isnull=True
+            ).update(digest=digest)
+            if attached:
+                created += 1
+            else:
+                # Уведомления забрал параллельный запуск.
+                digest.delete()
+    return created
+
+
+def render_digests(digests):
+    """Письма для пачки сводок: посты всех сводок одним запросом.
+
+    Из каждой сводки читаются только NOTIFICATION_DIGEST_MAX_POSTS
+    новых постов, об остальных письмо сообщает числом.
+    """
+    template = get_template('posts/email/digest.txt')
+    site = getattr(settings, 'SITE_URL', 'http://localhost:8000')
+    follow_url = site + reverse('posts:follow_index')
+    limit = digest_max_posts()
+    totals = dict(Notification.objects.filter(
+        digest__in=digests
+    ).values('digest_id').annotate(total=Count('pk')).values_list(
+        'digest_id', 'total'
+    ))
+    newest = Notification.objects.filter(
+        digest_id=OuterRef('digest_id')
+    ).order_by('-post__pub_date', '-pk').values('pk')[:limit]
+    posts = {}
+    for notification in Notification.objects.filter(
+        digest__in=digests, pk__in=Subquery(newest)
+    ).select_related('post__author', 'post__group').order_by(
+        '-post__pub_date', '-pk'
+    ):
+        posts.setdefault(notification.digest_id, []).append(
+            notification.post
+        )
+    messages = {}
+    for digest in digests:
+        digest_posts = posts.get(digest.pk)
+        if not digest_posts:
+            continue
+        for post in digest_posts:
+            post.url = site + reverse(
+                'posts:post_detail', kwargs={'post_id': post.pk}
+            )
+        total = totals[digest.pk]
+        body = template.render({
+            'user': digest.user,
+            'posts': digest_posts,
+            'more': total - len(digest_posts),
+            'follow_url': follow_url,
+        })
+        messages[digest.pk] = mail.EmailMessage(
+            f'Yatube: новых постов — {total}',
+            body,
+            to=[digest.user.email],
+        )
+    return messages
+
+
+def deliver(batch_size=None, max_attempts=3):
+    """Отправляет ожидающие сводки через одно соединение с почтой.
+
+    Состояние пишется после каждого письма, поэтому прерванную отправку
+    можно продолжить: повторно уйдет не больше одного письма.
+    """
+    batch_size = batch_size or getattr(
+        settings, 'NOTIFICATION_BATCH_SIZE', 100
+    )
+    sent = 0
+    last_pk = 0
+    with mail.get_connection() as connection:
+        while True:
+            digests = list(Digest.objects.filter(
+                status=Digest.PENDING, pk__gt=last_pk
+            ).select_related('user').order_by('pk')[:batch_size])
+            if not digests:
+                return sent
+            last_pk = digests[-1].pk
+            messages = render_digests(digests)
+            for digest in digests:
+                message = messages.get(digest.pk)
+                if message is None:
+                    # Все посты сводки удалены.
+                    digest.delete()
+                    continue
+                try:
+                    connection.send_messages([message])
+                except Exception as error:
+                    Digest.objects.filter(pk=digest.pk).update(
+                        attempts=F('attempts') + 1,
+                        error=str(error),
+                        status=(
+                            Digest.FAILED
+                            if digest.attempts + 1 >= max_attempts
+                            else Digest.PENDING
+                        ),
+                    )
+                    continue
+                Digest.objects.filter(pk=digest.pk).update(
+                    status=Digest.SENT,
+                    attempts=F('attempts') + 1,
+                    error='',
+                    sent=timezone.now(),
+                )
+                sent += 1
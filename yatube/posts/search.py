@@ -0,0 +1,215 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from core.tasks import task
+
+from .models import Comment, Post, SearchTerm
+
+FTS_TABLE = 'posts_search'
+TEXT_WEIGHT = 2
+COMMENT_WEIGHT = 1
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+
+
+def tokenize(text):
+    return [
+        token for token in TOKEN_RE.findall(text.lower())
+        if len(token) <= MAX_TERM_LENGTH
+    ]
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+_fts_databases = {}
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_databases:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master "
+                "WHERE type = 'table' AND name = %s",
+                [FTS_TABLE],
+            )
+            _fts_databases[name] = cursor.fetchone() is not None
+    return _fts_databases[name]
+
+
+class PythonIndex:
+    """Инвертированный индекс в таблице SearchTerm, ранжирование в Python."""
+
+    def index(self, post_id, text, comments):
+        weights = Counter()
+        for token in tokenize(text):
+            weights[token] += TEXT_WEIGHT
+        for comment in comments:
+            for token in tokenize(comment):
+                weights[token] += COMMENT_WEIGHT
+        SearchTerm.objects.filter(post_id=post_id).delete()
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, post_id=post_id, weight=weight)
+            for term, weight in weights.items()
+        )
+
+    def remove(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def match(self, terms, limit):
+        postings = defaultdict(dict)
+        for term, post_id, weight in SearchTerm.objects.filter(
+            term__in=terms
+        ).values_list('term', 'post_id', 'weight').iterator():
+            postings[term][post_id] = weight
+        if len(postings) < len(terms):
+            return {}
+        total = Post.objects.count() or 1
+        candidates = set.intersection(*(set(p) for p in postings.values()))
+        scores = {
+            post_id: sum(
+                weight[post_id] * math.log(1 + total / len(weight))
+                for weight in postings.values()
+            )
+            for post_id in candidates
+        }
+        best = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return {post_id: scores[post_id] for post_id in best}
+
+
+class SqliteFtsIndex:
+    """Индекс SQLite FTS5, релевантность считает bm25()."""
+
+    def index(self, post_id, text, comments):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, comments) '
+                'VALUES (%s, %s, %s)',
+                [post_id, text, '\n'.join(comments)],
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def match(self, terms, limit):
+        query = ' '.join('"{}"'.format(term.replace('"', '""'))
+                         for term in terms)
+        rank = f'bm25({FTS_TABLE}, {TEXT_WEIGHT}, {COMMENT_WEIGHT})'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, -{rank} FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s ORDER BY {rank} LIMIT %s',
+                [query, limit],
+            )
+            return dict(cursor.fetchall())
+
+
+def get_index():
+    backend = _setting('SEARCH_BACKEND', 'auto')
+    if backend == 'fts5' or (backend == 'auto' and fts_available()):
+        return SqliteFtsIndex()
+    return PythonIndex()
+
+
+def index_post(post_id):
+    post = Post.objects.filter(pk=post_id).values_list('text', flat=True)
+    if not post:
+        get_index().remove(post_id)
+        return
+    comments = Comment.objects.filter(post_id=post_id).values_list(
+        'text', flat=True
+    )
+    get_index().index(post_id, post[0], list(comments))
+
+
+_local = threading.local()
+
+
+def _deleting():
+    if not hasattr(_local, 'posts'):
+        _local.posts = set()
+    return _local.posts
+
+
+def post_deleting(post_id):
+    """Пост удаляется: его комментарии уйдут каскадом, индекс не трогаем."""
+    _deleting().add(post_id)
+
+
+def remove_post(post_id):
+    _deleting().discard(post_id)
+    get_index().remove(post_id)
+
+
+@task(max_attempts=3)
+def reindex_post(post_id):
+    index_post(post_id)
+
+
+def comments_changed(post_id):
+    """Переиндексация поста после комментариев — в фоне и с задержкой.
+
+    Пост индексируется целиком вместе со всеми комментариями, поэтому
+    все комментарии за окно SEARCH_REINDEX_DELAY секунд дают одну
+    задачу, которая выполнится после конца окна.
+    """
+    if post_id in _deleting():
+        return
+    reindex_post.debounce(
+        post_id,
+        key=f'search:{post_id}',
+        window=_setting('SEARCH_REINDEX_DELAY', 60),
+    )
+
+
+def rebuild():
+    index = get_index()
+    index.clear()
+    count = 0
+    for post_id in Post.objects.values_list('pk', flat=True).iterator():
+        index_post(post_id)
+        count += 1
+    return count
+
+
+def search(query):
+    """id постов по запросу: релевантность, умноженная на свежесть."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    limit = _setting('SEARCH_MAX_RESULTS', 500)
+    scores = get_index().match(terms, limit)
+    if not scores:
+        return []
+    half_life = _setting('SEARCH_RECENCY_DAYS', 30)
+    now = timezone.now()
+    ranked = {}
+    for post_id, pub_date in Post.objects.filter(
+        pk__in=scores
+    ).values_list('pk', 'pub_date'):
+        age = max((now - pub_date).total_seconds() / 86400, 0)
+        ranked[post_id] = scores[post_id] * 0.5 ** (age / half_life)
+    return sorted(ranked, key=ranked.get, reverse=True)
@@ -0,0 +1,199 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import counters, counts, freshness, notifications, search, timeline
+from .feed_cache import (bump_author_version, bump_card_version,
+                         bump_feed_version, bump_groups_version)
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_cache(sender, instance, **kwargs):
+    bump_card_version(instance.pk)
+    bump_feed_version()
+
+
+def _name(user):
+    # Через __dict__, чтобы не подгружать отложенные поля.
+    return tuple(
+        user.__dict__.get(field)
+        for field in ('username', 'first_name', 'last_name')
+    )
+
+
+@receiver(post_init, sender=User)
+def remember_name(sender, instance, **kwargs):
+    instance._loaded_name = _name(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cache(sender, instance, created, raw=False, **kwargs):
+    """Карточки показывают имя автора: его смена меняет их версию.
+
+    Вход пользователя тоже сохраняет его (last_login), поэтому версии
+    меняются, только если имя действительно другое.
+    """
+    if created or raw:
+        return
+    if _name(instance) == getattr(instance, '_loaded_name', None):
+        return
+    instance._loaded_name = _name(instance)
+    bump_author_version(instance.pk)
+    bump_feed_version()
+    freshness.touch_author(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_cache(sender, instance, **kwargs):
+    bump_groups_version()
+    bump_feed_version()
+
+
+@receiver(post_save, sender=Post)
+def push_to_timelines(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def notify_followers(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notifications.collect.delay(
+            instance.pk, key=f'notify:{instance.pk}'
+        )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_stats(instance.author_id, 1, 'posts_count')
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, -1, 'posts_count')
+
+
+@receiver(post_save, sender=Post)
+def shift_post_counts(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counts.increment(1, *counts.post_keys(instance.group_id))
+        return
+    if 'group_id' in instance.get_deferred_fields():
+        # Группа не загружалась, значит, и не менялась.
+        return
+    previous = getattr(instance, '_loaded_group_id', None)
+    if previous != instance.group_id:
+        if previous is not None:
+            counts.increment(-1, counts.group_posts(previous))
+        if instance.group_id is not None:
+            counts.increment(1, counts.group_posts(instance.group_id))
+
+
+@receiver(post_delete, sender=Post)
+def unshift_post_counts(sender, instance, **kwargs):
+    counts.increment(-1, *counts.post_keys(instance.group_id))
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_stats(instance.author_id, 1, 'followers_count')
+        counters.change_user_stats(instance.user_id, 1, 'following_count')
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, -1, 'followers_count')
+    counters.change_user_stats(instance.user_id, -1, 'following_count')
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance.pk)
+
+
+@receiver(pre_delete, sender=Post)
+def skip_cascaded_comments(sender, instance, **kwargs):
+    search.post_deleting(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reindex_commented_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.comments_changed(instance.post_id)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # Через __dict__, чтобы не подгружать отложенное поле из .only().
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def touch_post_pages(sender, instance, **kwargs):
+    freshness.touch_post(
+        instance.pk,
+        instance.author_id,
+        instance.group_id,
+        getattr(instance, '_loaded_group_id', None),
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_commented_post(sender, instance, **kwargs):
+    freshness.touch(freshness.POST_KEY.format(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def touch_group_pages(sender, instance, **kwargs):
+    freshness.touch_group(instance.slug)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def touch_follow_profiles(sender, instance, **kwargs):
+    freshness.touch_authors(instance.author_id, instance.user_id)
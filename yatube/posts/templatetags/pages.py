@@ -0,0 +1,15 @@
+from django import template
+
+from posts.utils import ELLIPSIS, elided_page_range
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=2):
+    return elided_page_range(page_obj, on_each_side)
+
+
+@register.filter
+def is_gap(value):
+    return value == ELLIPSIS
@@ -0,0 +1,10 @@
+from django import template
+
+from posts.thumbnails import picture
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(post):
+    return picture(post)
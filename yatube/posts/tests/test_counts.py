@@ -0,0 +1,134 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from posts import counts
+from posts.counters import repair_counters
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class CountsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        Post.objects.bulk_create(
+            Post(author=cls.user if i % 2 else cls.other, text=f'Пост {i}')
+            for i in range(30)
+        )
+        repair_counters()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_exact_count_is_cached(self):
+        """Точное число считается один раз, дальше берется из кэша"""
+        posts = Post.objects.filter(author=self.user)
+        result = counts.count(posts, key='test', mode=counts.EXACT)
+        self.assertEqual(result, counts.Count(15, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(counts.count(posts, key='test').value, 15)
+
+    def test_estimate_above_limit(self):
+        """Выше предела вместо COUNT(*) отдается оценка"""
+        result = counts.count(Post.objects.all(), limit=10)
+        self.assertTrue(result.approximate)
+        self.assertGreater(result.value, 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                counts.count(Post.objects.all(), limit=10), result
+            )
+        self.assertEqual(
+            counts.count(Post.objects.all(), limit=100),
+            counts.Count(30, False),
+        )
+
+    def test_sampled_estimate_keeps_share(self):
+        """Оценка по выборке сохраняет долю подходящих строк"""
+        estimate = counts.sampled_estimate(
+            Post.objects.filter(author=self.user), sample=10
+        )
+        total = counts.table_estimate(Post)
+        self.assertEqual(estimate, round(total / 2))
+
+    def test_table_estimate_uses_statistics(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(counts.table_estimate(Post), 30)
+
+    def test_author_count_comes_from_stats(self):
+        """Профиль и страница поста берут число постов из UserStats"""
+        post = Post.objects.filter(author=self.user).first()
+        self.user.stats.posts_count = 99
+        self.user.stats.save()
+        client = Client()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            )
+        self.assertEqual(response.context['count'], 99)
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']
+             and 'posts_post' in query['sql']]
+        )
+        response = client.get(
+            reverse('posts:profile', kwargs={'username': 'auth'})
+        )
+        self.assertEqual(response.context['posts_count'], 99)
+
+    def test_forget_drops_exact_counts(self):
+        counts.count(Post.objects.all(), key=counts.ALL_POSTS)
+        counts.forget(counts.ALL_POSTS)
+        self.assertIsNone(cache.get(counts.KEY.format(counts.ALL_POSTS)))
+
+    @override_settings(
+        COUNT_MODE=counts.APPROXIMATE,
+        COUNT_MODES={'posts:profile': counts.EXACT},
+    )
+    def test_mode_per_view(self):
+        request = RequestFactory().get('/')
+        request.resolver_match = resolve(
+            reverse('posts:profile', kwargs={'username': 'auth'})
+        )
+        self.assertEqual(counts.mode_for(request), counts.EXACT)
+        request.resolver_match = resolve(reverse('posts:index'))
+        self.assertEqual(counts.mode_for(request), counts.APPROXIMATE)
+
+
+class CountSignalsTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.other_group = Group.objects.create(title='Другая', slug='other')
+
+    def cached(self, key):
+        return counts.count(Post.objects.none(), key=key).value
+
+    def test_signals_shift_cached_counts(self):
+        """Новые, перенесенные и удаленные посты сдвигают счетчики"""
+        post = Post.objects.create(author=self.user, text='Пост')
+        group_key = counts.group_posts(self.group.pk)
+        other_key = counts.group_posts(self.other_group.pk)
+        counts.count(Post.objects.all(), key=counts.ALL_POSTS)
+        counts.count(self.group.posts.all(), key=group_key)
+        counts.count(self.other_group.posts.all(), key=other_key)
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.group
+        post.save()
+        self.assertEqual(self.cached(group_key), 1)
+        Post.objects.create(
+            author=self.user, text='Еще', group=self.other_group
+        )
+        self.assertEqual(self.cached(counts.ALL_POSTS), 2)
+        self.assertEqual(self.cached(other_key), 1)
+        post.delete()
+        self.assertEqual(self.cached(counts.ALL_POSTS), 1)
+        self.assertEqual(self.cached(group_key), 0)
@@ -0,0 +1,113 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.old = Post.objects.create(author=cls.author, text='Старый')
+        Post.objects.filter(pk=cls.old.pk).update(
+            pub_date=timezone.now() - timedelta(days=30)
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Новый, "с кавычками"'
+        )
+        Post.objects.create(author=cls.reader, text='Чужой')
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ок')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def export(self, *args, **options):
+        call_command(
+            'export_content', *args, output_dir=self.directory,
+            stdout=StringIO(), **options
+        )
+
+    def read_ndjson(self, name, compressed=False):
+        path = os.path.join(self.directory, f'{name}.ndjson')
+        if compressed:
+            with gzip.open(path + '.gz', 'rt', encoding='utf-8') as file:
+                return [json.loads(line) for line in file]
+        with open(path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_export_all_models(self):
+        """Все модели выгружаются в NDJSON, можно со сжатием"""
+        self.export(gzip=True)
+        posts = self.read_ndjson('posts', compressed=True)
+        self.assertEqual(len(posts), 3)
+        self.assertEqual(posts[1]['author'], 'author')
+        self.assertEqual(posts[1]['group'], 'group')
+        self.assertEqual(posts[1]['text'], self.post.text)
+        comments = self.read_ndjson('comments', compressed=True)
+        self.assertEqual(comments[0]['post'], self.post.pk)
+        follows = self.read_ndjson('follows', compressed=True)
+        self.assertEqual(follows, [{
+            'id': follows[0]['id'], 'user': 'reader', 'author': 'author'
+        }])
+        groups = self.read_ndjson('groups', compressed=True)
+        self.assertEqual(groups[0]['slug'], 'group')
+
+    def test_export_filters(self):
+        """Фильтры по дате, автору и группе"""
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        self.export('posts', since=since, author='author')
+        self.assertEqual(
+            [row['id'] for row in self.read_ndjson('posts')], [self.post.pk]
+        )
+        self.export('posts', 'comments', group='group')
+        self.assertEqual(len(self.read_ndjson('posts')), 1)
+        self.assertEqual(len(self.read_ndjson('comments')), 1)
+
+    def test_export_csv(self):
+        """CSV с шапкой и экранированием"""
+        self.export('posts', format='csv')
+        path = os.path.join(self.directory, 'posts.csv')
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1]['text'], self.post.text)
+        self.assertEqual(rows[0]['group'], '')
+
+    def test_admin_action_streams_selected(self):
+        """Действие админки отдает выбранные посты потоком NDJSON"""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.post(
+            reverse('admin:posts_post_changelist'),
+            {'action': 'export_ndjson', '_selected_action': [self.post.pk]},
+        )
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines],
+                         [self.post.pk])
@@ -0,0 +1,180 @@
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.models import Task
+from posts import counts
+from posts.importer import Importer
+from posts.models import (Comment, Follow, Group, Post, Thumbnail,
+                          TimelineEntry)
+from posts.search import search
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=os.path.dirname(__file__))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, 'posts'))
+        with open(os.path.join(self.directory, 'posts', 'pic.gif'),
+                  'wb') as file:
+            file.write(b'GIF89a')
+        self.write('groups', [
+            {'id': 1, 'title': 'Группа', 'slug': 'group',
+             'description': 'Описание'},
+        ])
+        self.write('posts', [
+            {'id': i, 'author': 'author' if i % 3 else 'other',
+             'group': 'group' if i % 2 else None, 'text': f'Пост {i}',
+             'pub_date': f'2021-01-{i:02d}T10:00:00+00:00',
+             'image': 'posts/pic.gif' if i == 1 else ''}
+            for i in range(1, 11)
+        ])
+        self.write('comments', [
+            {'id': i, 'post': 2, 'author': 'reader', 'text': f'Ответ {i}',
+             'created': '2021-02-01T10:00:00+00:00'}
+            for i in range(1, 4)
+        ] + [{'id': 9, 'post': 999, 'author': 'reader', 'text': 'Сирота',
+              'created': '2021-02-01T10:00:00+00:00'}])
+        self.write('follows', [
+            {'id': 1, 'user': 'reader', 'author': 'author'},
+            {'id': 2, 'user': 'reader', 'author': 'reader'},
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def write(self, name, rows):
+        path = os.path.join(self.directory, f'{name}.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def run_import(self, *args, **options):
+        call_command(
+            'import_content', self.directory, *args, stdout=StringIO(),
+            checkpoint=os.path.join(self.directory, 'checkpoint.json'),
+            batch_size=4, **options
+        )
+
+    def test_import_keeps_data_consistent(self):
+        """Импорт создает авторов, связи, счетчики и ленты"""
+        existing = Post.objects.create(
+            author=User.objects.create_user(username='author'), text='Был'
+        )
+        counts.count(Post.objects.all(), key=counts.ALL_POSTS)
+        self.run_import()
+        self.assertEqual(Post.objects.count(), 11)
+        self.assertEqual(
+            counts.count(Post.objects.all(), key=counts.ALL_POSTS).value, 11
+        )
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(
+            Post.objects.filter(group__slug='group').count(), 5
+        )
+        post = Post.objects.get(text='Пост 2')
+        self.assertNotEqual(post.pk, existing.pk)
+        self.assertEqual(str(post.pub_date.date()), '2021-01-02')
+        self.assertEqual(post.comments.count(), 3)
+        self.assertEqual(post.comments_count, 3)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(
+            str(post.comments.first().created.date()), '2021-02-01'
+        )
+        self.assertEqual(Follow.objects.count(), 1)
+        author = User.objects.get(username='author')
+        self.assertEqual(author.stats.posts_count, 8)
+        self.assertEqual(author.stats.followers_count, 1)
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(), 8
+        )
+        image = Post.objects.get(text='Пост 1').image
+        self.assertTrue(image.name.startswith('posts/pic'))
+        self.assertTrue(image.storage.exists(image.name))
+
+    def test_finish_repairs_only_imported_rows(self):
+        """finish() пересчитывает счетчики только задетых импортом строк"""
+        stranger = User.objects.create_user(username='stranger')
+        post = Post.objects.create(author=stranger, text='Чужой')
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        stranger.stats.posts_count = 7
+        stranger.stats.save()
+        self.run_import()
+        post.refresh_from_db()
+        stranger.stats.refresh_from_db()
+        self.assertEqual(post.comments_count, 5)
+        self.assertEqual(stranger.stats.posts_count, 7)
+        self.assertEqual(
+            User.objects.get(username='author').stats.posts_count, 7
+        )
+
+    def test_import_resumes_from_checkpoint(self):
+        """Повторный запуск с той же контрольной точкой ничего не дублирует"""
+        self.run_import('groups', 'posts')
+        self.assertEqual(Comment.objects.count(), 0)
+        self.run_import()
+        self.run_import()
+        self.assertEqual(Post.objects.count(), 10)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(
+            Post.objects.get(text='Пост 2').comments.count(), 3
+        )
+
+    def test_finish_after_interrupted_run(self):
+        """Запуск после сбоя до finish() индексирует и строит ленты"""
+        checkpoint = os.path.join(self.directory, 'checkpoint.json')
+        importer = Importer(self.directory, checkpoint=checkpoint,
+                            batch_size=4, media_dir=self.directory)
+        with ThreadPoolExecutor() as pool:
+            for name in ('groups', 'posts', 'comments', 'follows'):
+                importer.load(name, pool)
+        reader = User.objects.get(username='reader')
+        self.assertEqual(search('ответ'), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=reader).exists())
+        self.run_import()
+        post = Post.objects.get(text='Пост 2')
+        self.assertEqual(search('ответ'), [post.pk])
+        self.assertEqual(search('пост 7')[0], Post.objects.get(
+            text='Пост 7'
+        ).pk)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(), 7
+        )
+
+    @override_settings(TASKS_EAGER=False)
+    def test_thumbnails_scheduled_in_batches(self):
+        """Превью пачки постов ставятся в очередь одним заходом"""
+        self.write('posts', [
+            {'id': i, 'author': 'author', 'group': None,
+             'text': f'Пост {i}', 'pub_date': '2021-01-01T10:00:00+00:00',
+             'image': 'posts/pic.gif'}
+            for i in range(1, 9)
+        ])
+        self.run_import('posts')
+        self.assertEqual(
+            Task.objects.filter(
+                name='posts.thumbnails.render_thumbnails'
+            ).count(),
+            8,
+        )
+        self.assertEqual(
+            Thumbnail.objects.filter(ready=False).values('post').distinct()
+            .count(),
+            8,
+        )
@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -27,3 +31,83 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         self.assertEqual(str(post), post.text[:15])
         self.assertEqual(str(group), group.title)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_writes(self):
+        """Счетчики обновляются при записи постов, комментариев, подписок"""
+        author = CountersTest.author
+        reader = CountersTest.reader
+        post = Post.objects.create(author=author, text='Пост')
+        Comment.objects.create(post=post, author=reader, text='Коммент')
+        follow = Follow.objects.create(user=reader, author=author)
+        author.stats.refresh_from_db()
+        reader.stats.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(author.stats.posts_count, 1)
+        self.assertEqual(author.stats.followers_count, 1)
+        self.assertEqual(reader.stats.following_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        follow.delete()
+        post.comments.all().delete()
+        post.delete()
+        author.stats.refresh_from_db()
+        reader.stats.refresh_from_db()
+        self.assertEqual(author.stats.posts_count, 0)
+        self.assertEqual(author.stats.followers_count, 0)
+        self.assertEqual(reader.stats.following_count, 0)
+
+    def test_edit_keeps_comments_count(self):
+        """Сохранение устаревшего поста не затирает счетчик комментариев"""
+        post = Post.objects.create(author=CountersTest.author, text='Пост')
+        Comment.objects.create(
+            post=post, author=CountersTest.reader, text='Коммент'
+        )
+        post.text = 'Правка'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Правка')
+        self.assertEqual(post.comments_count, 1)
+
+    def test_recount_stats_repairs_drift(self):
+        """recount_stats чинит разошедшиеся счетчики"""
+        author = CountersTest.author
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}') for i in range(3)
+        )
+        UserStats.objects.filter(user=CountersTest.reader).delete()
+        post = Post.objects.first()
+        Post.objects.filter(pk=post.pk).update(comments_count=7)
+        call_command('recount_stats', stdout=StringIO())
+        self.assertEqual(UserStats.objects.get(user=author).posts_count, 3)
+        self.assertTrue(
+            UserStats.objects.filter(user=CountersTest.reader).exists()
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена в БД"""
+        Follow.objects.create(
+            user=CountersTest.reader, author=CountersTest.author
+        )
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Follow.objects.create(
+                    user=CountersTest.reader, author=CountersTest.author
+                )
+
+    def test_explain_feeds_command(self):
+        """explain_feeds печатает планы лент и откатывает данные --seed"""
+        out = StringIO()
+        call_command('explain_feeds', seed=50, repeat=1, stdout=out)
+        for feed in ('index', 'profile', 'follow_index', 'group_posts'):
+            self.assertIn(feed, out.getvalue())
+        self.assertIn('Без индексов', out.getvalue())
+        self.assertFalse(Post.objects.exists())
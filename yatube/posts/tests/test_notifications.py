@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.tasks import work
+from posts.models import Digest, Follow, Notification, Post, User
+from posts.notifications import build_digests, deliver
+
+
+class BrokenBackend(BaseEmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('почта недоступна')
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+
+class DigestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com'
+        )
+        cls.other = User.objects.create_user(
+            username='other', email='other@example.com'
+        )
+        cls.silent = User.objects.create_user(username='silent')
+        for user in (cls.reader, cls.other, cls.silent):
+            Follow.objects.create(user=user, author=cls.author)
+
+    def publish(self, text):
+        post = Post.objects.create(author=DigestTests.author, text=text)
+        work(once=True)
+        return post
+
+    def test_notifications_for_followers_with_email(self):
+        """Уведомления получают подписчики с адресом почты"""
+        post = self.publish('Первый')
+        self.assertEqual(
+            set(Notification.objects.filter(post=post).values_list(
+                'user__username', flat=True
+            )),
+            {'reader', 'other'},
+        )
+
+    def test_one_digest_per_reader(self):
+        """Несколько постов уходят одним письмом на читателя"""
+        self.publish('Первый')
+        self.publish('Второй')
+        self.assertEqual(build_digests(), 2)
+        self.assertEqual(deliver(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        message = next(
+            message for message in mail.outbox
+            if message.to == ['reader@example.com']
+        )
+        self.assertIn('Первый', message.body)
+        self.assertIn('Второй', message.body)
+        self.assertIn('/posts/', message.body)
+        self.assertEqual(deliver(), 0)
+
+    @override_settings(NOTIFICATION_DIGEST_MAX_POSTS=2)
+    def test_digest_shows_newest_posts(self):
+        """В письмо попадают только новые посты, остальные — числом"""
+        for text in ('Первый', 'Второй', 'Третий'):
+            self.publish(text)
+        build_digests()
+        self.assertFalse(
+            Notification.objects.filter(digest__isnull=True).exists()
+        )
+        deliver()
+        message = mail.outbox[0]
+        self.assertIn('Третий', message.body)
+        self.assertIn('Второй', message.body)
+        self.assertNotIn('Первый', message.body)
+        self.assertIn('И еще постов: 1', message.body)
+        self.assertIn(reverse('posts:follow_index'), message.body)
+        self.assertIn('3', message.subject)
+
+    @override_settings(
+        EMAIL_BACKEND='posts.tests.test_notifications.CountingBackend',
+        NOTIFICATION_BATCH_SIZE=1,
+    )
+    def test_connection_reused(self):
+        CountingBackend.opened = 0
+        self.publish('Первый')
+        build_digests()
+        self.assertEqual(deliver(), 2)
+        self.assertEqual(CountingBackend.opened, 1)
+
+    def test_interval_between_digests(self):
+        """Следующая сводка не раньше, чем через интервал"""
+        self.publish('Первый')
+        build_digests()
+        deliver()
+        self.publish('Второй')
+        self.assertEqual(build_digests(), 0)
+        later = timezone.now() + timedelta(days=2)
+        self.assertEqual(build_digests(now=later), 2)
+
+    def test_failed_delivery_kept_for_retry(self):
+        """Неотправленная сводка остается в очереди до max_attempts"""
+        self.publish('Первый')
+        build_digests()
+        with self.settings(
+            EMAIL_BACKEND='posts.tests.test_notifications.BrokenBackend'
+        ):
+            self.assertEqual(deliver(max_attempts=2), 0)
+            self.assertEqual(
+                Digest.objects.filter(status=Digest.PENDING).count(), 2
+            )
+            deliver(max_attempts=2)
+        digest = Digest.objects.first()
+        self.assertEqual(digest.status, Digest.FAILED)
+        self.assertEqual(digest.attempts, 2)
+        self.assertIn('почта недоступна', digest.error)
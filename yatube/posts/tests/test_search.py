@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Task
+from core.tasks import work
+from posts.models import Comment, Post, SearchTerm
+from posts.search import PythonIndex, SqliteFtsIndex, get_index, search
+
+User = get_user_model()
+
+
+@override_settings(SEARCH_REINDEX_DELAY=0)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.client = Client()
+        self.rare = Post.objects.create(
+            author=SearchTests.user, text='Кот сидит на окне'
+        )
+        self.often = Post.objects.create(
+            author=SearchTests.user, text='Кот, кот и еще раз кот'
+        )
+        self.other = Post.objects.create(
+            author=SearchTests.user, text='Собака лает'
+        )
+
+    def check_backend(self):
+        Comment.objects.create(
+            post=self.other, author=SearchTests.user, text='Где же кот?'
+        )
+        self.assertEqual(search('где кот'), [])
+        work(once=True)
+        self.assertEqual(search('собака'), [self.other.pk])
+        self.assertEqual(search('где кот'), [self.other.pk])
+        self.assertEqual(search('КОТ')[0], self.often.pk)
+        self.assertEqual(search('бегемот'), [])
+        self.rare.delete()
+        self.assertNotIn(self.rare.pk, search('окне'))
+
+    def test_sqlite_fts_backend(self):
+        """Поиск через SQLite FTS5 по тексту постов и комментариям"""
+        self.assertIsInstance(get_index(), SqliteFtsIndex)
+        self.check_backend()
+
+    @override_settings(SEARCH_BACKEND='python')
+    def test_python_backend(self):
+        """Запасной инвертированный индекс на Python"""
+        self.assertIsInstance(get_index(), PythonIndex)
+        for post in Post.objects.all():
+            post.save()
+        self.assertTrue(SearchTerm.objects.exists())
+        self.check_backend()
+
+    def test_recent_posts_rank_higher(self):
+        """При равной релевантности свежий пост выше старого"""
+        old = Post.objects.create(author=SearchTests.user, text='Жираф')
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - timedelta(days=365)
+        )
+        new = Post.objects.create(author=SearchTests.user, text='Жираф')
+        self.assertEqual(search('жираф'), [new.pk, old.pk])
+
+    def test_search_page(self):
+        """Страница поиска выводит найденные посты карточками"""
+        response = self.client.get(reverse('posts:post_search'), {'q': 'кот'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertContains(response, 'Кот сидит на окне')
+        self.assertNotContains(response, 'Собака лает')
+
+    @override_settings(SEARCH_REINDEX_DELAY=60)
+    def test_comments_reindex_once_per_window(self):
+        """Пачка комментариев дает одну отложенную переиндексацию"""
+        for i in range(5):
+            Comment.objects.create(
+                post=self.other, author=SearchTests.user, text=f'Енот {i}'
+            )
+        tasks = Task.objects.filter(name='posts.search.reindex_post')
+        self.assertLessEqual(tasks.count(), 2)
+        tasks.update(run_at=timezone.now())
+        work(once=True)
+        self.assertEqual(search('енот'), [self.other.pk])
+
+    def test_post_delete_skips_comment_reindex(self):
+        Comment.objects.create(
+            post=self.other, author=SearchTests.user, text='Кот'
+        )
+        Task.objects.all().delete()
+        self.other.delete()
+        self.assertFalse(Task.objects.exists())
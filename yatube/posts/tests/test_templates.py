@@ -0,0 +1,56 @@
+from django.template import Context, Engine
+from django.test import SimpleTestCase
+
+from core.template_loaders import InlinedIncludeNode
+
+TEMPLATES = {
+    'page.html': (
+        '{% for item in items %}{% include "card.html" %}'
+        '{% if not forloop.last %},{% endif %}{% endfor %}'
+        '{% if items %}{% include "card.html" with item="особый" %}'
+        '{% endif %}{% include template_name %}'
+    ),
+    'card.html': '[{{ item }}{% include "mark.html" %}]',
+    'mark.html': '{% with mark="!" %}{{ mark }}{% endwith %}',
+}
+
+
+def engine(inline=()):
+    return Engine(loaders=[(
+        'core.template_loaders.Loader',
+        [('django.template.loaders.locmem.Loader', TEMPLATES)],
+        inline,
+    )])
+
+
+class InliningLoaderTests(SimpleTestCase):
+    def render(self, engine):
+        return engine.get_template('page.html').render(Context({
+            'items': ['a', 'b'], 'template_name': 'mark.html',
+        }))
+
+    def test_same_output(self):
+        """Встроенные include рендерят то же, что и обычные"""
+        expected = self.render(engine())
+        self.assertEqual(expected, '[a!],[b!][особый!]!')
+        self.assertEqual(
+            self.render(engine(['card.html', 'mark.html'])), expected
+        )
+
+    def test_only_listed_constant_includes_inlined(self):
+        """Встраиваются только перечисленные include без with и переменных"""
+        template = engine(['card.html', 'mark.html']).get_template(
+            'page.html'
+        )
+        inlined = template.nodelist.get_nodes_by_type(InlinedIncludeNode)
+        self.assertEqual(
+            [node.template.origin.template_name for node in inlined],
+            ['card.html', 'mark.html'],
+        )
+
+    def test_template_compiled_once(self):
+        loader = engine(['card.html']).template_loaders[0]
+        self.assertIs(
+            loader.get_template('page.html'),
+            loader.get_template('page.html'),
+        )
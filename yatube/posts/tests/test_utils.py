@@ -0,0 +1,141 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from posts.counters import repair_counters
+from posts.models import Post
+from posts.utils import (ELLIPSIS, ApproximatePaginator, CursorPaginator,
+                         elided_page_range, encode_cursor)
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25)
+        )
+        # bulk_create обходит сигналы, число постов автора — в UserStats.
+        repair_counters()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def paginate(self, cursor=None):
+        paginator = CursorPaginator(Post.objects.all(), 10, cursor=cursor)
+        return paginator.get_page()
+
+    def test_first_page(self):
+        """Первая страница курсорного пагинатора"""
+        page = self.paginate()
+        self.assertIs(type(page), Page)
+        self.assertEqual(len(page), 10)
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+        self.assertIsNotNone(page.paginator.next_cursor)
+
+    def test_walk_forward_and_back(self):
+        """Проход вперед и назад по курсорам без пропусков и повторов"""
+        seen = []
+        page = self.paginate()
+        pages = [page]
+        seen.extend(post.id for post in page)
+        while page.has_next():
+            page = self.paginate(page.paginator.next_cursor)
+            pages.append(page)
+            seen.extend(post.id for post in page)
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages[-1]), 5)
+        back = self.paginate(pages[-1].paginator.previous_cursor)
+        self.assertEqual(list(back), list(pages[-2]))
+        self.assertTrue(back.has_previous())
+        first = self.paginate(back.paginator.previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_broken_cursor_gives_first_page(self):
+        """Битый курсор отдает первую страницу"""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': '!!!'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_views_use_cursor_links(self):
+        """Ленты отдают ссылки на курсоры, а ?page= остается доступным"""
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        response = self.client.get(url)
+        page_obj = response.context['page_obj']
+        self.assertContains(
+            response, f'?cursor={page_obj.paginator.next_cursor}'
+        )
+        response = self.client.get(url, {'page': 3})
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+    def test_cursor_keeps_pub_date_ties_apart(self):
+        """При одинаковом pub_date порядок добирается по id"""
+        post = Post.objects.order_by('-pub_date', '-id').first()
+        cursor = encode_cursor('n', post.pub_date, post.id)
+        page = self.paginate(cursor)
+        self.assertNotIn(post, list(page))
+        self.assertEqual(len(page), 10)
+
+
+class PageWindowTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def window(self, number, count=1000):
+        page = Paginator(list(range(count)), 10).page(number)
+        return elided_page_range(page)
+
+    def test_short_range_not_elided(self):
+        self.assertEqual(self.window(2, count=50), [1, 2, 3, 4, 5])
+
+    def test_middle_page(self):
+        """Вокруг текущей страницы соседи, по краям первая и последняя"""
+        self.assertEqual(
+            self.window(50), [1, ELLIPSIS, 48, 49, 50, 51, 52, ELLIPSIS, 100]
+        )
+
+    def test_edges(self):
+        self.assertEqual(self.window(1), [1, 2, 3, ELLIPSIS, 100])
+        self.assertEqual(self.window(100), [1, ELLIPSIS, 98, 99, 100])
+
+    def test_approximate_count(self):
+        """Больше предела строки не считаются, последней страницы нет"""
+        user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=user, text=f'Пост {i}') for i in range(25)
+        )
+        paginator = ApproximatePaginator(Post.objects.all(), 2, count_limit=20)
+        page = paginator.get_page(3)
+        self.assertEqual(paginator.count, 20)
+        self.assertTrue(paginator.approximate)
+        self.assertEqual(
+            elided_page_range(page), [1, 2, 3, 4, 5, ELLIPSIS]
+        )
+        exact = ApproximatePaginator(Post.objects.all(), 2, count_limit=50)
+        self.assertEqual(exact.count, 25)
+        self.assertFalse(exact.approximate)
+
+    @override_settings(PAGINATOR_COUNT_LIMIT=15)
+    def test_feed_links_without_last_page(self):
+        user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=user, text=f'Пост {i}') for i in range(25)
+        )
+        response = self.client.get(reverse('posts:index'), {'page': 1})
+        self.assertTrue(response.context['page_obj'].paginator.approximate)
+        self.assertNotContains(response, 'Последняя')
+        self.assertContains(response, ELLIPSIS)
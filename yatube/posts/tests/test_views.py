@@ -1,13 +1,25 @@
 import shutil
 import tempfile
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.core.management import call_command
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client, override_settings
 from django.conf import settings
 from django import forms
-from posts.models import Post, Group, Follow
+from core.tasks import work
+from posts.counters import repair_counters
+from posts import feed_cache
+from posts.models import Comment, Post, Group, Follow, TimelineEntry
+from posts.thumbnails import schedule_thumbnails, variants
+from django.core.cache import cache
 from django.core.paginator import Page
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -48,6 +60,7 @@ class PostsViewsTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(PostsViewsTests.user)
@@ -71,15 +84,70 @@ class PostsViewsTests(TestCase):
 
     def test_index_page_cache(self):
         """Работа кэша в шаблоне index.html"""
+        cache.clear()
         response1 = self.authorized_client.get(reverse('posts:index')).content
-        self.post = Post.objects.create(
-            author=PostsViewsTests.user,
-            text='Тестовый пост2'
+        Post.objects.filter(pk=PostsViewsTests.post.pk).update(
+            text='Изменено в обход сигналов'
         )
-        self.assertTrue(Post.objects.filter(id=self.post.pk))
         response2 = self.authorized_client.get(reverse('posts:index')).content
         self.assertEqual(response1, response2)
 
+    def test_index_page_cache_invalidation(self):
+        """Новый пост сразу сбрасывает кэш ленты, правка — кэш карточки"""
+        cache.clear()
+        self.authorized_client.get(reverse('posts:index'))
+        new_post = Post.objects.create(
+            author=PostsViewsTests.user,
+            text='Тестовый пост2'
+        )
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, new_post.text)
+        new_post.text = 'Отредактированный пост'
+        new_post.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Отредактированный пост')
+        self.assertNotContains(response, 'Тестовый пост2')
+
+    def test_author_rename_refreshes_cards(self):
+        """Новое имя автора сразу видно в карточках, вход кэш не трогает"""
+        author = User.objects.create_user(username='writer')
+        Post.objects.create(author=author, text='Пост писателя')
+        url = reverse('posts:profile', kwargs={'username': 'writer'})
+        self.guest_client.get(url)
+        version = feed_cache.get_feed_version()
+        self.guest_client.force_login(author)
+        self.assertEqual(feed_cache.get_feed_version(), version)
+        author = User.objects.get(pk=author.pk)
+        author.first_name = 'Лев'
+        author.last_name = 'Толстой'
+        author.save()
+        for url in (url, reverse('posts:index')):
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Лев Толстой')
+
+    def test_comment_keeps_card_version(self):
+        post = PostsViewsTests.post
+        before = feed_cache.annotate_card_versions([post])[0].card_version
+        Comment.objects.create(post=post, author=PostsViewsTests.user,
+                               text='Ответ')
+        after = feed_cache.annotate_card_versions([post])[0].card_version
+        self.assertEqual(before, after)
+
+    def test_index_page_cache_respects_page(self):
+        """Кэш ленты различает страницы"""
+        cache.clear()
+        Post.objects.bulk_create(
+            Post(author=PostsViewsTests.user, text=f'Пост {i}')
+            for i in range(12)
+        )
+        first = self.guest_client.get(reverse('posts:index'))
+        cursor = first.context['page_obj'].paginator.next_cursor
+        second = self.guest_client.get(
+            reverse('posts:index'), {'cursor': cursor}
+        )
+        self.assertNotEqual(first.content, second.content)
+        self.assertContains(second, PostsViewsTests.post.text)
+
     def test_views_use_correct_template(self):
         """Вью используют правильный шаблон"""
         views_templates = {
@@ -171,6 +239,7 @@ class PostsViewsTests(TestCase):
             )
             post_list.append(new_post)
         Post.objects.bulk_create(post_list)
+        repair_counters()
         reverse_list = [
             reverse('posts:index'),
             reverse('posts:group_posts', kwargs={'slug': 'test-slug'}),
@@ -227,3 +296,491 @@ class PostsViewsTests(TestCase):
         notfollower.force_login(PostsViewsTests.notfollower)
         response = notfollower.get(reverse('posts:follow_index'))
         self.assertFalse(response.context.get('page_obj'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class FeedQueriesTests(TestCase):
+    """Число запросов ленты не зависит от числа постов на странице"""
+    FEED_QUERIES = {
+        'posts:index': 1,
+        'posts:group_posts': 2,
+        'posts:profile': 4,
+        'posts:follow_index': 3,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(self):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(FeedQueriesTests.reader)
+
+    def create_posts(self, count):
+        for i in range(count):
+            Post.objects.create(
+                author=FeedQueriesTests.author,
+                group=FeedQueriesTests.group,
+                text=f'Пост {i}',
+                image='posts/missing.gif',
+            )
+
+    def urls(self):
+        return {
+            'posts:index': reverse('posts:index'),
+            'posts:group_posts': reverse(
+                'posts:group_posts', kwargs={'slug': 'test-slug'}
+            ),
+            'posts:profile': reverse(
+                'posts:profile', kwargs={'username': 'author'}
+            ),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def test_feed_query_budget(self):
+        """Ленты укладываются в фиксированный бюджет запросов"""
+        for count in (1, 10):
+            self.create_posts(count)
+            for name, url in self.urls().items():
+                cache.clear()
+                # +2 запроса на сессию и пользователя,
+                # +1 запрос за готовыми превью картинок
+                with self.subTest(view=name, posts=count):
+                    with self.assertNumQueries(
+                        self.FEED_QUERIES[name] + 3
+                    ):
+                        response = self.client.get(url)
+                    self.assertContains(response, 'Толстой')
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(TimelineTests.reader)
+
+    def follow_page(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_new_post_lands_in_follower_timeline(self):
+        """Новый пост автора раскладывается по лентам подписчиков"""
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author
+        )
+        post = Post.objects.create(author=TimelineTests.author, text='Новый')
+        self.assertTrue(
+            TimelineTests.reader.timeline.filter(post=post).exists()
+        )
+        self.assertEqual(self.follow_page(), ['Новый'])
+
+    @override_settings(TIMELINE_SYNC_FANOUT=0)
+    def test_large_fan_out_goes_through_queue(self):
+        """Большую аудиторию пост догоняет через очередь задач"""
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author
+        )
+        post = Post.objects.create(author=TimelineTests.author, text='Новый')
+        self.assertFalse(
+            TimelineTests.reader.timeline.filter(post=post).exists()
+        )
+        work(once=True)
+        self.assertEqual(self.follow_page(), ['Новый'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка дозаполняет ленту, отписка очищает ее"""
+        Post.objects.create(author=TimelineTests.author, text='Старый')
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}
+        ))
+        self.assertEqual(self.follow_page(), ['Старый'])
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}
+        ))
+        self.assertFalse(TimelineTests.reader.timeline.exists())
+        self.assertEqual(self.follow_page(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_read_on_demand(self):
+        """Посты популярного автора читаются без раскладки по лентам"""
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author
+        )
+        Post.objects.create(author=TimelineTests.author, text='Популярный')
+        self.assertFalse(TimelineTests.reader.timeline.exists())
+        self.assertEqual(self.follow_page(), ['Популярный'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_cursor_merges_inbox_and_popular_authors(self):
+        """Курсор листает готовую ленту вместе с постами популярных"""
+        popular = User.objects.create_user(username='popular')
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=popular)
+        for author in (TimelineTests.author, popular):
+            Follow.objects.create(user=TimelineTests.reader, author=author)
+        texts = []
+        for i in range(settings.POSTS_COUNT + 3):
+            author = popular if i % 2 else TimelineTests.author
+            Post.objects.create(author=author, text=f'Пост {i}')
+            texts.insert(0, f'Пост {i}')
+        self.assertEqual(
+            TimelineTests.reader.timeline.count(), (len(texts) + 1) // 2
+        )
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        page = response.context['page_obj']
+        cursor = page.paginator.next_cursor
+        response = self.reader_client.get(
+            reverse('posts:follow_index'), {'cursor': cursor}
+        )
+        following = response.context['page_obj']
+        self.assertEqual(
+            [post.text for post in page] + [post.text for post in following],
+            texts,
+        )
+        self.assertFalse(following.has_next())
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_is_bounded(self):
+        """Лента подписок ограничена TIMELINE_LENGTH постами"""
+        for i in range(3):
+            Post.objects.create(author=TimelineTests.author, text=f'Пост {i}')
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}
+        ))
+        self.assertEqual(TimelineTests.reader.timeline.count(), 2)
+        self.assertEqual(len(self.follow_page()), 2)
+
+    @override_settings(TIMELINE_LENGTH=2, TIMELINE_TRIM_DELAY=0)
+    def test_delivery_trims_timeline(self):
+        """После доставки лента подрезается задачей до TIMELINE_LENGTH"""
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author
+        )
+        for i in range(4):
+            Post.objects.create(author=TimelineTests.author, text=f'Пост {i}')
+        self.assertEqual(TimelineTests.reader.timeline.count(), 4)
+        work(once=True)
+        self.assertEqual(TimelineTests.reader.timeline.count(), 2)
+        self.assertEqual(self.follow_page(), ['Пост 3', 'Пост 2'])
+
+    @override_settings(TIMELINE_LENGTH=2, TIMELINE_FANOUT_LIMIT=1)
+    def test_migration_fills_timelines_per_reader(self):
+        """Миграция 0007 ограничивает ленту читателя, а не подписку"""
+        other = User.objects.create_user(username='other')
+        popular = User.objects.create_user(username='popular')
+        for author in (TimelineTests.author, other, popular):
+            Follow.objects.create(user=TimelineTests.reader, author=author)
+            for i in range(2):
+                Post.objects.create(author=author, text=f'{author} {i}')
+        Follow.objects.create(user=other, author=popular)
+        TimelineEntry.objects.all().delete()
+        migration = import_module('posts.migrations.0007_timelineentry')
+        migration.fill_timelines(apps, None)
+        self.assertEqual(TimelineTests.reader.timeline.count(), 2)
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=popular).exists()
+        )
+
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_VARIANTS={
+        'widths': (480, 960),
+        'ratio': (960, 339),
+        'formats': ('WEBP', 'JPEG'),
+        'options': {'crop': 'center', 'upscale': True},
+    },
+)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(self):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока превью не готово, вместо картинки выводится заглушка"""
+        post = Post.objects.create(
+            author=ThumbnailTests.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('thumb.gif', SMALL_GIF, 'image/gif'),
+        )
+        schedule_thumbnails(post)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        response = self.client.get(url)
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        self.assertNotContains(response, '<img class="card-img')
+        work(once=True)
+        thumbnails = post.thumbnails.filter(format='JPEG').order_by('width')
+        self.assertTrue(all(thumbnail.ready for thumbnail in thumbnails))
+        self.assertEqual(
+            [(t.width, t.height) for t in thumbnails],
+            [(480, 170), (960, 339)]
+        )
+        small, large = thumbnails
+        response = self.client.get(url)
+        self.assertContains(response, f'src="{large.url}"')
+        self.assertContains(
+            response, f'srcset="{small.url} 480w, {large.url} 960w"'
+        )
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, f'src="{large.url}"')
+
+    def test_new_variants_are_rendered(self):
+        """Смена набора вариантов ставит новую задачу, готовые не трогает"""
+        post = Post.objects.create(
+            author=ThumbnailTests.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('variants.gif', SMALL_GIF, 'image/gif'),
+        )
+        schedule_thumbnails(post)
+        work(once=True)
+        rendered = len(variants())
+        config = dict(settings.POST_IMAGE_VARIANTS, widths=(480, 960, 1440))
+        with override_settings(POST_IMAGE_VARIANTS=config):
+            schedule_thumbnails(post)
+            ready = post.thumbnails.filter(ready=True)
+            self.assertEqual(ready.count(), rendered)
+            self.assertEqual(
+                post.thumbnails.count(), len(variants())
+            )
+            work(once=True)
+            self.assertEqual(ready.count(), len(variants()))
+
+    def test_command_follows_changed_image(self):
+        """render_thumbnails переводит варианты на новую картинку поста"""
+        post = Post.objects.create(
+            author=ThumbnailTests.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('before.gif', SMALL_GIF, 'image/gif'),
+        )
+        schedule_thumbnails(post)
+        work(once=True)
+        image = SimpleUploadedFile('after.gif', SMALL_GIF, 'image/gif')
+        post.image.save(image.name, image, save=False)
+        Post.objects.filter(pk=post.pk).update(image=post.image.name)
+        call_command('render_thumbnails', stdout=StringIO())
+        self.assertFalse(post.thumbnails.filter(ready=True).exists())
+        work(once=True)
+        self.assertEqual(
+            set(post.thumbnails.values_list('source', 'ready')),
+            {(post.image.name, True)},
+        )
+
+    def test_variants_skip_unsupported_formats(self):
+        """Неподдерживаемые форматы пропускаются, JPEG остается всегда"""
+        with override_settings(POST_IMAGE_VARIANTS={
+            'widths': (480,),
+            'ratio': (960, 339),
+            'formats': ('NOSUCHFORMAT', 'JPEG'),
+            'options': {},
+        }):
+            self.assertEqual(variants(), [('480x170', 'JPEG')])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other_group = Group.objects.create(title='Другая', slug='other')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def revalidate(self, url, client=None):
+        client = client or self.client
+        first = client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Cookie', first['Vary'])
+        self.assertIn('no-cache', first['Cache-Control'])
+        return first['ETag'], first['Last-Modified']
+
+    def test_unchanged_pages_return_304(self):
+        """Неизменившиеся страницы отдают 304 без запросов к базе"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                etag, modified = self.revalidate(url)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=modified
+                )
+                self.assertEqual(response.status_code, 304)
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag, _ = self.revalidate(url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_pages(self):
+        """Новые посты, комментарии и подписки меняют ETag своих страниц"""
+        index = reverse('posts:index')
+        group = reverse('posts:group_posts', kwargs={'slug': 'group'})
+        other = reverse('posts:group_posts', kwargs={'slug': 'other'})
+        profile = reverse('posts:profile', kwargs={'username': 'author'})
+        detail = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        etags = {url: self.revalidate(url)[0]
+                 for url in (index, group, other, profile, detail)}
+        self.post.comments.create(author=self.reader, text='Комментарий')
+        self.assertNotEqual(self.revalidate(detail)[0], etags[detail])
+        self.assertEqual(self.revalidate(index)[0], etags[index])
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertNotEqual(self.revalidate(profile)[0], etags[profile])
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.other_group
+        post.save()
+        for url in (index, group, other):
+            with self.subTest(url=url):
+                self.assertNotEqual(self.revalidate(url)[0], etags[url])
+
+    def test_group_rename_invalidates_post(self):
+        """Новое название группы меняет ETag страницы ее поста"""
+        detail = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        etag, _ = self.revalidate(detail)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новое название')
+
+    def test_etag_depends_on_user(self):
+        """У разных пользователей разные ETag одной страницы"""
+        url = reverse('posts:index')
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        guest_etag, _ = self.revalidate(url)
+        reader_etag, _ = self.revalidate(url, reader_client)
+        self.assertNotEqual(guest_etag, reader_etag)
+        response = reader_client.get(url, HTTP_IF_NONE_MATCH=guest_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+
+@override_settings(COMMENTS_PER_PAGE=10)
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Вирусный')
+
+    def add_comments(self, count):
+        for i in range(count):
+            self.post.comments.create(
+                author=CommentPagesTests.author, text=f'Комментарий {i}'
+            )
+
+    def texts(self, response):
+        return [comment.text for comment in response.context['comments']]
+
+    def detail(self, **params):
+        return self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            params,
+        )
+
+    def test_first_page_oldest_first(self):
+        """На странице поста только первая страница комментариев"""
+        self.add_comments(15)
+        response = self.detail()
+        self.assertEqual(
+            self.texts(response), [f'Комментарий {i}' for i in range(10)]
+        )
+        self.assertContains(response, 'js-more-comments')
+
+    def test_fragment_loads_next_page(self):
+        """Фрагмент отдает следующую страницу без обвязки страницы"""
+        self.add_comments(15)
+        next_query = self.detail().context['comments_next']
+        url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk}
+        )
+        response = self.client.get(f'{url}?{next_query}')
+        self.assertEqual(
+            self.texts(response),
+            [f'Комментарий {i}' for i in range(10, 15)],
+        )
+        self.assertNotContains(response, '<html')
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_newest_first(self):
+        self.add_comments(15)
+        response = self.detail(order='newest')
+        self.assertEqual(self.texts(response)[0], 'Комментарий 14')
+        next_query = response.context['comments_next']
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+            + f'?{next_query}'
+        )
+        self.assertEqual(self.texts(response)[-1], 'Комментарий 0')
+
+    def test_comment_queries_do_not_grow(self):
+        """Авторы комментариев подгружаются одним запросом"""
+        self.add_comments(1)
+        with CaptureQueriesContext(connection) as few:
+            self.detail()
+        self.add_comments(9)
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            self.detail()
+        self.assertEqual(len(few), len(many))
+
+    def test_fragment_for_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 999})
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+
+from core.tasks import task
+
+from . import freshness
+from .feed_cache import bump_card_version, bump_feed_version
+from .models import Post, Thumbnail
+from .utils import bulk_batch_size
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+
+
+def variants_config():
+    return getattr(settings, 'POST_IMAGE_VARIANTS', {
+        'widths': (960,),
+        'ratio': (960, 339),
+        'formats': ('JPEG',),
+        'options': {'crop': 'center', 'upscale': True},
+    })
+
+
+def supported_formats():
+    """Форматы из настроек, которые умеют и Pillow, и sorl-thumbnail.
+
+    Последний формат в списке — запасной для <img>, он нужен всегда.
+    """
+    Image.init()
+    formats = variants_config()['formats']
+    usable = [
+        name for name in formats[:-1]
+        if name in Image.SAVE and name in EXTENSIONS
+    ]
+    return usable + [formats[-1]]
+
+
+def variants():
+    """Пары (геометрия, формат) для всех ширин и форматов."""
+    config = variants_config()
+    ratio_width, ratio_height = config['ratio']
+    return [
+        (f'{width}x{round(width * ratio_height / ratio_width)}', name)
+        for name in supported_formats()
+        for width in config['widths']
+    ]
+
+
+@task(max_attempts=3)
+def render_thumbnails(post_id, source):
+    """Рисует еще не готовые варианты картинки поста."""
+    options = variants_config()['options']
+    image = Post(pk=post_id, image=source).image
+    if not image.storage.exists(source):
+        logger.warning('Нет файла %s для поста %s', source, post_id)
+        return
+    pending = set(Thumbnail.objects.filter(
+        post_id=post_id, source=source, ready=False
+    ).values_list('geometry', 'format'))
+    for geometry, name in variants():
+        if (geometry, name) not in pending:
+            continue
+        thumbnail = get_thumbnail(image, geometry, format=name, **options)
+        Thumbnail.objects.filter(
+            post_id=post_id, geometry=geometry, format=name, source=source
+        ).update(
+            url=thumbnail.url,
+            width=thumbnail.width,
+            height=thumbnail.height,
+            ready=True,
+        )
+    bump_card_version(post_id)
+    bump_feed_version()
+    for author_id, group_id in Post.objects.filter(
+        pk=post_id
+    ).values_list('author_id', 'group_id'):
+        freshness.touch_post(post_id, author_id, group_id)
+
+
+def task_key(post_id, source):
+    """Ключ задачи: пост, картинка и набор вариантов.
+
+    Задача с тем же ключом ставится однажды, поэтому при смене
+    вариантов в настройках ключ тоже должен смениться.
+    """
+    digest = hashlib.md5(
+        json.dumps([variants(), variants_config()['options']],
+                   sort_keys=True).encode()
+    ).hexdigest()[:12]
+    return f'thumbnails:{post_id}:{source}:{digest}'
+
+
+def schedule_thumbnails(post):
+    """Ставит картинку поста в очередь задач на превью.
+
+    Готовые варианты той же картинки не сбрасываются.
+    """
+    if not post.image:
+        return
+    source = post.image.name
+    ready = set(Thumbnail.objects.filter(
+        post=post, source=source, ready=True
+    ).values_list('geometry', 'format'))
+    missing = [variant for variant in variants() if variant not in ready]
+    if not missing:
+        return
+    for geometry, name in missing:
+        Thumbnail.objects.update_or_create(
+            post=post,
+            geometry=geometry,
+            format=name,
+            defaults={'source': source, 'ready': False, 'url': ''},
+        )
+    render_thumbnails.delay(post.pk, source, key=task_key(post.pk, source))
+
+
+def schedule_many(posts):
+    """schedule_thumbnails для пачки постов за четыре запроса."""
+    posts = {post.pk: post for post in posts if post.image}
+    if not posts:
+        return
+    expected = variants()
+    rows = Thumbnail.objects.filter(post_id__in=list(posts)).values_list(
+        'pk', 'post_id', 'geometry', 'format', 'source', 'ready'
+    )
+    ready = set()
+    stale = []
+    for pk, post_id, geometry, name, source, is_ready in rows:
+        if is_ready and source == posts[post_id].image.name:
+            ready.add((post_id, geometry, name))
+        else:
+            stale.append(pk)
+    missing = [
+        (post, geometry, name)
+        for post in posts.values()
+        for geometry, name in expected
+        if (post.pk, geometry, name) not in ready
+    ]
+    if not missing:
+        return
+    Thumbnail.objects.filter(pk__in=stale).delete()
+    Thumbnail.objects.bulk_create(
+        (
+            Thumbnail(
+                post_id=post.pk, geometry=geometry, format=name,
+                source=post.image.name,
+            )
+            for post, geometry, name in missing
+        ),
+        batch_size=bulk_batch_size(Thumbnail, 1000),
+        ignore_conflicts=True,
+    )
+    pending = {post.pk: post for post, _, _ in missing}.values()
+    render_thumbnails.delay_many([
+        ((post.pk, post.image.name), task_key(post.pk, post.image.name))
+        for post in pending
+    ])
+
+
+def picture(post):
+    """Готовые варианты из prefetch_related('thumbnails') для <picture>.
+
+    Возвращает None, пока нет ни одного варианта в запасном формате.
+    """
+    if not post.image:
+        return None
+    by_format = {}
+    for thumbnail in post.thumbnails.all():
+        if thumbnail.ready and thumbnail.source == post.image.name:
+            by_format.setdefault(thumbnail.format, []).append(thumbnail)
+    formats = supported_formats()
+    fallback = sorted(by_format.get(formats[-1], []), key=lambda t: t.width)
+    if not fallback:
+        return None
+
+    def srcset(thumbnails):
+        return ', '.join(f'{t.url} {t.width}w' for t in thumbnails)
+
+    return {
+        'sources': [
+            {
+                'type': MIME_TYPES.get(name, ''),
+                'srcset': srcset(sorted(
+                    by_format[name], key=lambda t: t.width
+                )),
+            }
+            for name in formats[:-1] if name in by_format
+        ],
+        'img': fallback[-1],
+        'srcset': srcset(fallback),
+    }
@@ -0,0 +1,188 @@
+from django.conf import settings
+from django.db import transaction
+
+from core.tasks import task
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .utils import CursorPaginator
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+
+
+def sync_fanout_limit():
+    return getattr(settings, 'TIMELINE_SYNC_FANOUT', 100)
+
+
+def timeline_length():
+    return getattr(settings, 'TIMELINE_LENGTH', 800)
+
+
+def trim_delay():
+    return getattr(settings, 'TIMELINE_TRIM_DELAY', 300)
+
+
+def followers_count(author_id):
+    return UserStats.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+
+
+def pushes_on_write(author_id):
+    """Посты популярных авторов не раскладываются по лентам, а читаются."""
+    return followers_count(author_id) <= fanout_limit()
+
+
+def fan_out(post):
+    """Раскладывает пост по лентам подписчиков.
+
+    Небольшую аудиторию обходим сразу, большую — в очереди задач,
+    чтобы автор не ждал записи тысяч строк.
+    """
+    followers = followers_count(post.author_id)
+    if followers > fanout_limit():
+        return
+    if followers > sync_fanout_limit():
+        deliver_post.delay(post.pk, key=f'fan_out:{post.pk}')
+    else:
+        deliver(post.pk, post.author_id, post.pub_date)
+
+
+def deliver(post_id, author_id, pub_date):
+    follower_ids = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id in follower_ids.iterator()
+        ),
+        ignore_conflicts=True,
+    )
+    trim_followers.debounce(
+        author_id, key=f'trim:{author_id}', window=trim_delay()
+    )
+
+
+@task
+def trim_followers(author_id):
+    """Подрезает ленты подписчиков после доставки постов автора.
+
+    Одна задача на окно TIMELINE_TRIM_DELAY секунд: между обрезками
+    ленты вырастают не больше чем на посты автора за это окно.
+    """
+    for user_id in Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator():
+        trim(user_id)
+
+
+@task
+def deliver_post(post_id):
+    for author_id, pub_date in Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'pub_date'
+    ):
+        deliver(post_id, author_id, pub_date)
+
+
+def backfill(user_id, author_id):
+    if not pushes_on_write(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    ).order_by('-pub_date')[:timeline_length()]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ),
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def prune(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def trim(user_id):
+    boundary = TimelineEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date'
+    ).values_list('pub_date', flat=True)[timeline_length():][:1]
+    if boundary:
+        TimelineEntry.objects.filter(
+            user_id=user_id, pub_date__lte=boundary[0]
+        ).delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту заново: последние посты всех авторов из подписок.
+
+    То же, что backfill по каждой подписке, но одним проходом; нужно
+    после массовой загрузки, которая обходит сигналы.
+    """
+    authors = Follow.objects.filter(
+        user_id=user_id,
+        author__stats__followers_count__lte=fanout_limit(),
+    ).values('author_id')
+    posts = Post.objects.filter(author_id__in=authors).order_by(
+        '-pub_date'
+    ).values_list('id', 'pub_date')[:timeline_length()]
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
+
+
+def read_on_demand_authors(user):
+    return UserStats.objects.filter(
+        user__following__user=user,
+        followers_count__gt=fanout_limit(),
+    ).values('user_id')
+
+
+def pulled_posts(user):
+    """Посты популярных авторов, которых нет в готовой ленте."""
+    return Post.objects.filter(author_id__in=read_on_demand_authors(user))
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсор по ленте подписок без обхода всей таблицы постов.
+
+    Готовая лента листается по индексу (user, -pub_date) TimelineEntry,
+    посты популярных авторов — отдельным запросом с тем же курсором и
+    пределом. Ключи обеих выборок сливаются в Python, а строки страницы
+    берутся из object_list по найденным id.
+    """
+
+    def __init__(self, object_list, per_page, user, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+
+    def fetch(self, after, forward, limit):
+        inbox = TimelineEntry.objects.filter(user=self.user)
+        pulled = pulled_posts(self.user)
+        if after is not None:
+            inbox = inbox.filter(
+                self._keyset_filter(*after, forward, pk_field='post_id')
+            )
+            pulled = pulled.filter(self._keyset_filter(*after, forward))
+        keys = set(
+            inbox.order_by(*self._order(forward, pk_field='post_id'))
+            .values_list(self.date_field, 'post_id')[:limit]
+        )
+        keys.update(
+            pulled.order_by(*self._order(forward))
+            .values_list(self.date_field, 'pk')[:limit]
+        )
+        keys = sorted(keys, reverse=forward == self.newest_first)[:limit]
+        rows = self.object_list.filter(
+            pk__in=[pk for _, pk in keys]
+        ).order_by()
+        rows = {self._value(row, 'pk'): row for row in rows}
+        return [rows[pk] for _, pk in keys if pk in rows]
@@ -1,10 +1,243 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
 from yatube.settings import POSTS_COUNT
 
+from . import counts
+
+CURSOR_PARAM = 'cursor'
+FORWARD = 'n'
+BACKWARD = 'p'
+ELLIPSIS = '…'
+
+
+def encode_cursor(direction, pub_date, pk):
+    raw = f'{direction}|{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора; для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (FORWARD, BACKWARD) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Страница остается обычным Page: has_next/has_previous у Page
+    считаются через number и num_pages, поэтому пагинатор сообщает
+    окно из двух-трех страниц вокруг текущей. Токены соседних страниц
+    лежат в next_cursor и previous_cursor. С newest_first=False список
+    идет от старых записей к новым.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, cursor=None,
+                 date_field='pub_date', newest_first=True):
+        super().__init__(object_list, per_page)
+        self.cursor = decode_cursor(cursor)
+        self.date_field = date_field
+        self.newest_first = newest_first
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._has_next = False
+        self._has_previous = False
+
+    def _keyset_filter(self, pub_date, pk, forward, pk_field='pk'):
+        lookup = 'lt' if forward == self.newest_first else 'gt'
+        return (
+            Q(**{f'{self.date_field}__{lookup}': pub_date})
+            | Q(**{self.date_field: pub_date, f'{pk_field}__{lookup}': pk})
+        )
+
+    def _order(self, forward, pk_field='pk'):
+        descending = forward == self.newest_first
+        return tuple(
+            f'-{name}' if descending else name
+            for name in (self.date_field, pk_field)
+        )
+
+    def _value(self, row, name):
+        if isinstance(row, dict):
+            return row['id' if name == 'pk' else name]
+        return getattr(row, name)
+
+    def _token(self, direction, row):
+        return encode_cursor(
+            direction,
+            self._value(row, self.date_field),
+            self._value(row, 'pk'),
+        )
+
+    def fetch(self, after, forward, limit):
+        """Первые limit строк в порядке обхода после ключа (дата, pk)."""
+        rows = self.object_list
+        if after is not None:
+            rows = rows.filter(self._keyset_filter(*after, forward))
+        return list(rows.order_by(*self._order(forward))[:limit])
+
+    def get_page(self, number=None):
+        if self.cursor is None:
+            rows = self.fetch(None, True, self.per_page + 1)
+            self._has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        else:
+            direction, pub_date, pk = self.cursor
+            forward = direction == FORWARD
+            rows = self.fetch((pub_date, pk), forward, self.per_page + 1)
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            if forward:
+                self._has_next = has_more
+                self._has_previous = True
+            else:
+                rows.reverse()
+                self._has_next = True
+                self._has_previous = has_more
+        if rows and self._has_next:
+            self.next_cursor = self._token(FORWARD, rows[-1])
+        if rows and self._has_previous:
+            self.previous_cursor = self._token(BACKWARD, rows[0])
+        return Page(rows, 2 if self._has_previous else 1, self)
 
-def my_paginator(request, posts):
-    paginator = Paginator(posts, POSTS_COUNT)
+    page = get_page
+
+    def validate_number(self, number):
+        return number
+
+    @property
+    def num_pages(self):
+        number = 2 if self._has_previous else 1
+        return number + 1 if self._has_next else number
+
+
+class ApproximatePaginator(Paginator):
+    """Paginator, который берет число строк из posts.counts.
+
+    Точные значения по count_key живут в кэше и сдвигаются сигналами,
+    а уже известное число строк передается в known_count. В режиме
+    approximate больше count_limit строк не считаются: тогда
+    approximate становится True, а страниц — столько, сколько влезло
+    в предел; дальше листают курсором.
+    """
+
+    def __init__(self, object_list, per_page, count_limit=None,
+                 count_key=None, mode=counts.APPROXIMATE,
+                 known_count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_limit = count_limit or getattr(
+            settings, 'PAGINATOR_COUNT_LIMIT', 10000
+        )
+        self.count_key = count_key
+        self.mode = mode
+        self.known_count = known_count
+        self.approximate = False
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        result = counts.count(
+            self.object_list,
+            key=self.count_key,
+            mode=self.mode,
+            limit=self.count_limit,
+        )
+        if result.approximate:
+            self.approximate = True
+            return min(result.value, self.count_limit)
+        return result.value
+
+
+def elided_page_range(page, on_each_side=2, on_ends=1):
+    """Номера страниц для ссылок: края и соседи текущей, пропуски — ELLIPSIS.
+
+    Для приблизительного счета последних страниц не показываем: их
+    номера неизвестны.
+    """
+    paginator = page.paginator
+    number = page.number
+    last = paginator.num_pages
+    approximate = getattr(paginator, 'approximate', False)
+    if not approximate and last <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, last + 1))
+    pages = []
+    if number > on_each_side + on_ends + 2:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(ELLIPSIS)
+        start = number - on_each_side
+    else:
+        start = 1
+    if number < last - on_each_side - on_ends - 1:
+        pages.extend(range(start, number + on_each_side + 1))
+        pages.append(ELLIPSIS)
+        if not approximate:
+            pages.extend(range(last - on_ends + 1, last + 1))
+    else:
+        pages.extend(range(start, last + 1))
+        if approximate:
+            pages.append(ELLIPSIS)
+    return pages
+
+
+def my_paginator(request, posts, count_key=None, known_count=None):
+    cursor = request.GET.get(CURSOR_PARAM)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    numbered = getattr(settings, 'PAGINATOR_NUMBERED_FALLBACK', True)
+    if cursor is None and page_number is not None and numbered:
+        paginator = ApproximatePaginator(
+            posts, POSTS_COUNT,
+            count_key=count_key,
+            mode=counts.mode_for(request),
+            known_count=known_count,
+        )
+        return paginator.get_page(page_number)
+    paginator = CursorPaginator(posts, POSTS_COUNT, cursor=cursor)
+    return paginator.get_page()
+
+
+def bulk_batch_size(model, wanted):
+    """batch_size для bulk_create в пределах лимитов базы.
+
+    Явный batch_size Django не урезает, а у SQLite ограничено и число
+    параметров, и число термов в составном SELECT.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    return min(wanted, connection.ops.bulk_batch_size(fields, [None]))
+
+
+def bulk_create_dated(model, objects, field, batch_size, **kwargs):
+    """bulk_create, сохраняющий заданные даты в поле с auto_now_add.
 
-    return page_obj
+    При вставке pre_save ставит текущее время, поэтому даты
+    возвращаются отдельным UPDATE по pk, и объектам нужны явные id.
+    Флаг auto_now_add у поля общий для всех потоков, его не трогаем.
+    """
+    objects = list(objects)
+    dates = [getattr(obj, field) for obj in objects]
+    model.objects.bulk_create(objects, batch_size=batch_size, **kwargs)
+    for obj, date in zip(objects, dates):
+        setattr(obj, field, date)
+    model.objects.bulk_update(objects, [field], batch_size=batch_size)
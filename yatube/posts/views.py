@@ -1,24 +1,42 @@
+from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Post, Group, User, Follow
 from .forms import PostForm, CommentForm
-from .utils import my_paginator
+from .search import search
+from .utils import CURSOR_PARAM, CursorPaginator, my_paginator
+from .counters import get_stats
+from . import counts
+from .freshness import (author_modified, conditional, feed_modified,
+                        group_modified, post_modified)
+from .feed_cache import annotate_card_versions, get_feed_version
+from .thumbnails import schedule_thumbnails
+from .timeline import TimelinePaginator
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.utils.http import urlencode
+from core.auth import shared
+from yatube.settings import POSTS_COUNT
 
 
+@conditional(feed_modified)
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.select_related('group')
-    page_obj = my_paginator(request, posts)
+    posts = Post.objects.feed()
+    page_obj = my_paginator(request, posts, counts.ALL_POSTS)
+    annotate_card_versions(page_obj)
     context = {
+        'feed_version': get_feed_version(),
         'page_obj': page_obj
     }
     return render(request, template, context)
 
 
+@conditional(group_modified)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = my_paginator(request, posts)
+    posts = group.posts.feed()
+    page_obj = my_paginator(request, posts, counts.group_posts(group.pk))
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -26,30 +44,61 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional(author_modified)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = my_paginator(request, posts)
-    posts_count = author.posts.all().count()
+    posts = author.posts.feed()
+    stats = get_stats(author)
+    page_obj = my_paginator(request, posts, known_count=stats.posts_count)
+    annotate_card_versions(page_obj)
     following = request.user.is_authenticated and (
         Follow.objects.filter(user=request.user, author=author).exists()
     )
     context = {
         'following': following,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'author': author,
         'page_obj': page_obj
     }
     return render(request, 'posts/profile.html', context)
 
 
+def comments_page(request, post):
+    """Страница комментариев поста по курсору, старые или новые первыми."""
+    order = 'newest' if request.GET.get('order') == 'newest' else 'oldest'
+    paginator = CursorPaginator(
+        post.comments.select_related('author').order_by('created', 'pk'),
+        getattr(settings, 'COMMENTS_PER_PAGE', 20),
+        cursor=request.GET.get(CURSOR_PARAM),
+        date_field='created',
+        newest_first=order == 'newest',
+    )
+    comments = paginator.get_page()
+    return {
+        'comments': comments,
+        'comments_order': order,
+        'comments_next': paginator.next_cursor and urlencode({
+            CURSOR_PARAM: paginator.next_cursor, 'order': order,
+        }),
+    }
+
+
+@conditional(post_modified)
 def post_detail(request, post_id):
     form = CommentForm()
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
-    count = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related(
+            'author__stats', 'group'
+        ).prefetch_related('thumbnails'),
+        id=post_id
+    )
+    # Число постов автора, как и в профиле, — из UserStats.
+    count = get_stats(post.author).posts_count
+    # Автор на своей странице — тот же объект, что и request.user.
+    post.author = shared(post.author)
     context = {
-        'comments': comments,
+        **comments_page(request, post),
         'form': form,
         'post': post,
         'count': count
@@ -57,13 +106,43 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@conditional(post_modified)
+def post_comments(request, post_id):
+    """HTML-фрагмент следующей страницы комментариев для подгрузки."""
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    return render(
+        request,
+        'posts/includes/comment_list.html',
+        {'post': post, **comments_page(request, post)},
+    )
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search(query), POSTS_COUNT)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    posts = Post.objects.feed().in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts
+    ]
+    annotate_card_versions(page_obj)
+    context = {
+        'query': query,
+        'page_query': urlencode({'q': query}),
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         form = form.save(commit=False)
         form.author = request.user
         form.save()
+        schedule_thumbnails(form)
         return redirect('posts:profile', request.user.username)
     context = {
         'form': form
@@ -82,7 +161,8 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        schedule_thumbnails(post)
         return redirect('posts:post_detail', post_id)
     is_edit = True
     context = {
@@ -94,6 +174,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -107,10 +188,12 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.select_related('group').filter(
-        author__following__user=request.user
+    paginator = TimelinePaginator(
+        Post.objects.feed(), POSTS_COUNT,
+        user=request.user, cursor=request.GET.get(CURSOR_PARAM),
     )
-    page_obj = my_paginator(request, posts)
+    page_obj = paginator.get_page()
+    annotate_card_versions(page_obj)
     context = {
         'page_obj': page_obj
     }
@@ -118,6 +201,7 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     follower = request.user
     author = User.objects.get(username=username)
@@ -131,6 +215,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     Follow.objects.filter(
         user=request.user,
@@ -0,0 +1,23 @@
+// Подгружает следующую страницу комментариев вместо перехода по ссылке.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('.js-more-comments');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  link.classList.add('disabled');
+  fetch(link.dataset.fragment, {credentials: 'same-origin'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      link.insertAdjacentHTML('afterend', html);
+      link.remove();
+    })
+    .catch(function () {
+      window.location = link.href;
+    });
+});
@@ -20,6 +20,8 @@ ALLOWED_HOSTS = [
 INSTALLED_APPS = [
     'about.apps.AboutConfig',
     'core.apps.CoreConfig',
+    'benchmarks.apps.BenchmarksConfig',
+    'api.apps.ApiConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
     'django.contrib.admin',
@@ -33,11 +35,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -65,16 +69,77 @@ TEMPLATES = [
     },
 ]
 
+# Боевой режим шаблонов: каждый шаблон компилируется один раз на процесс,
+# а include карточки поста встраиваются в родителя (core.template_loaders).
+# При DEBUG по умолчанию выключен, чтобы правки шаблонов были видны сразу.
+TEMPLATES_CACHED = os.environ.get(
+    'TEMPLATES_CACHED', '0' if DEBUG else '1'
+) == '1'
+TEMPLATE_INLINE_INCLUDES = (
+    'posts/includes/post.html',
+    'posts/includes/thumbnail.html',
+)
+if TEMPLATES_CACHED:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [(
+        'core.template_loaders.Loader',
+        [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ],
+        TEMPLATE_INLINE_INCLUDES,
+    )]
+
+# Заголовок Server-Timing со временем рендера по шаблонам.
+TEMPLATE_PROFILING = DEBUG
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
+# PRAGMA для каждого нового соединения SQLite, см. core.db. Пишущие
+# запросы не ждут читающих (WAL), fsync только на чекпоинтах, горячие
+# страницы файла читаются через mmap и кэш в 64 МБ.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get(
+            'DB_PATH', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        # Соединение живет между запросами, а не открывается заново.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # Тот же busy_timeout уже при открытии, до PRAGMA из core.db.
+        'OPTIONS': {
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
     }
 }
 
+# Реплики только для чтения: DB_REPLICAS — пути к файлам через запятую.
+# Локально их можно наполнять командой sync_replicas.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = dict(
+        DATABASES['default'], NAME=path, TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Сколько секунд после записи браузер читает из основной базы.
+REPLICA_PIN_SECONDS = 5
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -102,6 +167,15 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Сессии читаются из кэша, в базу идут только промахи и записи.
+# signed_cookies обходится без хранилища вовсе, но сессия целиком
+# живет в cookie.
+SESSION_ENGINE = os.environ.get(
+    'SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db'
+)
+AUTHENTICATION_BACKENDS = ['core.auth.CachedModelBackend']
+USER_CACHE_TIMEOUT = 300
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
@@ -112,14 +186,96 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Ссылки в письмах; сводки отправляет manage.py send_digests.
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+NOTIFICATION_DIGEST_INTERVAL = 24 * 60 * 60
+NOTIFICATION_DIGEST_MAX_POSTS = 20
+NOTIFICATION_BATCH_SIZE = 100
+
 POSTS_COUNT: int = 10
+COMMENTS_PER_PAGE = 20
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+PAGINATOR_NUMBERED_FALLBACK = True
+# Дальше этого числа строк нумерованный пагинатор посты не считает.
+PAGINATOR_COUNT_LIMIT = 10000
+
+# Счетчики строк из posts.counts: точные значения живут в кэше
+# COUNT_CACHE_TIMEOUT секунд и сдвигаются сигналами. В режиме
+# approximate выше COUNT_EXACT_LIMIT строк вместо COUNT(*) берется
+# оценка по статистике планировщика или выборке. Режим задается по
+# имени URL представления, остальные берут COUNT_MODE. Число постов
+# автора сюда не входит: оно всегда берется из UserStats.
+COUNT_MODE = 'approximate'
+COUNT_MODES = {}
+COUNT_CACHE_TIMEOUT = 300
+COUNT_EXACT_LIMIT = 10000
+COUNT_SAMPLE_SIZE = 1000
+
+# Наибольший ?limit= у постраничных ответов API.
+API_MAX_PAGE_SIZE = 100
+
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_SYNC_FANOUT = 100
+TIMELINE_LENGTH = 800
+# Ленты подписчиков подрезаются до TIMELINE_LENGTH фоновой задачей
+# не чаще раза в столько секунд на автора.
+TIMELINE_TRIM_DELAY = 300
+
+POST_IMAGE_VARIANTS = {
+    'widths': (480, 960, 1440),
+    'ratio': (960, 339),
+    'formats': ('AVIF', 'WEBP', 'JPEG'),
+    'options': {'crop': 'center', 'upscale': True},
 }
 
+# Очередь задач core.tasks; воркер — manage.py run_tasks. С TASKS_EAGER=1
+# задачи выполняются в процессе запроса после коммита.
+TASKS_EAGER = os.environ.get('TASKS_EAGER') == '1'
+TASKS_LOCK_TIMEOUT = 600
+
+SEARCH_BACKEND = 'auto'
+SEARCH_MAX_RESULTS = 500
+SEARCH_RECENCY_DAYS = 30
+# Комментарии переиндексируют пост в фоне не чаще раза за столько секунд.
+SEARCH_REINDEX_DELAY = 60
+
+# Доля запросов, для которых MetricsMiddleware собирает метрики.
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))
+# Общий для всех воркеров файл метрик: процессы раз в
+# METRICS_FLUSH_INTERVAL секунд добавляют в него свои счетчики. Пустой
+# путь — метрики в памяти каждого процесса.
+METRICS_PATH = os.environ.get(
+    'METRICS_PATH', os.path.join(BASE_DIR, 'metrics.sqlite3')
+)
+METRICS_FLUSH_INTERVAL = 5
+
+# tiered — LRU процесса перед общим для всех воркеров файлом SQLite,
+# local — отдельный кэш в памяти каждого процесса.
+CACHE_MODE = os.environ.get('YATUBE_CACHE', 'tiered')
+
+if CACHE_MODE == 'local':
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.InstrumentedLocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'LOCATION': os.environ.get(
+                'YATUBE_CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')
+            ),
+            'OPTIONS': {
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_TIMEOUT': 2,
+            },
+        }
+    }
+
+# Тесты берут кэш во временном файле, а не общий cache.sqlite3.
+TEST_RUNNER = 'core.testing.IsolatedTestRunner'
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 INTERNAL_IPS = [